@@ -0,0 +1,256 @@
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SKU_SEARCH_PATTERN = re.compile(r'sku:"((?:[^"\\]|\\.)*)"')
+MUTATION_COST = 10
+
+
+class FakeShopifyServer:
+    """Local stand-in for the Shopify GraphQL Admin API used to benchmark the operator.
+    Implements the productVariants SKU search, inventory items by id, inventoryAdjustQuantities
+    and inventorySetQuantities operations of a single location, with a leaky cost bucket
+    that rejects requests as THROTTLED like Shopify does.
+    :param inventory: Dictionary mapping SKUs to their available stock
+    :param location_id: Shopify location id the inventory is stocked at
+    :param maximum_available: Size of the cost bucket
+    :param restore_rate: Cost points restored per second
+    :param latency_seconds: Seconds each request is delayed, simulating the network round trip
+    """
+
+    def __init__(
+        self,
+        inventory,
+        location_id="gid://shopify/Location/1",
+        maximum_available=2000,
+        restore_rate=100,
+        latency_seconds=0.0,
+    ):
+        self.location_id = location_id
+        self.maximum_available = maximum_available
+        self.restore_rate = restore_rate
+        self.latency_seconds = latency_seconds
+
+        self.skus = list(inventory)
+        self.item_ids = {
+            sku: self.item_id(index) for index, sku in enumerate(self.skus)
+        }
+        self.quantities = dict(inventory)
+
+        self.calls = Counter()
+        # Requests that were not throttled, by operation name
+        self.applied = Counter()
+        self.total_cost = 0
+        self.throttled = 0
+        self._available = maximum_available
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @staticmethod
+    def item_id(index):
+        return f"gid://shopify/InventoryItem/{index + 1}"
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/admin/api/2025-01/graphql.json"
+
+    def start(self):
+        """Starts serving in a background thread on a free local port"""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, which stalls keep-alive
+            # connections on delayed ACKs unless Nagle's algorithm is disabled
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                response = json.dumps(server.handle(json.loads(body))).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls.clear()
+            self.applied.clear()
+            self.total_cost = 0
+            self.throttled = 0
+
+    def handle(self, request):
+        """Handles a GraphQL request by its operation name.
+
+        :param request: Parsed request body with query, variables and operationName.
+        :return: The response body.
+        """
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        operation_name = request.get("operationName")
+        variables = request.get("variables") or {}
+        handlers = {
+            "ProductVariantsBySku": self.product_variants_by_sku,
+            "InventoryItemsById": self.inventory_items_by_id,
+            "InventoryAdjust": self.inventory_adjust,
+            "InventorySet": self.inventory_set,
+        }
+        if operation_name not in handlers:
+            return {"errors": [{"message": f"Unknown operation {operation_name}"}]}
+
+        requested_cost = self.requested_cost(operation_name, variables)
+        with self._lock:
+            self.calls[operation_name] += 1
+            available = self._restore()
+            if requested_cost > available:
+                self.throttled += 1
+                return {
+                    "errors": [
+                        {"message": "Throttled", "extensions": {"code": "THROTTLED"}}
+                    ],
+                    "extensions": self.cost_extensions(requested_cost, None),
+                }
+            data, actual_cost = handlers[operation_name](variables)
+            self.applied[operation_name] += 1
+            # Unused requested points are refunded after the query ran
+            self._available -= actual_cost
+            self.total_cost += actual_cost
+            return {
+                "data": data,
+                "extensions": self.cost_extensions(requested_cost, actual_cost),
+            }
+
+    def requested_cost(self, operation_name, variables):
+        if operation_name == "ProductVariantsBySku":
+            return 2 + variables["first"]
+        if operation_name == "InventoryItemsById":
+            return 1 + len(variables["ids"])
+        return MUTATION_COST
+
+    def cost_extensions(self, requested_cost, actual_cost):
+        return {
+            "cost": {
+                "requestedQueryCost": requested_cost,
+                "actualQueryCost": actual_cost,
+                "throttleStatus": {
+                    "maximumAvailable": self.maximum_available,
+                    "currentlyAvailable": int(self._available),
+                    "restoreRate": self.restore_rate,
+                },
+            }
+        }
+
+    def _restore(self):
+        now = time.monotonic()
+        self._available = min(
+            self.maximum_available,
+            self._available + (now - self._updated_at) * self.restore_rate,
+        )
+        self._updated_at = now
+        return self._available
+
+    def inventory_level(self, sku, location_id):
+        if location_id != self.location_id:
+            return None
+        return {"quantities": [{"quantity": self.quantities[sku]}]}
+
+    def product_variants_by_sku(self, variables):
+        skus = [
+            re.sub(r"\\(.)", r"\1", sku)
+            for sku in SKU_SEARCH_PATTERN.findall(variables["query"])
+        ]
+        matches = [sku for sku in dict.fromkeys(skus) if sku in self.item_ids]
+        start = int(variables.get("after") or 0)
+        page = matches[start : start + variables["first"]]
+        end = start + len(page)
+        edges = [
+            {
+                "cursor": str(start + index + 1),
+                "node": {
+                    "sku": sku,
+                    "inventoryItem": {
+                        "id": self.item_ids[sku],
+                        "inventoryLevel": self.inventory_level(
+                            sku, variables["locationId"]
+                        ),
+                    },
+                },
+            }
+            for index, sku in enumerate(page)
+        ]
+        data = {
+            "productVariants": {
+                "edges": edges,
+                "pageInfo": {"hasNextPage": end < len(matches), "endCursor": str(end)},
+            }
+        }
+        return data, 2 + len(page)
+
+    def inventory_items_by_id(self, variables):
+        nodes = []
+        for item_id in variables["ids"]:
+            sku = self._sku_of(item_id)
+            if sku is None:
+                nodes.append(None)
+                continue
+            nodes.append(
+                {
+                    "id": item_id,
+                    "sku": sku,
+                    "inventoryLevel": self.inventory_level(
+                        sku, variables["locationId"]
+                    ),
+                }
+            )
+        return {"nodes": nodes}, 1 + len(nodes)
+
+    def _sku_of(self, item_id):
+        index = int(item_id.rsplit("/", 1)[1]) - 1
+        return self.skus[index] if 0 <= index < len(self.skus) else None
+
+    def inventory_adjust(self, variables):
+        for change in variables["input"]["changes"]:
+            self.quantities[self._sku_of(change["inventoryItemId"])] += change["delta"]
+        return {"inventoryAdjustQuantities": {"userErrors": []}}, MUTATION_COST
+
+    def inventory_set(self, variables):
+        user_errors = []
+        compare = not variables["input"].get("ignoreCompareQuantity")
+        for quantity in variables["input"]["quantities"]:
+            sku = self._sku_of(quantity["inventoryItemId"])
+            if compare and quantity.get("compareQuantity") != self.quantities[sku]:
+                user_errors.append(
+                    {
+                        "code": "COMPARE_QUANTITY_STALE",
+                        "field": ["input", "quantities"],
+                        "message": "The compareQuantity value does not match",
+                    }
+                )
+        if not user_errors:
+            for quantity in variables["input"]["quantities"]:
+                self.quantities[self._sku_of(quantity["inventoryItemId"])] = quantity[
+                    "quantity"
+                ]
+        return {"inventorySetQuantities": {"userErrors": user_errors}}, MUTATION_COST
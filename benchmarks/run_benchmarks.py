@@ -0,0 +1,180 @@
+"""Benchmarks ShopifyUpdateStockCsvOperator against a local fake Shopify GraphQL server.
+
+Generates CSV feeds of the given sizes, syncs each of them in a fresh process and reports
+SKUs/sec, API calls, total query cost, peak RSS and wall time, e.g.
+
+    python benchmarks/run_benchmarks.py --rows 10000 100000 --restore-rate 1000
+
+Shopify's default restore rate of 100 points per second makes the cost bucket the
+bottleneck for large feeds, raise it to measure the operator itself.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_shopify_server import FakeShopifyServer  # noqa: E402
+
+LOCATION_ID = "gid://shopify/Location/1"
+
+
+def generate_feed(path, rows, changed_ratio, seed=0):
+    """Writes a CSV feed of `rows` SKUs and returns the stock currently in the shop.
+
+    :param path: File location of the CSV file.
+    :param rows: Number of SKUs.
+    :param changed_ratio: Fraction of SKUs whose stock in the feed differs from the shop.
+    :param seed: Seed of the random stock quantities.
+    :return: Dictionary mapping SKUs to their stock in the shop.
+    """
+    rng = random.Random(seed)
+    inventory = {}
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        for index in range(rows):
+            sku = f"SKU{index:07d}"
+            stock = rng.randint(0, 500)
+            writer.writerow((sku, stock))
+            changed = rng.random() < changed_ratio
+            inventory[sku] = stock + rng.randint(1, 10) if changed else stock
+    return inventory
+
+
+def sync_feed(endpoint, file_location, operator_kwargs, log_level="WARNING"):
+    """Syncs a feed with the operator, run in a fresh process to measure its peak RSS.
+
+    :param endpoint: GraphQL endpoint of the fake server.
+    :param file_location: File location of the CSV file.
+    :param operator_kwargs: Additional arguments of the operator.
+    :param log_level: Level of the task log, per batch logging is included in the timings.
+    :return: Dictionary with wall time, peak RSS and throttle statistics.
+    """
+    sys.path.insert(0, os.path.join(REPO_ROOT, "plugins"))
+    from hooks.shopify_hook import ShopifyGraphQLClient
+    from operators.shopify_update_stock_csv_operator import (
+        ShopifyUpdateStockCsvOperator,
+    )
+
+    # Airflow configures its loggers on import
+    logging.getLogger("airflow.task").setLevel(log_level)
+    operator = ShopifyUpdateStockCsvOperator(
+        task_id="benchmark",
+        conn_id="benchmark",
+        location_id=LOCATION_ID,
+        file_location=file_location,
+        **operator_kwargs,
+    )
+    client = ShopifyGraphQLClient(
+        "127.0.0.1",
+        "2025-01",
+        "benchmark",
+        pool_size=operator.connection_pool_size(),
+    )
+    client.endpoint = endpoint
+    start = time.perf_counter()
+    operator.sync_stock(client)
+    return {
+        "wall_seconds": time.perf_counter() - start,
+        # Kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "throttled_seconds": operator.throttle.total_sleep_seconds,
+        "retries": operator.throttle.retries,
+    }
+
+
+def run_benchmark(rows, args, operator_kwargs):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_location = os.path.join(tmp_dir, "stock.csv")
+        inventory = generate_feed(file_location, rows, args.changed_ratio)
+        server = FakeShopifyServer(
+            inventory,
+            location_id=LOCATION_ID,
+            maximum_available=args.bucket_size,
+            restore_rate=args.restore_rate,
+            latency_seconds=args.latency_ms / 1000,
+        ).start()
+        del inventory
+        try:
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(1) as pool:
+                result = pool.apply(
+                    sync_feed,
+                    (server.url, file_location, operator_kwargs, args.log_level),
+                )
+        finally:
+            server.stop()
+
+    return {
+        "rows": rows,
+        "skus_per_second": rows / result["wall_seconds"],
+        "api_calls": sum(server.calls.values()),
+        "calls": dict(server.calls),
+        "total_cost": server.total_cost,
+        "throttled_requests": server.throttled,
+        **result,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--changed-ratio", type=float, default=0.1)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--bucket-size", type=int, default=2000)
+    parser.add_argument("--restore-rate", type=float, default=100)
+    parser.add_argument("--sku-per-request", type=int, default=100)
+    parser.add_argument("--max-workers", type=int, default=1)
+    parser.add_argument("--update-mode", choices=["adjust", "set"], default="adjust")
+    parser.add_argument("--adaptive-batch-size", action="store_true")
+    parser.add_argument("--coalesce-mutations", action="store_true")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", help="File location to write the results to")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    operator_kwargs = {
+        "sku_per_request": args.sku_per_request,
+        "max_workers": args.max_workers,
+        "update_mode": args.update_mode,
+        "adaptive_batch_size": args.adaptive_batch_size,
+        "coalesce_mutations": args.coalesce_mutations,
+    }
+
+    results = []
+    print(
+        f"{'rows':>10} {'sku/s':>10} {'calls':>8} {'cost':>10} "
+        f"{'throttled':>10} {'rss MB':>8} {'wall s':>8}"
+    )
+    for rows in args.rows:
+        result = run_benchmark(rows, args, operator_kwargs)
+        results.append(result)
+        print(
+            f"{result['rows']:>10} {result['skus_per_second']:>10.0f} "
+            f"{result['api_calls']:>8} {result['total_cost']:>10} "
+            f"{result['throttled_seconds']:>10.2f} {result['peak_rss_mb']:>8.1f} "
+            f"{result['wall_seconds']:>8.2f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from airflow import DAG
+from operators.shopify_partition_stock_csv_operator import (
+    ShopifyPartitionStockCsvOperator,
+)
+from operators.shopify_update_stock_csv_operator import (
+    ShopifyUpdateStockCsvOperator,
+)
+
+dag = DAG(
+    dag_id="shopify_stock_sharded_example",
+    description="Example DAG syncing a large stock file in parallel shards",
+    schedule_interval=None,
+    start_date=datetime(2018, 10, 11),
+    max_active_runs=1,
+)
+
+partition_stock_csv = ShopifyPartitionStockCsvOperator(
+    task_id="partition_stock_csv",
+    file_location="{{conf.get('core', 'dags_folder')}}/test_data/stock.csv",
+    output_location="/tmp/shopify_stock_shards",
+    shards=8,
+    dag=dag,
+)
+
+# The "shopify_budget" pool has 100 slots, Shopify's restore rate of 100 points per second.
+# Each shard task takes 25 of them, so 4 shards sync at a time sharing the budget.
+sync_stock = ShopifyUpdateStockCsvOperator.partial(
+    task_id="sync_stock",
+    conn_id="shopify",
+    location_id="gid://shopify/Location/99999999999",
+    pool="shopify_budget",
+    pool_slots=25,
+    dag=dag,
+).expand(file_location=partition_stock_csv.output)
+
+partition_stock_csv >> sync_stock
@@ -1,5 +1,10 @@
-import shopify
+import threading
+
+import requests
+from airflow.exceptions import AirflowException
 from airflow.hooks.base_hook import BaseHook
+from requests.adapters import HTTPAdapter
+from utils.optional_imports import optional_module
 
 
 class ShopifyHook(BaseHook):
@@ -8,24 +13,194 @@ class ShopifyHook(BaseHook):
                     Type: http,
                     Host: shopdomain without http://
                     password: private app access token
+    :param pool_size: Number of keep-alive connections of the session client,
+                      should be at least the number of threads sharing it
+    :param timeout: Read timeout of the session client in seconds
+    :param connect_timeout: Connect timeout of the session client in seconds
     """
 
-    def __init__(self, conn_id, *args, **kwargs):
+    api_version = "2025-01"
+
+    def __init__(
+        self, conn_id, pool_size=10, timeout=60, connect_timeout=10, *args, **kwargs
+    ):
         self.client = None
+        self.session_client = None
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
         self.conn_id = conn_id
         self._args = args
         self._kwargs = kwargs
         self.connection = self.get_connection(conn_id)
 
     def get_conn(self):
-        api_version = "2025-01"
+        # The Shopify SDK is slow to import and only needed by tasks using this client
+        import shopify
 
         shop_url = self.connection.host
         access_token = self.connection.password.strip()
 
         # Connects via private app access token
-        session = shopify.Session(shop_url, api_version, access_token)
+        session = shopify.Session(shop_url, self.api_version, access_token)
         shopify.ShopifyResource.activate_session(session)
         self.client = shopify.GraphQL()
 
         return self.client
+
+    def get_session_client(self):
+        """Returns a graphql API client bound to this hook's connection only.
+        Unlike `get_conn` it does not activate a process-global Shopify session,
+        so it can be shared across threads and used next to clients of other shops.
+        The client is created once per hook and reuses its keep-alive connections.
+        """
+        if self.session_client is None:
+            self.session_client = ShopifyGraphQLClient(
+                self.connection.host,
+                self.api_version,
+                self.connection.password.strip(),
+                timeout=self.timeout,
+                connect_timeout=self.connect_timeout,
+                pool_size=self.pool_size,
+            )
+        return self.session_client
+
+    def get_async_client(self):
+        """Returns a new asyncio graphql API client bound to this hook's connection,
+        e.g. for triggers running on the triggerer. The caller closes it when done.
+        """
+        if optional_module("aiohttp") is None:
+            raise AirflowException("The async Shopify client requires aiohttp")
+        return ShopifyAsyncGraphQLClient(
+            self.connection.host,
+            self.api_version,
+            self.connection.password.strip(),
+            timeout=self.timeout,
+            connect_timeout=self.connect_timeout,
+            pool_size=self.pool_size,
+        )
+
+    def close(self):
+        """Closes the connections of the session client"""
+        if self.session_client is not None:
+            self.session_client.close()
+            self.session_client = None
+
+
+class ShopifyGraphQLClient:
+    """Thread-safe Shopify GraphQL Admin API client keeping its session state per instance.
+    Mirrors the `execute` interface of `shopify.GraphQL`.
+    Requests share a pool of keep-alive connections, so only the first request of each
+    connection pays for the TLS handshake. Responses are requested gzip compressed.
+    :param shop_url: Shop domain without http://
+    :param api_version: Shopify API version
+    :param access_token: Private app access token
+    :param timeout: Read timeout in seconds
+    :param connect_timeout: Connect timeout in seconds
+    :param pool_size: Number of keep-alive connections kept open
+    """
+
+    def __init__(
+        self,
+        shop_url,
+        api_version,
+        access_token,
+        timeout=60,
+        connect_timeout=10,
+        pool_size=10,
+    ):
+        self.endpoint = f"https://{shop_url}/admin/api/{api_version}/graphql.json"
+        self.headers = {
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip",
+            "Content-Type": "application/json",
+            "X-Shopify-Access-Token": access_token,
+        }
+        self.timeout = (connect_timeout, timeout)
+        self.pool_size = pool_size
+        self._local = threading.local()
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+
+    @property
+    def session(self):
+        # Sessions are per thread, the connection pool of the adapter is shared
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            session.headers.update(self.headers)
+            self._local.session = session
+        return session
+
+    def execute(self, query, variables=None, operation_name=None):
+        """Executes a GraphQL query and returns the raw response body"""
+        data = {"query": query, "variables": variables, "operationName": operation_name}
+        response = self.session.post(self.endpoint, json=data, timeout=self.timeout)
+        response.raise_for_status()
+        return response.text
+
+    def close(self):
+        """Closes all pooled connections"""
+        self._adapter.close()
+
+
+class ShopifyAsyncGraphQLClient:
+    """asyncio Shopify GraphQL Admin API client, the awaitable counterpart of
+    `ShopifyGraphQLClient`. Requests share a pool of keep-alive connections
+    of one aiohttp session, which is opened on the first request.
+    :param shop_url: Shop domain without http://
+    :param api_version: Shopify API version
+    :param access_token: Private app access token
+    :param timeout: Read timeout in seconds
+    :param connect_timeout: Connect timeout in seconds
+    :param pool_size: Number of connections kept open
+    """
+
+    def __init__(
+        self,
+        shop_url,
+        api_version,
+        access_token,
+        timeout=60,
+        connect_timeout=10,
+        pool_size=10,
+    ):
+        self.endpoint = f"https://{shop_url}/admin/api/{api_version}/graphql.json"
+        self.headers = {
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip",
+            "Content-Type": "application/json",
+            "X-Shopify-Access-Token": access_token,
+        }
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pool_size = pool_size
+        self._session = None
+
+    @property
+    def session(self):
+        # Created lazily, aiohttp sessions are bound to the running event loop
+        if self._session is None:
+            aiohttp = optional_module("aiohttp")
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=self.connect_timeout, sock_read=self.timeout
+                ),
+            )
+        return self._session
+
+    async def execute(self, query, variables=None, operation_name=None):
+        """Executes a GraphQL query and returns the raw response body"""
+        data = {"query": query, "variables": variables, "operationName": operation_name}
+        async with self.session.post(self.endpoint, json=data) as response:
+            response.raise_for_status()
+            return await response.text()
+
+    async def close(self):
+        """Closes all pooled connections"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
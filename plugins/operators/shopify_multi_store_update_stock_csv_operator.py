@@ -0,0 +1,243 @@
+import copy
+import itertools
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from airflow.exceptions import AirflowException
+from airflow.utils.decorators import apply_defaults
+from hooks.shopify_hook import ShopifyHook
+from operators.shopify_update_stock_csv_operator import (
+    ShopifyUpdateStockCsvOperator,
+)
+from utils.shopify_throttle import ShopifyCostThrottle
+from utils.stock_feed import read_stock_rows, write_stock_rows
+from utils.sync_metrics import SyncMetrics
+
+
+class ShopifyMultiStoreUpdateStockCsvOperator(ShopifyUpdateStockCsvOperator):
+    """
+    Operator that takes a CSV file (columns: sku, stock) as input
+    and syncs the stock of corresponding product variants in several Shopify stores.
+    The CSV file is parsed once, then all stores are synced concurrently.
+    Each store uses its own session client and cost throttle, as Shopify throttles per shop.
+    A failing store does not stop the others, the task fails after all stores finished.
+    The result pushed to XCom holds the parse metrics of the CSV file (`spool`)
+    and the result of each store (`stores`).
+    All other parameters are the same as for ShopifyUpdateStockCsvOperator,
+    `cost_share` applies to the cost budget of each store. Deferrable mode is not supported.
+    :param stores: Dictionary mapping Shopify connections to the location id to update in each store
+    :param file_location: File location of the CSV file
+    :param max_parallel_stores: Number of stores synced concurrently, all stores by default
+    :param sku_index_location: File location of the SQLite SKU index, containing `{conn_id}`
+                               to keep a separate index per store
+    :param delta_snapshot_location: File location of the SQLite feed snapshot,
+                                    `{conn_id}` is replaced by the connection of the store
+    :param checkpoint_location: File location of the SQLite sync checkpoint,
+                                `{conn_id}` is replaced by the connection of the store
+    :param inventory_level_store_location: File location of the SQLite inventory level store,
+                                           containing `{conn_id}` to keep a separate store per store
+    :param inventory_webhook_location: Directory of the queued webhook payloads, containing `{conn_id}`
+    :param dry_run_report_location: File location of the dry run report, containing `{conn_id}`
+    """
+
+    @apply_defaults
+    def __init__(
+        self,
+        stores,
+        file_location,
+        max_parallel_stores=None,
+        sku_index_location=None,
+        delta_snapshot_location=None,
+        *args,
+        **kwargs,
+    ):
+        super().__init__(
+            conn_id=None,
+            location_id=None,
+            file_location=file_location,
+            sku_index_location=sku_index_location,
+            delta_snapshot_location=delta_snapshot_location,
+            *args,
+            **kwargs,
+        )
+        if not stores:
+            raise AirflowException("No stores to sync")
+        if self.deferrable:
+            raise AirflowException(
+                "Deferrable mode is not supported when syncing several stores"
+            )
+        if any(not isinstance(location_id, str) for location_id in stores.values()):
+            raise AirflowException("Each store must map to a single location id")
+        if sku_index_location and "{conn_id}" not in sku_index_location:
+            raise AirflowException(
+                "SKU index location must contain {conn_id}, inventory item ids differ per store"
+            )
+        for location in (
+            self.inventory_level_store_location,
+            self.inventory_webhook_location,
+        ):
+            if location and "{conn_id}" not in location:
+                raise AirflowException(
+                    "Inventory level store and webhook locations must contain {conn_id}, "
+                    "inventory levels differ per store"
+                )
+        if (
+            self.dry_run_report_location
+            and "{conn_id}" not in self.dry_run_report_location
+        ):
+            raise AirflowException(
+                "Dry run report location must contain {conn_id}, each store is reported separately"
+            )
+        self.stores = stores
+        self.max_parallel_stores = max_parallel_stores
+        self.spool_location = None
+
+    def execute(self, context):
+        """Updates product variants (SKU) stock at the given location of each store via the Shopify API"""
+        # Each store's throttle is created with the share, see for_store
+        self.throttle.share = self.get_cost_share()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            spool_location = os.path.join(tmp_dir, "stock.csv")
+            spool_result = self.spool_stock_feed(spool_location)
+
+            with ThreadPoolExecutor(
+                max_workers=self.max_parallel_stores or len(self.stores)
+            ) as executor:
+                futures = {
+                    conn_id: executor.submit(
+                        self.sync_store, conn_id, location_id, spool_location
+                    )
+                    for conn_id, location_id in self.stores.items()
+                }
+                store_results = {
+                    conn_id: future.result() for conn_id, future in futures.items()
+                }
+
+        self.log.info(
+            f'Parsed {spool_result["skus"]} sku in {spool_result["parse_seconds"]:.2f}s, '
+            f'skipped {spool_result["rows_invalid"]} invalid rows'
+        )
+        for conn_id, store_result in store_results.items():
+            self.log.info(
+                f'Store "{conn_id}": {store_result["status"]} after {store_result["seconds"]:.2f}s, '
+                f'query cost: {store_result["cost"]}, throttled for {store_result["throttled_seconds"]:.2f}s'
+            )
+
+        failed_stores = {
+            conn_id: store_result["error"]
+            for conn_id, store_result in store_results.items()
+            if store_result["status"] == "failed"
+        }
+        if failed_stores:
+            raise AirflowException(f"Stock sync failed for stores: {failed_stores}")
+        return {"spool": spool_result, "stores": store_results}
+
+    def spool_stock_feed(self, spool_location):
+        """Parses and deduplicates the CSV file once into a spool file read by all stores.
+
+        :param spool_location: File location of the spool file.
+        :return: Dictionary with the parse seconds, SKU count and invalid row count of the CSV file.
+        """
+        # The stores reset their own metrics, the parse metrics are only kept here
+        self.metrics = SyncMetrics(
+            tags={"task_id": self.task_id}, batch_metrics=self.batch_metrics
+        )
+        stock_batches = self.read_stock_batches()
+        with open(spool_location, "w", newline="") as spool_file:
+            skus = write_stock_rows(
+                (row for stock_batch in stock_batches for row in stock_batch.items()),
+                spool_file,
+            )
+        return {
+            "parse_seconds": self.metrics.seconds["parse"],
+            "skus": skus,
+            "rows_invalid": self.metrics.counts["invalid_rows"],
+        }
+
+    def sync_store(self, conn_id, location_id, spool_location):
+        """Syncs the spooled stock data to a single store, catching its errors.
+
+        :param conn_id: Shopify connection of the store.
+        :param location_id: Shopify location id to update in the store.
+        :param spool_location: File location of the spool file.
+        :return: Dictionary with status, error, sync summary, seconds, query cost and throttled seconds of the store.
+        """
+        store_operator = self.for_store(conn_id, location_id, spool_location)
+        start = time.monotonic()
+        error = None
+        summary = None
+        shopify_hook = None
+        try:
+            shopify_hook = ShopifyHook(
+                conn_id=conn_id, pool_size=store_operator.connection_pool_size()
+            )
+            summary = store_operator.sync_stock(shopify_hook.get_session_client())
+        except Exception as e:
+            self.log.exception(f'Stock sync failed for store "{conn_id}"')
+            error = str(e)
+        finally:
+            if shopify_hook is not None:
+                shopify_hook.close()
+        return {
+            "status": "failed" if error else "success",
+            "error": error,
+            "summary": summary,
+            "seconds": time.monotonic() - start,
+            "cost": store_operator.throttle.total_actual_cost,
+            "throttled_seconds": store_operator.throttle.total_sleep_seconds,
+        }
+
+    def for_store(self, conn_id, location_id, spool_location):
+        """Returns a copy of the operator syncing a single store with its own throttle and state.
+
+        :param conn_id: Shopify connection of the store.
+        :param location_id: Shopify location id to update in the store.
+        :param spool_location: File location of the spool file.
+        """
+        store_operator = copy.copy(self)
+        store_operator.conn_id = conn_id
+        store_operator.location_id = location_id
+        store_operator.spool_location = spool_location
+        store_operator.throttle = ShopifyCostThrottle(
+            max_retries=self.max_throttle_retries, share=self.throttle.share
+        )
+        store_operator.sku_index = None
+        store_operator.inventory_snapshot = None
+        if self.sku_index_location:
+            store_operator.sku_index_location = self.sku_index_location.format(
+                conn_id=conn_id
+            )
+        if self.delta_snapshot_location:
+            store_operator.delta_snapshot_location = (
+                self.delta_snapshot_location.format(conn_id=conn_id)
+            )
+        for name in (
+            "inventory_level_store_location",
+            "inventory_webhook_location",
+            "dry_run_report_location",
+        ):
+            if getattr(self, name):
+                setattr(
+                    store_operator, name, getattr(self, name).format(conn_id=conn_id)
+                )
+        store_operator.inventory_levels = None
+        if self.checkpoint_location:
+            store_operator.checkpoint_location = self.checkpoint_location.format(
+                conn_id=conn_id
+            )
+        return store_operator
+
+    def read_stock_batches(self, skip_skus=0):
+        """Streams the stock data of a store in batches from the spool file.
+
+        :param skip_skus: Number of unique SKUs at the start of the file to skip.
+        :return: Generator of dictionaries mapping up to `sku_per_request` SKUs to their stock quantities.
+        """
+        if self.spool_location is None:
+            yield from super().read_stock_batches(skip_skus)
+            return
+        with open(self.spool_location, newline="") as spool_file:
+            rows = itertools.islice(read_stock_rows(spool_file), skip_skus, None)
+            yield from self.group_stock_batches(rows)
@@ -0,0 +1,66 @@
+import os
+from contextlib import ExitStack
+
+from airflow.exceptions import AirflowException
+from airflow.models import BaseOperator
+from airflow.utils.decorators import apply_defaults
+from utils.feed_source import feed_name, open_feed
+from utils.stock_feed import partition_stock_rows
+
+
+class ShopifyPartitionStockCsvOperator(BaseOperator):
+    """
+    Operator that splits a CSV stock file into shard files by a stable hash of the SKU,
+    so that the shards can be synced by parallel mapped tasks, e.g.
+    `ShopifyUpdateStockCsvOperator.partial(...).expand(file_location=partition.output)`.
+    All rows of a SKU end up in the same shard, in their original order.
+    Returns the file locations of the non-empty shards, which are pushed to XCom.
+    Shard file names only depend on the shard index, so keep `output_location` the same
+    across runs for delta snapshots and checkpoints of the shards to apply.
+    :param file_location: File location of the CSV file, see ShopifyUpdateStockCsvOperator
+    :param output_location: Directory the shard files are written to
+    :param shards: Number of shards
+    """
+
+    template_fields = ["file_location", "output_location"]
+
+    @apply_defaults
+    def __init__(self, file_location, output_location, shards, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if shards < 1:
+            raise AirflowException(f"Invalid number of shards: {shards}")
+        self.file_location = file_location
+        self.output_location = output_location
+        self.shards = shards
+
+    def execute(self, context):
+        """Writes the shard files and returns the locations of the non-empty ones"""
+        shard_locations = [
+            os.path.join(
+                self.output_location, f"shard-{index:04d}-of-{self.shards:04d}.csv"
+            )
+            for index in range(self.shards)
+        ]
+        try:
+            os.makedirs(self.output_location, exist_ok=True)
+            with ExitStack() as stack:
+                csv_file = stack.enter_context(open_feed(self.file_location))
+                shard_files = [
+                    stack.enter_context(open(shard_location, "w", newline=""))
+                    for shard_location in shard_locations
+                ]
+                counts = partition_stock_rows(csv_file, shard_files)
+        except Exception as e:
+            raise AirflowException(f"Error trying to partition file. {e}")
+
+        non_empty = []
+        for shard_location, count in zip(shard_locations, counts):
+            if count:
+                non_empty.append(shard_location)
+            else:
+                os.remove(shard_location)
+        self.log.info(
+            f'Partitioned {sum(counts)} rows of "{feed_name(self.file_location)}" '
+            f"into {len(non_empty)} shards of {min(counts)} to {max(counts)} rows"
+        )
+        return non_empty
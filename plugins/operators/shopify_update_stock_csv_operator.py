@@ -1,11 +1,53 @@
-import csv
+import itertools
 import json
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from airflow.exceptions import AirflowException
 from airflow.models import BaseOperator
+from airflow.models.pool import Pool
 from airflow.utils.decorators import apply_defaults
 from hooks.shopify_hook import ShopifyHook
+from triggers.shopify_stock_sync_trigger import ShopifyStockSyncTrigger
+from utils.adaptive_batch_size import AdaptiveBatchSize
+from utils.feed_snapshot import FeedSnapshot
+from utils.feed_source import feed_name, open_feed
+from utils.inventory_columns import InventoryColumns
+from utils.inventory_level_store import InventoryLevelStore
+from utils.mutation_buffer import MutationBuffer
+from utils.shopify_bulk import iter_bulk_result, run_bulk_query
+from utils.shopify_queries import (
+    INVENTORY_ITEMS_BY_ID,
+    PRODUCT_VARIANTS_BY_SKU,
+    bulk_inventory_snapshot_query,
+    sku_search_query,
+)
+from utils.shopify_throttle import ShopifyCostThrottle
+from utils.sku_index import SkuIndex
+from utils.stock_diff import (
+    STOCK_MUTATIONS,
+    check_conflict,
+    group_by_location,
+    log_batch_result,
+    mutation_user_errors,
+    new_batch_result,
+    record_changes,
+    split_stock_changes,
+    stock_changes,
+    stock_mutation_variables,
+    variant_stock,
+)
+from utils.stock_diff_report import StockDiffReport
+from utils.stock_feed import (
+    StockRowErrors,
+    batch_stock_rows,
+    deduplicate_stock_rows,
+    read_stock_rows,
+    read_stock_rows_fast,
+)
+from utils.sync_checkpoint import SyncCheckpoint, file_fingerprint
+from utils.sync_metrics import SyncMetrics
 
 
 class ShopifyUpdateStockCsvOperator(BaseOperator):
@@ -13,15 +55,107 @@ class ShopifyUpdateStockCsvOperator(BaseOperator):
     Operator that takes a CSV file (columns: sku, stock) as input
     and syncs the stock of corresponding product variants in Shopify.
     Works through the list of product variants in adjustable batches using two Shopify API requests each.
-    Use batch size and wait time between batches to optimize for performance and avoid API throttling, if needed.
+    Requests are throttled based on the query cost reported by the Shopify API,
+    waiting only as long as needed for the next request to fit into the cost bucket.
     :param conn_id: Shopify connection
-    :param location_id: Shopify location GraphQL API id to define at which location to update the inventory
-    :param file_location: File location of the CSV file
-    :param sku_per_request: Number of SKU to be used for each batch of Shopify API requests
-    :param wait_seconds: Seconds to wait between batches of Shopify API requests
+    :param location_id: Shopify location GraphQL API id to define at which location to update the inventory.
+                        A dictionary mapping the values of a third CSV column to location ids
+                        updates multiple locations in one task, sharing the SKU lookups.
+    :param file_location: File location of the CSV file, optionally compressed (.gz, .bz2, .xz, .zst).
+                          Also accepts a `file://` or other fsspec URL, or a file object.
+                          Compressed files are decompressed while streaming them.
+    :param sku_per_request: Number of SKU to be used for each batch of Shopify API requests,
+                            the initial number if `adaptive_batch_size` is enabled
+    :param adaptive_batch_size: Grow the batches while lookups are fast and shrink them after
+                                slow, throttled or failed lookups (AIMD), within the bounds below.
+                                A failed lookup is retried in two halves. Sizes are logged.
+    :param min_sku_per_request: Minimum number of SKU per batch in adaptive mode
+    :param max_sku_per_request: Maximum number of SKU per batch in adaptive mode
+    :param target_request_seconds: Lookups slower than this shrink the batches in adaptive mode
+    :param max_search_query_length: Maximum length of the SKU search query of a batch in adaptive mode
+    :param wait_seconds: Additional fixed seconds to wait between batches of Shopify API requests
+    :param max_throttle_retries: Number of retries for requests rejected as THROTTLED
+    :param max_workers: Number of batches processed concurrently, sharing the cost throttle.
+                        Batches are processed sequentially by default.
+    :param sku_index_location: File location of a SQLite index of SKU to inventory item ids.
+                               Batches of known SKUs skip the product variants lookup and read
+                               the available stock at the location by inventory item id.
+                               A batch still takes one read, and SKUs missing in Shopify are
+                               never known, so batches containing them are looked up as without index.
+    :param sku_index_ttl_seconds: Seconds after which an index entry is looked up again
+    :param sku_index_max_entries: Maximum number of entries kept in the index
+    :param inventory_level_store_location: File location of a SQLite store of the available stock
+                                           at the location(s), fed by `inventory_levels/update`
+                                           webhooks and the stock read and updated by syncs.
+                                           SKUs with a fresh level skip reading their stock.
+    :param inventory_level_ttl_seconds: Seconds a stored level is fresh, older levels are read again
+    :param inventory_webhook_location: Directory of queued `inventory_levels/update` webhook payloads
+                                       (`.json` files), applied to the store and removed before the sync.
+                                       Invalid payloads are moved to its `rejected` subdirectory.
+    :param bulk_snapshot: Read the current stock of all product variants at the location
+                          with a single bulk operation instead of querying each batch
+    :param bulk_poll_seconds: Seconds to wait between bulk operation status requests
+    :param bulk_timeout_seconds: Seconds after which waiting for the bulk operation is aborted
+    :param max_rows_in_memory: Maximum number of unique SKUs held in memory to remove duplicates,
+                               larger files are deduplicated via sorted temporary files
+    :param delta_snapshot_location: File location of a SQLite snapshot of the last pushed stock data.
+                                    Only SKUs whose stock in the file changed since are synced.
+    :param full_reconcile_interval_seconds: Seconds after which all SKUs are synced again, None to never reconcile
+    :param force_full_reconcile: Sync all SKUs in this run regardless of the snapshot
+    :param update_mode: "adjust" to send stock deltas via inventoryAdjustQuantities (default),
+                        "set" to send absolute stock via inventorySetQuantities
+    :param compare_quantity: In "set" mode, only set stock if it still equals the stock read
+                             before, retrying the batch on conflicts. If disabled, SKUs with a
+                             level at the location in the inventory level store are set
+                             without reading their stock first.
+    :param max_conflict_retries: Number of retries of a batch whose stock changed during the update
+    :param max_changes_per_mutation: Maximum number of stock changes sent in a single mutation,
+                                     changes of all locations of a batch are combined up to it
+    :param coalesce_mutations: Collect the changes of consecutive batches and send them in full
+                               mutations of `max_changes_per_mutation` changes, instead of
+                               one mutation per batch. Requires "adjust" mode or disabled
+                               `compare_quantity`, as conflicts are retried per batch.
+    :param max_mutation_delay_seconds: Seconds after which collected changes are sent
+                                       even if the mutation is not full
+    :param dry_run_report_location: File location of a report of the stock changes found by a dry
+                                    run, instead of logging the mutations of each batch. One row
+                                    per changed SKU (sku, location_id, inventory_item_id, current,
+                                    desired, delta) is streamed to CSV, gzip compressed CSV (.gz)
+                                    or Parquet (.parquet, requires pyarrow). Its statistics are
+                                    added to the summary. Requires `dry_run`.
+    :param batch_metrics: Emit the timings of every batch to StatsD in addition to the
+                          summary of the sync, which is also pushed to XCom
+    :param fast_csv_parser: Parse the CSV file with pyarrow in blocks, if it is installed
+    :param max_invalid_rows: Number of invalid rows (blank SKU, invalid stock, ...) that are
+                             skipped and reported before the file is rejected, None for no limit.
+                             A file without any valid rows is always rejected.
+    :param checkpoint_location: File location of a SQLite checkpoint of the completed batches.
+                                A retry resumes after the last completed batch, unless the
+                                file changed. The failed batch is read again before updating,
+                                so partially applied mutations are not applied twice.
+    :param cost_share: Share of the shop's cost bucket and restore rate used by this task, e.g. 0.25
+                       for one of four mapped shard tasks running at the same time. By default
+                       the share is `pool_slots` divided by the slots of the task's pool, unless
+                       it runs in the default pool. Sizing a pool to the shop's restore rate
+                       in points per second and `pool_slots` to the points per second of a
+                       task lets Airflow run only as many shard tasks as the budget allows.
+    :param deferrable: Run the sync on the triggerer with asyncio requests, freeing the
+                       worker slot. The CSV file must be readable from the triggerer.
+                       Supports a single location, without SKU index, inventory level store,
+                       bulk snapshot, delta snapshot, checkpoint or adaptive batch size.
+                       Disabled by default regardless of `default_deferrable`, as the
+                       unsupported options would otherwise fail existing tasks.
     """
 
-    template_fields = ["file_location"]
+    template_fields = [
+        "file_location",
+        "sku_index_location",
+        "inventory_level_store_location",
+        "inventory_webhook_location",
+        "delta_snapshot_location",
+        "checkpoint_location",
+        "dry_run_report_location",
+    ]
 
     @apply_defaults
     def __init__(
@@ -30,8 +164,41 @@ class ShopifyUpdateStockCsvOperator(BaseOperator):
         location_id,
         file_location,
         sku_per_request=100,
-        wait_seconds=1,
+        wait_seconds=0,
         dry_run=False,
+        max_throttle_retries=5,
+        max_workers=1,
+        sku_index_location=None,
+        sku_index_ttl_seconds=30 * 24 * 60 * 60,
+        sku_index_max_entries=None,
+        bulk_snapshot=False,
+        bulk_poll_seconds=5,
+        bulk_timeout_seconds=3600,
+        max_rows_in_memory=1_000_000,
+        delta_snapshot_location=None,
+        full_reconcile_interval_seconds=7 * 24 * 60 * 60,
+        force_full_reconcile=False,
+        update_mode="adjust",
+        compare_quantity=True,
+        max_conflict_retries=3,
+        max_changes_per_mutation=250,
+        batch_metrics=False,
+        checkpoint_location=None,
+        fast_csv_parser=False,
+        max_invalid_rows=None,
+        deferrable=False,
+        adaptive_batch_size=False,
+        min_sku_per_request=10,
+        max_sku_per_request=250,
+        target_request_seconds=2.0,
+        max_search_query_length=None,
+        cost_share=None,
+        coalesce_mutations=False,
+        max_mutation_delay_seconds=60,
+        inventory_level_store_location=None,
+        inventory_level_ttl_seconds=60 * 60,
+        inventory_webhook_location=None,
+        dry_run_report_location=None,
         *args,
         **kwargs,
     ):
@@ -42,160 +209,989 @@ class ShopifyUpdateStockCsvOperator(BaseOperator):
         self.sku_per_request = sku_per_request
         self.wait_seconds = wait_seconds
         self.dry_run = dry_run
+        self.max_throttle_retries = max_throttle_retries
+        self.max_workers = max_workers
+        self.sku_index_location = sku_index_location
+        self.sku_index_ttl_seconds = sku_index_ttl_seconds
+        self.sku_index_max_entries = sku_index_max_entries
+        self.sku_index = None
+        self.bulk_snapshot = bulk_snapshot
+        self.bulk_poll_seconds = bulk_poll_seconds
+        self.bulk_timeout_seconds = bulk_timeout_seconds
+        self.inventory_snapshot = None
+        self.max_rows_in_memory = max_rows_in_memory
+        self.delta_snapshot_location = delta_snapshot_location
+        self.full_reconcile_interval_seconds = full_reconcile_interval_seconds
+        self.force_full_reconcile = force_full_reconcile
+        if update_mode not in ("adjust", "set"):
+            raise AirflowException(f"Invalid update mode: {update_mode}")
+        self.update_mode = update_mode
+        self.compare_quantity = compare_quantity
+        self.max_conflict_retries = max_conflict_retries
+        self.max_changes_per_mutation = max_changes_per_mutation
+        if coalesce_mutations and update_mode == "set" and compare_quantity:
+            raise AirflowException(
+                'Mutation coalescing requires update mode "adjust" or compare_quantity disabled'
+            )
+        self.coalesce_mutations = coalesce_mutations
+        self.max_mutation_delay_seconds = max_mutation_delay_seconds
+        self.batch_metrics = batch_metrics
+        self.checkpoint_location = checkpoint_location
+        self.fast_csv_parser = fast_csv_parser
+        self.max_invalid_rows = max_invalid_rows
+        self.deferrable = deferrable
+        self.adaptive_batch_size = adaptive_batch_size
+        self.min_sku_per_request = min_sku_per_request
+        self.max_sku_per_request = max_sku_per_request
+        self.target_request_seconds = target_request_seconds
+        self.max_search_query_length = max_search_query_length
+        self.batch_size = None
+        self.cost_share = cost_share
+        self.inventory_level_store_location = inventory_level_store_location
+        self.inventory_level_ttl_seconds = inventory_level_ttl_seconds
+        self.inventory_webhook_location = inventory_webhook_location
+        self.inventory_levels = None
+        if dry_run_report_location and not dry_run:
+            raise AirflowException("A dry run report requires dry_run")
+        self.dry_run_report_location = dry_run_report_location
+        self.metrics = SyncMetrics()
+        self.throttle = ShopifyCostThrottle(max_retries=max_throttle_retries)
 
     def execute(self, context):
         """Updates product variants (SKU) stock at the given location via the Shopify API"""
-        shopify_hook = ShopifyHook(conn_id=self.conn_id)
-        client = shopify_hook.get_conn()
+        self.throttle.share = self.get_cost_share()
+        if self.deferrable:
+            self.defer(trigger=self.get_sync_trigger(), method_name="execute_complete")
 
-        stock_data = self.read_stock_data()
+        shopify_hook = ShopifyHook(
+            conn_id=self.conn_id, pool_size=self.connection_pool_size()
+        )
+        try:
+            # The summary is pushed to XCom as return value
+            return self.sync_stock(shopify_hook.get_session_client())
+        finally:
+            shopify_hook.close()
 
-        index = 0
+    def connection_pool_size(self):
+        """Number of keep-alive connections reused for the whole task, one per worker thread.
+        Coalesced mutations are sent by the task's own thread while the workers read.
+        """
+        if self.coalesce_mutations:
+            return self.max_workers + 1
+        return max(self.max_workers, 1)
+
+    def get_cost_share(self):
+        """Share of the shop's cost budget of this task, see `cost_share`"""
+        if self.cost_share is not None:
+            share = self.cost_share
+        elif self.pool == Pool.DEFAULT_POOL_NAME:
+            share = 1.0
+        else:
+            pool = Pool.get_pool(self.pool)
+            # Unlimited pools have -1 slots
+            if pool is None or pool.slots <= 0:
+                share = 1.0
+            else:
+                share = self.pool_slots / pool.slots
+        if not 0 < share <= 1:
+            raise AirflowException(f"Invalid cost share: {share}")
+        if share < 1:
+            self.log.info(f"Using {share:.0%} of the shop's cost budget")
+        return share
+
+    def get_sync_trigger(self):
+        """Builds the trigger running the sync in deferrable mode.
+
+        :raises AirflowException: If options not supported in deferrable mode are set.
+        """
+        unsupported = [
+            name
+            for name in (
+                "sku_index_location",
+                "inventory_level_store_location",
+                "bulk_snapshot",
+                "delta_snapshot_location",
+                "checkpoint_location",
+                "adaptive_batch_size",
+                "coalesce_mutations",
+                "dry_run_report_location",
+            )
+            if getattr(self, name)
+        ]
+        if isinstance(self.location_id, dict):
+            unsupported.append("location_id mapping multiple locations")
+        if not isinstance(self.file_location, str):
+            unsupported.append("file object as file_location")
+        if unsupported:
+            raise AirflowException(
+                f"Not supported in deferrable mode: {', '.join(unsupported)}"
+            )
+
+        return ShopifyStockSyncTrigger(
+            conn_id=self.conn_id,
+            location_id=self.location_id,
+            file_location=self.file_location,
+            task_id=self.task_id,
+            sku_per_request=self.sku_per_request,
+            wait_seconds=self.wait_seconds,
+            dry_run=self.dry_run,
+            max_throttle_retries=self.max_throttle_retries,
+            max_workers=self.max_workers,
+            max_rows_in_memory=self.max_rows_in_memory,
+            update_mode=self.update_mode,
+            compare_quantity=self.compare_quantity,
+            max_conflict_retries=self.max_conflict_retries,
+            max_changes_per_mutation=self.max_changes_per_mutation,
+            batch_metrics=self.batch_metrics,
+            fast_csv_parser=self.fast_csv_parser,
+            max_invalid_rows=self.max_invalid_rows,
+            cost_share=self.throttle.share,
+        )
+
+    def execute_complete(self, context, event):
+        """Resumes after the trigger finished the sync in deferrable mode.
+
+        :return: Summary of the sync, pushed to XCom.
+        :raises AirflowException: If the sync failed on the triggerer.
+        """
+        if event["status"] != "success":
+            raise AirflowException(f"Stock sync failed: {event['message']}")
+        self.log.info(f"Sync summary: {json.dumps(event['summary'])}")
+        return event["summary"]
+
+    def sync_stock(self, client):
+        """Syncs the stock data of the CSV file to the location(s) of a shop.
+
+        :param client: The Shopify GraphQL client of the shop.
+        :return: Summary of the timings, SKU counts and query cost of the sync.
+        """
+        self.metrics = SyncMetrics(
+            tags={"task_id": self.task_id, "conn_id": str(self.conn_id)},
+            batch_metrics=self.batch_metrics,
+        )
+        self.batch_size = None
+        if self.adaptive_batch_size:
+            self.batch_size = AdaptiveBatchSize(
+                initial=self.sku_per_request,
+                minimum=self.min_sku_per_request,
+                maximum=self.max_sku_per_request,
+                target_seconds=self.target_request_seconds,
+                max_search_length=self.max_search_query_length,
+                log=self.log,
+            )
 
         # Update stock in batches with length of sku_per_request
-        while index < len(stock_data):
+        stock_batches = self.read_stock_batches()
 
-            # Get product variants result the current batch of skus from the Shopify API
-            product_variants_result = self.get_product_variants(
-                client, list(stock_data)[index : index + self.sku_per_request]
+        if self.bulk_snapshot:
+            self.inventory_snapshot = {
+                location_id: self.get_inventory_snapshot(client, location_id)
+                for location_id in self.location_ids
+            }
+        elif self.sku_index_location:
+            self.sku_index = SkuIndex(
+                self.sku_index_location,
+                ttl_seconds=self.sku_index_ttl_seconds,
+                max_entries=self.sku_index_max_entries,
             )
+            self.log.info(f"Using SKU index with {len(self.sku_index)} entries")
+        elif len(self.location_ids) > 1:
+            # Look up the inventory item of each SKU once for all locations
+            self.sku_index = SkuIndex(":memory:")
+        if self.inventory_level_store_location and not self.bulk_snapshot:
+            self.inventory_levels = self.open_inventory_level_store()
 
-            # Calculate stock delta and build inventory changes for stock update query
-            inventory_changes = ""
+        feed_snapshot = None
+        full_reconcile = True
+        if self.delta_snapshot_location:
+            feed_snapshot = FeedSnapshot(
+                self.delta_snapshot_location, self.feed_snapshot_key
+            )
+            full_reconcile = (
+                self.force_full_reconcile
+                or feed_snapshot.is_reconcile_due(self.full_reconcile_interval_seconds)
+            )
+            if full_reconcile:
+                self.log.info("Full reconcile, syncing all SKUs")
+            else:
+                self.log.info(
+                    "Delta sync, syncing SKUs changed since the last run only"
+                )
+                stock_batches = self.filter_changed_batches(
+                    stock_batches, feed_snapshot
+                )
+
+        # A delta sync skips batches committed to the feed snapshot by itself
+        checkpoint = None
+        if self.checkpoint_location and full_reconcile and not self.dry_run:
+            checkpoint = SyncCheckpoint(
+                self.checkpoint_location, self.feed_snapshot_key
+            )
+
+        diff_report = None
+        try:
+            if self.dry_run_report_location:
+                diff_report = StockDiffReport(self.dry_run_report_location)
+            if checkpoint is not None:
+                fingerprint = self.get_checkpoint_fingerprint()
+                completed = checkpoint.load(fingerprint)
+                if completed and self.batch_size is not None:
+                    # Batch sizes differ between attempts, so the checkpoint counts SKUs
+                    self.log.info(
+                        f"Resuming after {completed} sku completed by a previous attempt"
+                    )
+                    self.metrics.increment("resumed_skus", completed)
+                    stock_batches.close()
+                    stock_batches = self.read_stock_batches(skip_skus=completed)
+                elif completed:
+                    self.log.info(
+                        f"Resuming after {completed} batches completed by a previous attempt"
+                    )
+                    self.metrics.increment("resumed_batches", completed)
+                    stock_batches = itertools.islice(stock_batches, completed, None)
+
+            batch_results = self.process_batches(client, stock_batches)
+            if self.coalesce_mutations:
+                batch_results = self.coalesce_batches(client, batch_results)
+            for batch_result in batch_results:
+                self.log_batch_result(batch_result)
+                self.metrics.record_batch(batch_result)
+                if diff_report is not None:
+                    diff_report.write(batch_result.get("diff", []))
+                if feed_snapshot is not None and not self.dry_run:
+                    feed_snapshot.commit(batch_result["stock_batch"])
+                if checkpoint is not None:
+                    # Results arrive in batch order, all earlier batches are done
+                    completed += 1 if self.batch_size is None else batch_result["skus"]
+                    checkpoint.save(fingerprint, completed)
+            if feed_snapshot is not None and full_reconcile and not self.dry_run:
+                feed_snapshot.mark_reconciled()
+            if checkpoint is not None:
+                checkpoint.clear()
+        finally:
+            if self.sku_index is not None:
+                self.sku_index.close()
+                self.sku_index = None
+            if self.inventory_levels is not None:
+                self.metrics.increment("cached", self.inventory_levels.hits)
+                self.inventory_levels.close()
+                self.inventory_levels = None
+            if feed_snapshot is not None:
+                feed_snapshot.close()
+            if checkpoint is not None:
+                checkpoint.close()
+            if diff_report is not None:
+                diff_report.close()
 
-            for product_variant in product_variants_result["data"]["productVariants"][
-                "edges"
-            ]:
-                updated_stock = (
-                    stock_data[product_variant["node"]["sku"]]
-                    - product_variant["node"]["inventoryQuantity"]
+        summary = self.metrics.summary(self.throttle)
+        if self.batch_size is not None:
+            summary.update(self.batch_size.summary())
+        if diff_report is not None:
+            self.log.info(
+                f'DRY RUN - {diff_report.rows} stock changes written to "{self.dry_run_report_location}"'
+            )
+            summary.update(diff_report.summary())
+        self.metrics.emit(summary)
+        self.log.info(f"Sync summary: {json.dumps(summary)}")
+        return summary
+
+    def open_inventory_level_store(self):
+        """Opens the inventory level store and applies the queued webhook payloads.
+        Invalid payloads are moved aside and counted, see `InventoryLevelStore`.
+
+        :return: The InventoryLevelStore.
+        :raises AirflowException: If the queued webhook payloads cannot be read.
+        """
+        inventory_levels = InventoryLevelStore(
+            self.inventory_level_store_location,
+            ttl_seconds=self.inventory_level_ttl_seconds,
+            log=self.log,
+        )
+        if self.inventory_webhook_location:
+            try:
+                applied = inventory_levels.ingest_webhook_files(
+                    self.inventory_webhook_location
                 )
-                # Skip if no change in stock level
-                if updated_stock == 0:
-                    continue
-                inventory_changes += (
-                    '{inventoryItemId: "'
-                    + product_variant["node"]["inventoryItem"]["id"]
-                    + '", delta: '
-                    + str(updated_stock)
-                    + ', locationId: "'
-                    + self.location_id
-                    + '"},'
+            except Exception as e:
+                inventory_levels.close()
+                raise AirflowException(f"Error applying inventory webhooks. {e}")
+            self.log.info(
+                f"Applied {applied} inventory level webhooks, rejected {inventory_levels.rejected}"
+            )
+            self.metrics.increment("rejected_webhooks", inventory_levels.rejected)
+        self.log.info(
+            f"Using inventory level store with {len(inventory_levels)} levels"
+        )
+        return inventory_levels
+
+    def get_checkpoint_fingerprint(self):
+        """Fingerprint of the CSV file and the parameters that determine its batches.
+
+        :raises AirflowException: If there is an error reading the CSV file.
+        """
+        try:
+            return file_fingerprint(
+                self.file_location,
+                "adaptive" if self.adaptive_batch_size else self.sku_per_request,
+                self.max_rows_in_memory,
+                json.dumps(self.location_id, sort_keys=True),
+            )
+        except Exception as e:
+            raise AirflowException(f"Error trying to read file. {e}")
+
+    @property
+    def location_ids(self):
+        """List of all locations the stock is synced to"""
+        if isinstance(self.location_id, dict):
+            return list(self.location_id.values())
+        return [self.location_id]
+
+    @property
+    def feed_snapshot_key(self):
+        """Key of the feed snapshot of the CSV file and location(s)"""
+        name = feed_name(self.file_location)
+        if isinstance(self.location_id, dict):
+            # Rows of multiple locations are keyed by location in the snapshot
+            return name
+        return f"{self.location_id}:{name}"
+
+    def filter_changed_batches(self, stock_batches, feed_snapshot):
+        """Filters batches of stock data to SKUs changed since the feed snapshot
+        and regroups them into full batches.
+
+        :param stock_batches: Iterable of dictionaries mapping SKUs to their desired stock quantities.
+        :param feed_snapshot: The FeedSnapshot of the previous runs.
+        :return: Generator of dictionaries mapping changed SKUs to their desired stock quantities.
+        """
+        counts = {"read": 0, "changed": 0}
+
+        def changed_rows():
+            for stock_batch in stock_batches:
+                changed = feed_snapshot.changed(stock_batch)
+                counts["read"] += len(stock_batch)
+                counts["changed"] += len(changed)
+                self.metrics.increment("skipped", len(stock_batch) - len(changed))
+                yield from changed.items()
+
+        yield from self.group_stock_batches(changed_rows())
+        self.log.info(
+            f"Skipped {counts['read'] - counts['changed']} sku unchanged since the last run"
+        )
+
+    def process_batches(self, client, stock_batches):
+        """Processes batches of SKUs, concurrently if `max_workers` is greater than one.
+
+        :param client: The Shopify GraphQL client to use for executing the queries.
+        :param stock_batches: Iterable of dictionaries mapping SKUs to their desired stock quantities.
+        :return: Generator of batch results in the order of the batches.
+        """
+        if self.max_workers <= 1:
+            for stock_batch in stock_batches:
+                yield self.process_batch(client, stock_batch)
+                self.wait_between_batches()
+            return
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Keep a bounded window of batches in flight, the cost throttle is shared
+            in_flight = deque()
+            for stock_batch in stock_batches:
+                in_flight.append(
+                    executor.submit(self.process_batch, client, stock_batch)
+                )
+                if len(in_flight) >= self.max_workers * 2:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+
+    def process_batch(self, client, stock_batch):
+        """Looks up the product variants of a batch of SKUs and updates their stock.
+
+        :param client: The Shopify GraphQL client to use for executing the queries.
+        :param stock_batch: A dictionary mapping the SKUs of the batch, or (sku, location id)
+                            tuples for multiple locations, to their desired stock quantities.
+        :return: Dictionary with the stock update mutations and responses of the batch.
+        """
+        batch_result = new_batch_result(stock_batch)
+        # Known inventory levels can be set without reading their current stock,
+        # unless the dry run report needs it
+        read_quantities = (
+            self.update_mode == "adjust"
+            or self.compare_quantity
+            or bool(self.dry_run_report_location)
+        )
+
+        while True:
+            lookup_start = time.perf_counter()
+            changed_skus = [] if self.dry_run_report_location else None
+            try:
+                # The bulk snapshot is not refreshed, conflicts are read again live
+                inventory_changes, found, unmatched = self.get_inventory_changes(
+                    client,
+                    stock_batch,
+                    read_quantities,
+                    changed_skus,
+                    read_live=batch_result["conflicts"] > 0,
+                )
+            except AirflowException:
+                if (
+                    self.batch_size is None
+                    or len(stock_batch) <= self.batch_size.minimum
+                ):
+                    raise
+                # The batch may be too large for a single lookup, retry it in halves
+                self.batch_size.record_error()
+                self.log.warning(
+                    f"Lookup of {len(stock_batch)} sku failed, retrying in two halves",
+                    exc_info=True,
                 )
+                return self.process_split_batch(client, stock_batch)
+            batch_result["lookup_seconds"] += time.perf_counter() - lookup_start
+            record_changes(batch_result, inventory_changes, found, unmatched)
 
             # Skip if no changes in any stock level were found
             if len(inventory_changes) == 0:
-                self.log.info(
-                    "Update stock query skipped, because of no stock level changes for product variants in batch"
+                return batch_result
+
+            if self.dry_run_report_location:
+                # Written to the report by sync_stock, no mutations are built
+                batch_result["diff"] = [
+                    (sku, location_id, inventory_item_id, current, desired)
+                    for sku, (inventory_item_id, location_id, desired, current) in zip(
+                        changed_skus, inventory_changes
+                    )
+                ]
+                return batch_result
+
+            # Changes of all locations are combined, up to the maximum per mutation
+            batch_result["query"] = STOCK_MUTATIONS[self.update_mode][0]
+            if self.coalesce_mutations:
+                # Sent by coalesce_batches, together with the changes of other batches
+                batch_result["pending_changes"] = inventory_changes
+                return batch_result
+            batch_result["mutations"] = [
+                self.build_mutation_variables(changes)
+                for changes in split_stock_changes(
+                    inventory_changes, self.max_changes_per_mutation
                 )
-                index = index + self.sku_per_request
-                time.sleep(self.wait_seconds)
-                continue
+            ]
+            if self.dry_run:
+                return batch_result
 
-            # Update stock for product variants using calculated deltas
-            stock_update_query = (
-                """
-                mutation {
-                  inventoryAdjustQuantities(input: {
-                    reason: "other",
-                    name: "available",
-                    changes : ["""
-                + inventory_changes
-                + """]
-                  })
-                }
-            """
+            batch_result["responses"] = []
+            user_errors = None
+            mutation_start = time.perf_counter()
+            for variables in batch_result["mutations"]:
+                stock_update_response = self.update_stock(
+                    client, batch_result["query"], variables
+                )
+                user_errors = mutation_user_errors(
+                    stock_update_response, self.mutation_name
+                )
+                if user_errors:
+                    break
+                batch_result["responses"].append(stock_update_response)
+            batch_result["mutation_seconds"] += time.perf_counter() - mutation_start
+
+            if not user_errors:
+                if self.inventory_levels is not None:
+                    self.inventory_levels.update_quantities(inventory_changes)
+                return batch_result
+
+            # Stock changed since it was read, e.g. by an order, read it again and retry
+            check_conflict(batch_result, user_errors, self.max_conflict_retries)
+            if self.inventory_levels is not None:
+                self.invalidate_inventory_levels(stock_batch)
+            self.log.warning(
+                f"Stock changed during update, retrying batch ({batch_result['conflicts']}/{self.max_conflict_retries})"
             )
-            if self.dry_run:
-                self.log.info("DRY RUN - Query for batch:")
-                self.log.info(stock_update_query)
-            else:
-                try:
-                    response = client.execute(stock_update_query)
-                    stock_update_response = json.loads(response)
-                except Exception as e:
-                    raise AirflowException(f"Error updating stock: {e}")
-
-                if "errors" in stock_update_response:
-                    raise AirflowException(
-                        f"Errors returned by Shopify API for stock update query: {stock_update_response['errors']}"
-                    )
 
-                self.log.info(
-                    f"Update stock query cost: {stock_update_response['extensions']}"
+    def process_split_batch(self, client, stock_batch):
+        """Processes the two halves of a batch and combines their results.
+
+        :param client: The Shopify GraphQL client to use for executing the queries.
+        :param stock_batch: A dictionary mapping the SKUs of the batch to their desired stock quantities.
+        :return: Dictionary with the stock update mutations and responses of the whole batch.
+        """
+        items = list(stock_batch.items())
+        middle = len(items) // 2
+        first, second = (
+            self.process_batch(client, dict(half))
+            for half in (items[:middle], items[middle:])
+        )
+        batch_result = {
+            key: first[key] + second[key]
+            for key in (
+                "skus",
+                "mutations",
+                "responses",
+                "conflicts",
+                "changed",
+                "unchanged",
+                "not_found",
+                "unmatched",
+                "lookup_seconds",
+                "mutation_seconds",
+            )
+        }
+        batch_result["stock_batch"] = stock_batch
+        batch_result["query"] = first["query"] or second["query"]
+        if self.dry_run_report_location:
+            batch_result["diff"] = first.get("diff", []) + second.get("diff", [])
+        if self.coalesce_mutations:
+            batch_result["pending_changes"] = first.get(
+                "pending_changes", []
+            ) + second.get("pending_changes", [])
+        return batch_result
+
+    def coalesce_batches(self, client, batch_results):
+        """Sends the changes of consecutive batches in full mutations.
+        Changes are sent once `max_changes_per_mutation` of them are collected, when the
+        oldest waited `max_mutation_delay_seconds` by the time a batch completes, and
+        at the end. Each mutation is added to the result of the last batch it covers.
+
+        :param client: The Shopify GraphQL client to use for executing the queries.
+        :param batch_results: Iterable of batch results with pending changes, in batch order.
+        :return: Generator of the batch results in batch order, once all their changes were sent.
+        """
+        buffer = MutationBuffer(
+            self.max_changes_per_mutation, self.max_mutation_delay_seconds
+        )
+        for batch_result in batch_results:
+            buffer.add(batch_result, batch_result.pop("pending_changes", []))
+            while buffer.is_due():
+                self.send_buffered_mutation(client, buffer)
+            yield from buffer.completed()
+        while len(buffer):
+            self.send_buffered_mutation(client, buffer)
+        yield from buffer.completed()
+
+    def send_buffered_mutation(self, client, buffer):
+        """Sends the next mutation of the buffered changes.
+
+        :param client: The Shopify GraphQL client to use for executing the query.
+        :param buffer: The MutationBuffer of the pending changes.
+        :raises AirflowException: If Shopify returns user errors for the mutation.
+        """
+        inventory_changes, batch_result = buffer.take()
+        variables = self.build_mutation_variables(inventory_changes)
+        batch_result["mutations"].append(variables)
+        if self.dry_run:
+            return
+
+        mutation_start = time.perf_counter()
+        stock_update_response = self.update_stock(
+            client, batch_result["query"], variables
+        )
+        batch_result["mutation_seconds"] += time.perf_counter() - mutation_start
+        user_errors = mutation_user_errors(stock_update_response, self.mutation_name)
+        if user_errors:
+            raise AirflowException(
+                f"User errors returned by Shopify API for stock update query: {user_errors}"
+            )
+        batch_result["responses"].append(stock_update_response)
+        if self.inventory_levels is not None:
+            self.inventory_levels.update_quantities(inventory_changes)
+
+    def get_inventory_changes(
+        self,
+        client,
+        stock_batch,
+        read_quantities=True,
+        changed_skus=None,
+        read_live=False,
+    ):
+        """Calculates the stock changes of a batch, skipping product variants without change in stock level.
+
+        :param client: The Shopify GraphQL client to use for executing the queries.
+        :param stock_batch: A dictionary mapping the SKUs of the batch, or (sku, location id)
+                            tuples for multiple locations, to their desired stock quantities.
+        :param read_quantities: If False, SKUs with a stored level at their location are not read at all.
+        :param changed_skus: Optional list the SKU of each change is appended to, in the order of the changes.
+        :param read_live: Read the stock from Shopify instead of the bulk snapshot.
+        :return: List of (inventory item id, location id, desired stock, current stock) tuples,
+                 the number of SKUs found at their location and the number of variants
+                 found by the SKU search whose SKU is not part of the batch.
+        """
+        inventory_changes = []
+        found = 0
+        unmatched = 0
+        for location_id, location_stock in group_by_location(
+            stock_batch, self.location_id
+        ).items():
+            if self.inventory_snapshot is not None and not read_live:
+                # Compare against the bulk snapshot columns in one operation
+                location_changes, location_found = self.inventory_snapshot[
+                    location_id
+                ].changes(location_stock, changed_skus)
+                found += location_found
+                inventory_changes.extend(
+                    (inventory_item_id, location_id, desired, current)
+                    for inventory_item_id, desired, current in location_changes
                 )
+                continue
+
+            skus = list(location_stock)
+            current_stock = []
+            if self.inventory_levels is not None:
+                # Fresh stored levels skip reading the stock
+                current_stock = self.inventory_levels.get_many(location_id, skus)
+                stored_skus = {sku for sku, _, _ in current_stock}
+                skus = [sku for sku in skus if sku not in stored_skus]
 
-            index = index + self.sku_per_request
+            # Get current stock of the current batch of skus from the Shopify API
+            if skus:
+                read_stock = self.get_current_stock(
+                    client,
+                    skus,
+                    read_quantities=read_quantities,
+                    location_id=location_id,
+                )
+                if self.inventory_levels is not None:
+                    self.inventory_levels.put_many(
+                        location_id,
+                        [row for row in read_stock if row[2] is not None],
+                    )
+                current_stock.extend(read_stock)
+            location_changes, location_found, location_unmatched = stock_changes(
+                location_id, location_stock, current_stock, changed_skus
+            )
+            inventory_changes.extend(location_changes)
+            found += location_found
+            unmatched += location_unmatched
+        if unmatched:
+            self.log.warning(
+                f"Skipped {unmatched} product variants not in batch found by the sku search"
+            )
+        return inventory_changes, found, unmatched
+
+    def invalidate_inventory_levels(self, stock_batch):
+        """Removes the stored levels of a batch, so that its stock is read again.
+
+        :param stock_batch: A dictionary mapping the SKUs of the batch, or (sku, location id)
+                            tuples for multiple locations, to their desired stock quantities.
+        """
+        for location_id, location_stock in group_by_location(
+            stock_batch, self.location_id
+        ).items():
+            self.inventory_levels.invalidate(location_id, list(location_stock))
+
+    @property
+    def mutation_name(self):
+        """Name of the stock update mutation of the update mode"""
+        return STOCK_MUTATIONS[self.update_mode][2]
+
+    def build_mutation_variables(self, inventory_changes):
+        """Builds the variables of the stock update mutation of the update mode, adjusting stock
+        by the calculated deltas or setting absolute stock quantities.
+        Set quantities are compared against the current stock, unless it was not read.
+
+        :param inventory_changes: List of (inventory item id, location id, desired stock, current stock) tuples.
+        :return: The variables of the GraphQL mutation.
+        """
+        return stock_mutation_variables(
+            inventory_changes, self.update_mode, self.compare_quantity
+        )
+
+    def update_stock(self, client, stock_update_query, variables):
+        """Executes a stock update mutation.
+
+        :param client: The Shopify GraphQL client to use for executing the query.
+        :param stock_update_query: The GraphQL mutation.
+        :param variables: The variables of the GraphQL mutation.
+        :return: The response from Shopify.
+        """
+        try:
+            stock_update_response = self.throttle.execute(
+                client,
+                stock_update_query,
+                variables=variables,
+                operation_name=STOCK_MUTATIONS[self.update_mode][1],
+            )
+        except Exception as e:
+            raise AirflowException(f"Error updating stock: {e}")
+
+        if "errors" in stock_update_response:
+            raise AirflowException(
+                f"Errors returned by Shopify API for stock update query: {stock_update_response['errors']}"
+            )
+        return stock_update_response
+
+    def log_batch_result(self, batch_result):
+        """Logs the result of a processed batch"""
+        log_batch_result(self.log, batch_result, self.dry_run, self.mutation_name)
+
+    def wait_between_batches(self):
+        """Waits the optional fixed time between batches.
+        Throttling itself is handled by the cost based throttle before each request.
+        """
+        if self.wait_seconds > 0:
             time.sleep(self.wait_seconds)
 
-    def read_stock_data(self):
-        """Reads stock data from the CSV file specified by `file_location`.
-        The CSV file should contain two columns per row: SKU and stock quantity.
+    def read_stock_batches(self, skip_skus=0):
+        """Streams stock data from the CSV file specified by `file_location` in batches.
+        The CSV file should contain two columns per row: SKU and stock quantity,
+        plus the location as third column if `location_id` maps multiple locations.
+        If a SKU occurs more than once (at the same location), the last row wins.
+        Invalid rows are skipped and reported, up to `max_invalid_rows`.
 
-        :return: A dictionary mapping SKUs to their corresponding stock quantities.
-        :raises AirflowException: If there is an error reading the CSV file.
+        :param skip_skus: Number of unique SKUs at the start of the file to skip.
+        :return: Generator of dictionaries mapping up to `sku_per_request` SKUs to their stock quantities.
+        :raises AirflowException: If there is an error reading the CSV file
+                                  or none of its rows are valid.
         """
+        errors = StockRowErrors(max_errors=self.max_invalid_rows)
         try:
-            with open(self.file_location) as csv_file:
-                stock_data = {row[0]: int(row[1]) for row in csv.reader(csv_file)}
-                self.log.info(
-                    f'Parsed {len(stock_data)} sku from csv file "{self.file_location}"'
-                )
-                return stock_data
+            sku_count = 0
+            rows = deduplicate_stock_rows(
+                self.read_stock_rows(errors), self.max_rows_in_memory
+            )
+            stock_batches = self.group_stock_batches(
+                itertools.islice(rows, skip_skus, None)
+            )
+            while True:
+                parse_start = time.perf_counter()
+                stock_batch = next(stock_batches, None)
+                self.metrics.add_seconds("parse", time.perf_counter() - parse_start)
+                if stock_batch is None:
+                    break
+                sku_count += len(stock_batch)
+                yield stock_batch
+            self.log.info(
+                f'Parsed {sku_count} sku from csv file "{feed_name(self.file_location)}"'
+            )
         except Exception as e:
             raise AirflowException(f"Error trying to read file. {e}")
 
-    def get_product_variants(self, client, skus):
-        """Retrieves the productVariants API response for a list of SKUs from the Shopify API.
+        if errors:
+            self.log.warning(f"Skipped {len(errors)} rows. {errors.report()}")
+            self.metrics.increment("invalid_rows", len(errors))
+            # E.g. a wrong delimiter or header, regardless of `max_invalid_rows`
+            if sku_count == 0 and skip_skus == 0:
+                raise AirflowException(f"No valid rows in csv file. {errors.report()}")
 
-        :param client: The Shopify GraphQL client to use for executing the query.
+    def group_stock_batches(self, rows):
+        """Groups a stream of (sku, stock) rows into batches of `sku_per_request` SKUs,
+        or of the current adaptive batch size.
+
+        :param rows: Iterable of (sku, stock) tuples.
+        :return: Generator of dictionaries mapping SKUs to stock quantities.
+        """
+        if self.batch_size is not None:
+            return self.batch_size.batches(rows)
+        return batch_stock_rows(rows, self.sku_per_request)
+
+    def read_stock_rows(self, errors):
+        """Reads the (sku, stock) rows of the CSV file with the configured parser.
+
+        :param errors: StockRowErrors recording the invalid rows.
+        :return: Generator of (sku, stock) or ((sku, location id), stock) tuples in file order.
+        """
+        locations = self.location_id if isinstance(self.location_id, dict) else None
+        if self.fast_csv_parser:
+            yield from read_stock_rows_fast(self.file_location, locations, errors)
+            return
+        with open_feed(self.file_location) as csv_file:
+            yield from read_stock_rows(csv_file, locations, errors)
+
+    def get_current_stock(self, client, skus, read_quantities=True, location_id=None):
+        """Retrieves inventory item id and current stock for a list of SKUs.
+        If all SKUs are known to the SKU index, they are read by inventory item id.
+        Otherwise they are looked up via the productVariants API, as reading the known
+        SKUs by id would take a second request for the same batch.
+
+        :param client: The Shopify GraphQL client to use for executing the queries.
         :param skus: List of SKUs to retrieve stock information for.
-        :return: The response from Shopify containing the product variants.
-        """
-        sku_query = ""
-
-        for sku in skus:
-            if len(sku_query) > 0:
-                sku_query += " OR "
-            sku_query += f"sku:{sku}"
-
-        inventory_query = (
-            """
-            query {
-            productVariants(first: """
-            + str(self.sku_per_request)
-            + """, query: \""""
-            + sku_query
-            + """\") {
-                edges {
-                cursor
-                node {
-                    sku
-                    inventoryQuantity
-                    inventoryItem {
-                    id
-                    }
-                }
-                }
-                pageInfo {
-                    hasNextPage
-                    hasPreviousPage
-                }
-            }
-            }"""
+        :param read_quantities: If False, SKUs whose level at the location is known to the
+                                inventory level store are not read at all and returned
+                                with a current stock of None.
+        :param location_id: Location to read the stock at, defaults to `location_id`.
+        :return: List of (sku, inventory item id, current stock) tuples for all SKUs
+                 stocked at the location.
+        """
+        location_id = location_id or self.location_id
+        current_stock = []
+        lookup_skus = skus
+
+        if not read_quantities and self.inventory_levels is not None:
+            # Only levels known to exist can be set, others may not be stocked at the location
+            known_ids = self.inventory_levels.get_item_ids(location_id, skus)
+            current_stock = [
+                (sku, inventory_item_id, None)
+                for sku, inventory_item_id in known_ids.items()
+            ]
+            lookup_skus = [sku for sku in skus if sku not in known_ids]
+
+        if self.sku_index is not None and lookup_skus:
+            cached_ids = self.sku_index.get_many(lookup_skus)
+            if len(cached_ids) == len(lookup_skus):
+                inventory_items_result = self.get_inventory_items(
+                    client, list(cached_ids.values()), location_id=location_id
+                )
+                found_skus = set()
+                for node in inventory_items_result["data"]["nodes"]:
+                    # Deleted or re-assigned inventory items are looked up again
+                    if node is None or cached_ids.get(node["sku"]) != node["id"]:
+                        continue
+                    found_skus.add(node["sku"])
+                    # Skip inventory items not stocked at the location
+                    if node["inventoryLevel"] is None:
+                        continue
+                    current_stock.append(
+                        (
+                            node["sku"],
+                            node["id"],
+                            node["inventoryLevel"]["quantities"][0]["quantity"],
+                        )
+                    )
+                self.sku_index.invalidate(
+                    [sku for sku in cached_ids if sku not in found_skus]
+                )
+                lookup_skus = [sku for sku in lookup_skus if sku not in found_skus]
+
+        if not lookup_skus:
+            return current_stock
+
+        product_variants_result = self.get_product_variants(
+            client, lookup_skus, location_id=location_id
+        )
+        lookup_stock, found_ids = variant_stock(
+            product_variants_result["data"]["productVariants"]["edges"]
+        )
+
+        if self.sku_index is not None:
+            self.sku_index.put_many(found_ids)
+            self.sku_index.invalidate(
+                [sku for sku in lookup_skus if sku not in found_ids]
+            )
+
+        return current_stock + lookup_stock
+
+    def get_inventory_snapshot(self, client, location_id=None):
+        """Reads the current stock of all product variants at a location via a bulk operation.
+        The result file is streamed, only variants stocked at the location are kept.
+
+        :param client: The Shopify GraphQL client to use for executing the queries.
+        :param location_id: Location to read the stock at, defaults to `location_id`.
+        :return: InventoryColumns of the inventory item ids and current stock by SKU.
+        """
+        location_id = location_id or self.location_id
+        try:
+            url = run_bulk_query(
+                client,
+                self.throttle,
+                bulk_inventory_snapshot_query(location_id),
+                poll_seconds=self.bulk_poll_seconds,
+                timeout_seconds=self.bulk_timeout_seconds,
+            )
+            inventory_snapshot = InventoryColumns()
+            if url is not None:
+                for variant in iter_bulk_result(url):
+                    inventory_item = variant["inventoryItem"]
+                    # Skip variants not stocked at the location
+                    if inventory_item["inventoryLevel"] is None:
+                        continue
+                    inventory_snapshot.add(
+                        variant["sku"],
+                        inventory_item["id"],
+                        inventory_item["inventoryLevel"]["quantities"][0]["quantity"],
+                    )
+        except AirflowException:
+            raise
+        except Exception as e:
+            raise AirflowException(f"Error reading inventory snapshot: {e}")
+
+        self.log.info(
+            f'Read current stock of {len(inventory_snapshot)} sku at location "{location_id}" via bulk operation'
         )
+        return inventory_snapshot
+
+    def get_inventory_items(self, client, inventory_item_ids, location_id=None):
+        """Retrieves the inventory items and their available stock at the location from the Shopify API.
+
+        :param client: The Shopify GraphQL client to use for executing the query.
+        :param inventory_item_ids: List of inventory item ids.
+        :param location_id: Location to read the stock at, defaults to `location_id`.
+        :return: The response from Shopify containing the inventory item nodes.
+        """
+        location_id = location_id or self.location_id
         try:
-            response = client.execute(inventory_query)
-            product_variants_result = json.loads(response)
+            inventory_items_result = self.throttle.execute(
+                client,
+                INVENTORY_ITEMS_BY_ID,
+                variables={"ids": inventory_item_ids, "locationId": location_id},
+                operation_name="InventoryItemsById",
+            )
         except Exception as e:
-            raise AirflowException(f"Error fetching product variants: {e}")
+            raise AirflowException(f"Error fetching inventory items: {e}")
 
-        if "errors" in product_variants_result:
+        if "errors" in inventory_items_result:
             raise AirflowException(
-                f"Errors returned by Shopify API for product variants query: {product_variants_result['errors']}"
+                f"Errors returned by Shopify API for inventory items query: {inventory_items_result['errors']}"
             )
 
         self.log.info(
-            f"Inventory query cost:    {product_variants_result.get('extensions', {})}"
+            f"Inventory items query cost: {inventory_items_result.get('extensions', {})}"
         )
+        return inventory_items_result
+
+    def get_product_variants(self, client, skus, location_id=None):
+        """Retrieves the productVariants API response for a list of SKUs from the Shopify API.
+        Reads the available stock at the location and follows the cursor until all pages are fetched.
+
+        :param client: The Shopify GraphQL client to use for executing the query.
+        :param skus: List of SKUs to retrieve stock information for.
+        :param location_id: Location to read the stock at, defaults to `location_id`.
+        :return: The response from Shopify containing the product variants of all pages.
+        """
+        variables = {
+            # Adaptive batches request as many variants as they hold SKUs
+            "first": self.sku_per_request if self.batch_size is None else len(skus),
+            "after": None,
+            "query": sku_search_query(skus),
+            "locationId": location_id or self.location_id,
+        }
+
+        edges = []
+        while True:
+            request_stats = {}
+            try:
+                product_variants_result = self.throttle.execute(
+                    client,
+                    PRODUCT_VARIANTS_BY_SKU,
+                    variables=variables,
+                    operation_name="ProductVariantsBySku",
+                    request_stats=request_stats,
+                )
+            except Exception as e:
+                raise AirflowException(f"Error fetching product variants: {e}")
+
+            if "errors" in product_variants_result:
+                raise AirflowException(
+                    f"Errors returned by Shopify API for product variants query: {product_variants_result['errors']}"
+                )
+
+            self.log.info(
+                f"Inventory query cost:    {product_variants_result.get('extensions', {})}"
+            )
+
+            if self.batch_size is not None and variables["after"] is None:
+                cost = (product_variants_result.get("extensions") or {}).get(
+                    "cost"
+                ) or {}
+                self.batch_size.record(
+                    len(skus),
+                    request_stats["seconds"],
+                    requested_cost=cost.get("requestedQueryCost"),
+                    maximum_available=self.throttle.maximum_available,
+                    throttled=request_stats["retries"] > 0,
+                )
+
+            product_variants = product_variants_result["data"]["productVariants"]
+            edges.extend(product_variants["edges"])
+            page_info = product_variants.get("pageInfo") or {}
+            if not page_info.get("hasNextPage"):
+                break
+            variables = {**variables, "after": page_info["endCursor"]}
+
+        product_variants["edges"] = edges
         return product_variants_result
@@ -0,0 +1,350 @@
+import asyncio
+import json
+import time
+from collections import deque
+
+from airflow.exceptions import AirflowException
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+from hooks.shopify_hook import ShopifyHook
+from utils.feed_source import open_feed
+from utils.shopify_queries import PRODUCT_VARIANTS_BY_SKU, sku_search_query
+from utils.shopify_throttle import ShopifyCostThrottle
+from utils.stock_diff import (
+    STOCK_MUTATIONS,
+    check_conflict,
+    log_batch_result,
+    mutation_user_errors,
+    new_batch_result,
+    record_changes,
+    split_stock_changes,
+    stock_changes,
+    stock_mutation_variables,
+    variant_stock,
+)
+from utils.stock_feed import (
+    StockRowErrors,
+    batch_stock_rows,
+    deduplicate_stock_rows,
+    read_stock_rows,
+    read_stock_rows_fast,
+)
+from utils.sync_metrics import SyncMetrics
+
+
+class ShopifyStockSyncTrigger(BaseTrigger):
+    """Trigger syncing the stock data of a CSV file to a Shopify location on the triggerer,
+    used by `ShopifyUpdateStockCsvOperator` in deferrable mode.
+    Requests are sent with the asyncio client of the ShopifyHook and waits for the cost
+    throttle do not block, so one triggerer drives many syncs concurrently.
+    Parsing the CSV file runs in a thread, it must be readable from the triggerer.
+    Fires a single event with the status and the summary of the sync or the error message.
+    :param conn_id: Shopify connection
+    :param location_id: Shopify location GraphQL API id to update the inventory at
+    :param file_location: File location or URL of the CSV file
+    :param task_id: Task id of the deferred operator, used to tag the metrics
+    :param sku_per_request: Number of SKU to be used for each batch of Shopify API requests
+    :param wait_seconds: Additional fixed seconds to wait between batches of Shopify API requests
+    :param dry_run: Only log the stock update mutations
+    :param max_throttle_retries: Number of retries for requests rejected as THROTTLED
+    :param max_workers: Number of batches processed concurrently, sharing the cost throttle
+    :param max_rows_in_memory: Maximum number of unique SKUs held in memory to remove duplicates
+    :param update_mode: "adjust" to send stock deltas, "set" to send absolute stock
+    :param compare_quantity: In "set" mode, only set stock if it still equals the stock read before
+    :param max_conflict_retries: Number of retries of a batch whose stock changed during the update
+    :param max_changes_per_mutation: Maximum number of stock changes sent in a single mutation
+    :param batch_metrics: Emit the timings of every batch to StatsD
+    :param fast_csv_parser: Parse the CSV file with pyarrow in blocks, if it is installed
+    :param max_invalid_rows: Number of invalid rows skipped before the file is rejected,
+                             a file without any valid rows is always rejected
+    :param cost_share: Share of the shop's cost bucket and restore rate used by the sync
+    """
+
+    def __init__(
+        self,
+        conn_id,
+        location_id,
+        file_location,
+        task_id=None,
+        sku_per_request=100,
+        wait_seconds=0,
+        dry_run=False,
+        max_throttle_retries=5,
+        max_workers=1,
+        max_rows_in_memory=1_000_000,
+        update_mode="adjust",
+        compare_quantity=True,
+        max_conflict_retries=3,
+        max_changes_per_mutation=250,
+        batch_metrics=False,
+        fast_csv_parser=False,
+        max_invalid_rows=None,
+        cost_share=1.0,
+    ):
+        super().__init__()
+        self.conn_id = conn_id
+        self.location_id = location_id
+        self.file_location = file_location
+        self.task_id = task_id
+        self.sku_per_request = sku_per_request
+        self.wait_seconds = wait_seconds
+        self.dry_run = dry_run
+        self.max_throttle_retries = max_throttle_retries
+        self.max_workers = max_workers
+        self.max_rows_in_memory = max_rows_in_memory
+        self.update_mode = update_mode
+        self.compare_quantity = compare_quantity
+        self.max_conflict_retries = max_conflict_retries
+        self.max_changes_per_mutation = max_changes_per_mutation
+        self.batch_metrics = batch_metrics
+        self.fast_csv_parser = fast_csv_parser
+        self.max_invalid_rows = max_invalid_rows
+        self.cost_share = cost_share
+        self.metrics = SyncMetrics()
+        self.throttle = ShopifyCostThrottle(
+            max_retries=max_throttle_retries, share=cost_share
+        )
+
+    def serialize(self):
+        return (
+            f"{type(self).__module__}.{type(self).__qualname__}",
+            {
+                "conn_id": self.conn_id,
+                "location_id": self.location_id,
+                "file_location": self.file_location,
+                "task_id": self.task_id,
+                "sku_per_request": self.sku_per_request,
+                "wait_seconds": self.wait_seconds,
+                "dry_run": self.dry_run,
+                "max_throttle_retries": self.max_throttle_retries,
+                "max_workers": self.max_workers,
+                "max_rows_in_memory": self.max_rows_in_memory,
+                "update_mode": self.update_mode,
+                "compare_quantity": self.compare_quantity,
+                "max_conflict_retries": self.max_conflict_retries,
+                "max_changes_per_mutation": self.max_changes_per_mutation,
+                "batch_metrics": self.batch_metrics,
+                "fast_csv_parser": self.fast_csv_parser,
+                "max_invalid_rows": self.max_invalid_rows,
+                "cost_share": self.cost_share,
+            },
+        )
+
+    async def run(self):
+        try:
+            # The connection is read from the metadata database in a thread
+            hook = await asyncio.to_thread(
+                ShopifyHook, self.conn_id, pool_size=max(self.max_workers, 1)
+            )
+            client = hook.get_async_client()
+            try:
+                summary = await self.sync_stock(client)
+            finally:
+                await client.close()
+        except Exception as e:
+            yield TriggerEvent({"status": "error", "message": str(e)})
+            return
+        yield TriggerEvent({"status": "success", "summary": summary})
+
+    async def sync_stock(self, client):
+        """Syncs the stock data of the CSV file to the location.
+
+        :param client: The asyncio Shopify GraphQL client of the shop.
+        :return: Summary of the timings, SKU counts and query cost of the sync.
+        """
+        self.metrics = SyncMetrics(
+            tags={"task_id": str(self.task_id), "conn_id": str(self.conn_id)},
+            batch_metrics=self.batch_metrics,
+        )
+        errors = StockRowErrors(max_errors=self.max_invalid_rows)
+        stock_batches = self.read_stock_batches(errors)
+        try:
+            async for batch_result in self.process_batches(client, stock_batches):
+                self.log_batch_result(batch_result)
+                self.metrics.record_batch(batch_result)
+        finally:
+            stock_batches.close()
+        if errors:
+            self.log.warning(f"Skipped {len(errors)} rows. {errors.report()}")
+            self.metrics.increment("invalid_rows", len(errors))
+            if self.metrics.counts["skus"] == 0:
+                raise AirflowException(f"No valid rows in csv file. {errors.report()}")
+
+        summary = self.metrics.summary(self.throttle)
+        self.metrics.emit(summary)
+        self.log.info(f"Sync summary: {json.dumps(summary)}")
+        return summary
+
+    async def process_batches(self, client, stock_batches):
+        """Processes batches of SKUs, up to `max_workers` of them concurrently.
+
+        :param client: The asyncio Shopify GraphQL client to use for executing the queries.
+        :param stock_batches: Generator of dictionaries mapping SKUs to their desired stock quantities.
+        :return: Async generator of batch results in the order of the batches.
+        """
+        in_flight = deque()
+        try:
+            while True:
+                stock_batch = await self.next_stock_batch(stock_batches)
+                if stock_batch is None:
+                    break
+                in_flight.append(
+                    asyncio.ensure_future(self.process_batch(client, stock_batch))
+                )
+                if len(in_flight) >= self.max_workers:
+                    yield await in_flight.popleft()
+                    if self.max_workers <= 1 and self.wait_seconds > 0:
+                        await asyncio.sleep(self.wait_seconds)
+            while in_flight:
+                yield await in_flight.popleft()
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def next_stock_batch(self, stock_batches):
+        """Reads the next batch of the CSV file in a thread, parsing is CPU bound
+        and would block the event loop shared with other triggers.
+
+        :return: The next batch or None at the end of the file.
+        :raises AirflowException: If there is an error reading the CSV file.
+        """
+        parse_start = time.perf_counter()
+        try:
+            stock_batch = await asyncio.to_thread(next, stock_batches, None)
+        except Exception as e:
+            raise AirflowException(f"Error trying to read file. {e}")
+        self.metrics.add_seconds("parse", time.perf_counter() - parse_start)
+        return stock_batch
+
+    def read_stock_batches(self, errors):
+        """Streams the CSV file in batches of up to `sku_per_request` unique SKUs.
+
+        :param errors: StockRowErrors recording the invalid rows.
+        :return: Generator of dictionaries mapping SKUs to their stock quantities.
+        """
+        if self.fast_csv_parser:
+            rows = read_stock_rows_fast(self.file_location, errors=errors)
+            rows = deduplicate_stock_rows(rows, self.max_rows_in_memory)
+            yield from batch_stock_rows(rows, self.sku_per_request)
+            return
+        with open_feed(self.file_location) as csv_file:
+            rows = read_stock_rows(csv_file, errors=errors)
+            rows = deduplicate_stock_rows(rows, self.max_rows_in_memory)
+            yield from batch_stock_rows(rows, self.sku_per_request)
+
+    async def process_batch(self, client, stock_batch):
+        """Looks up the product variants of a batch of SKUs and updates their stock.
+        The stock changes and conflict retries are those of the operator, see `utils.stock_diff`.
+
+        :param client: The asyncio Shopify GraphQL client to use for executing the queries.
+        :param stock_batch: A dictionary mapping the SKUs of the batch to their desired stock quantities.
+        :return: Dictionary with the stock update mutations and responses of the batch.
+        """
+        batch_result = new_batch_result(stock_batch)
+        query, operation_name, mutation_name = STOCK_MUTATIONS[self.update_mode]
+
+        while True:
+            lookup_start = time.perf_counter()
+            current_stock = await self.get_current_stock(client, list(stock_batch))
+            batch_result["lookup_seconds"] += time.perf_counter() - lookup_start
+            inventory_changes, found, unmatched = stock_changes(
+                self.location_id, stock_batch, current_stock
+            )
+            record_changes(batch_result, inventory_changes, found, unmatched)
+
+            # Skip if no changes in any stock level were found
+            if len(inventory_changes) == 0:
+                return batch_result
+
+            batch_result["query"] = query
+            batch_result["mutations"] = [
+                stock_mutation_variables(
+                    changes, self.update_mode, self.compare_quantity
+                )
+                for changes in split_stock_changes(
+                    inventory_changes, self.max_changes_per_mutation
+                )
+            ]
+            if self.dry_run:
+                return batch_result
+
+            batch_result["responses"] = []
+            user_errors = None
+            mutation_start = time.perf_counter()
+            for variables in batch_result["mutations"]:
+                stock_update_response = await self.execute(
+                    client, query, variables, operation_name, "stock update"
+                )
+                user_errors = mutation_user_errors(stock_update_response, mutation_name)
+                if user_errors:
+                    break
+                batch_result["responses"].append(stock_update_response)
+            batch_result["mutation_seconds"] += time.perf_counter() - mutation_start
+
+            if not user_errors:
+                return batch_result
+
+            # Stock changed since it was read, e.g. by an order, read it again and retry
+            check_conflict(batch_result, user_errors, self.max_conflict_retries)
+            self.log.warning(
+                f"Stock changed during update, retrying batch ({batch_result['conflicts']}/{self.max_conflict_retries})"
+            )
+
+    async def get_current_stock(self, client, skus):
+        """Looks up the inventory items and their available stock at the location via the
+        productVariants API, following the cursor until all pages are fetched.
+
+        :param client: The asyncio Shopify GraphQL client to use for executing the queries.
+        :param skus: List of SKUs to retrieve stock information for.
+        :return: List of (sku, inventory item id, current stock) tuples for all SKUs
+                 stocked at the location.
+        """
+        variables = {
+            "first": self.sku_per_request,
+            "after": None,
+            "query": sku_search_query(skus),
+            "locationId": self.location_id,
+        }
+        current_stock = []
+        while True:
+            product_variants_result = await self.execute(
+                client,
+                PRODUCT_VARIANTS_BY_SKU,
+                variables,
+                "ProductVariantsBySku",
+                "product variants",
+            )
+            product_variants = product_variants_result["data"]["productVariants"]
+            current_stock.extend(variant_stock(product_variants["edges"])[0])
+            page_info = product_variants.get("pageInfo") or {}
+            if not page_info.get("hasNextPage"):
+                return current_stock
+            variables = {**variables, "after": page_info["endCursor"]}
+
+    async def execute(self, client, query, variables, operation_name, description):
+        """Executes a query through the cost throttle and checks it for errors.
+
+        :param client: The asyncio Shopify GraphQL client to use for executing the query.
+        :param query: The GraphQL document.
+        :param variables: The variables of the GraphQL document.
+        :param operation_name: Name of the operation.
+        :param description: Description of the query for error messages.
+        :return: The response from Shopify.
+        """
+        try:
+            result = await self.throttle.execute_async(
+                client, query, variables=variables, operation_name=operation_name
+            )
+        except Exception as e:
+            raise AirflowException(f"Error executing {description} query: {e}")
+
+        if "errors" in result:
+            raise AirflowException(
+                f"Errors returned by Shopify API for {description} query: {result['errors']}"
+            )
+        return result
+
+    def log_batch_result(self, batch_result):
+        """Logs the result of a processed batch"""
+        log_batch_result(
+            self.log, batch_result, self.dry_run, STOCK_MUTATIONS[self.update_mode][2]
+        )
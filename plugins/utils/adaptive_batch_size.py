@@ -0,0 +1,155 @@
+import logging
+import math
+import threading
+
+from utils.shopify_queries import sku_search_query
+
+# Separator of the SKUs in the productVariants search query
+SEARCH_SEPARATOR_LENGTH = len(" OR ")
+
+
+class AdaptiveBatchSize:
+    """AIMD controller of the number of SKUs per batch, adjusted during a sync.
+    The size grows by a fixed step after each fast lookup and shrinks by a factor
+    after slow, throttled or failed lookups. It is also capped, so that a lookup
+    requests at most a share of the cost bucket.
+    Batches are formed with the current size, so changes apply to the next batches read.
+    The controller is thread-safe, lookups of concurrent batches share it.
+    :param initial: Number of SKUs of the first batch
+    :param minimum: Minimum number of SKUs per batch
+    :param maximum: Maximum number of SKUs per batch
+    :param increase: SKUs added after a fast lookup
+    :param decrease_factor: Factor the size is multiplied with after a slow, throttled or failed lookup
+    :param target_seconds: Lookups taking longer than this, excluding waits for the cost bucket, are slow
+    :param max_cost_share: Maximum share of the cost bucket requested by a single lookup
+    :param max_search_length: Maximum length of the SKU search query of a batch, None for no limit
+    :param log: Logger the size changes are logged to
+    """
+
+    def __init__(
+        self,
+        initial=100,
+        minimum=10,
+        maximum=250,
+        increase=10,
+        decrease_factor=0.5,
+        target_seconds=2.0,
+        max_cost_share=0.5,
+        max_search_length=None,
+        log=None,
+    ):
+        if not 1 <= minimum <= maximum:
+            raise ValueError(f"Invalid batch size bounds: {minimum} to {maximum}")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.target_seconds = target_seconds
+        self.max_cost_share = max_cost_share
+        self.max_search_length = max_search_length
+        self.log = log or logging.getLogger(__name__)
+
+        self._size = self._clamp(initial)
+        self.smallest = self._size
+        self.largest = self._size
+        self.changes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        """Number of SKUs of the next batch"""
+        return self._size
+
+    def record(
+        self,
+        skus,
+        seconds,
+        requested_cost=None,
+        maximum_available=None,
+        throttled=False,
+    ):
+        """Adjusts the size after a successful lookup.
+
+        :param skus: Number of SKUs looked up.
+        :param seconds: Seconds the request took, excluding waits for the cost bucket.
+        :param requested_cost: Requested query cost reported by Shopify.
+        :param maximum_available: Size of the cost bucket reported by Shopify.
+        :param throttled: Whether the request was rejected as THROTTLED before it succeeded.
+        """
+        with self._lock:
+            if throttled:
+                size, reason = self._decreased(), "throttled"
+            elif seconds > self.target_seconds:
+                size, reason = self._decreased(), f"lookup took {seconds:.2f}s"
+            else:
+                size, reason = self._size + self.increase, None
+
+            if requested_cost and maximum_available and skus:
+                # Cost grows with the number of SKUs, keep a lookup within its share of the bucket
+                cost_per_sku = requested_cost / skus
+                cost_cap = math.floor(
+                    maximum_available * self.max_cost_share / cost_per_sku
+                )
+                if size > cost_cap:
+                    size, reason = cost_cap, f"requested cost {requested_cost}"
+            self._resize(size, reason)
+
+    def record_error(self):
+        """Shrinks the size after a failed lookup"""
+        with self._lock:
+            self._resize(self._decreased(), "lookup failed")
+
+    def batches(self, rows):
+        """Groups a stream of (sku, stock) rows into batches of the current size.
+        A batch also ends before its SKU search query would exceed `max_search_length`.
+
+        :param rows: Iterable of (sku, stock) or ((sku, location id), stock) tuples.
+        :return: Generator of dictionaries mapping SKUs to stock quantities.
+        """
+        batch = {}
+        search_length = 0
+        for key, stock in rows:
+            sku = key[0] if isinstance(key, tuple) else key
+            length = len(sku_search_query([sku])) + SEARCH_SEPARATOR_LENGTH
+            if batch and (
+                len(batch) >= self._size
+                or (
+                    self.max_search_length is not None
+                    and search_length + length > self.max_search_length
+                )
+            ):
+                yield batch
+                batch = {}
+                search_length = 0
+            batch[key] = stock
+            search_length += length
+        if batch:
+            yield batch
+
+    def summary(self):
+        """Smallest, largest and last size of the sync"""
+        return {
+            "batch_size_min": self.smallest,
+            "batch_size_max": self.largest,
+            "batch_size_last": self._size,
+            "batch_size_changes": self.changes,
+        }
+
+    def _decreased(self):
+        return math.floor(self._size * self.decrease_factor)
+
+    def _clamp(self, size):
+        return max(self.minimum, min(self.maximum, size))
+
+    def _resize(self, size, reason):
+        size = self._clamp(size)
+        if size == self._size:
+            return
+        self.log.info(
+            f"Batch size {self._size} -> {size} sku"
+            + (f" ({reason})" if reason else "")
+        )
+        self._size = size
+        self.smallest = min(self.smallest, size)
+        self.largest = max(self.largest, size)
+        self.changes += 1
@@ -0,0 +1,98 @@
+import sqlite3
+import time
+
+
+class FeedSnapshot:
+    """Persistent SQLite snapshot of the stock data successfully pushed to Shopify.
+    Used to only sync SKUs whose stock in the feed changed since the previous run.
+    SKUs may also be tuples of strings, e.g. (sku, location id), stored tab separated.
+    :param path: File location of the SQLite database
+    :param key: Key identifying the feed, e.g. file location and Shopify location id
+    :param clock: Clock function, injectable for testing
+    """
+
+    def __init__(self, path, key, clock=time.time):
+        self.path = path
+        self.key = key
+        self.clock = clock
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS feed_snapshot (
+                key TEXT NOT NULL,
+                sku TEXT NOT NULL,
+                stock INTEGER NOT NULL,
+                PRIMARY KEY (key, sku)
+            )""")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS feed_snapshot_reconcile (
+                key TEXT PRIMARY KEY,
+                reconciled_at REAL NOT NULL
+            )""")
+        self._connection.commit()
+
+    def changed(self, stock_batch):
+        """Filters a batch of stock data to SKUs that are new or changed since the snapshot.
+
+        :param stock_batch: A dictionary mapping SKUs to their stock quantities.
+        :return: A dictionary with the changed SKUs only.
+        """
+        placeholders = ",".join("?" * len(stock_batch))
+        pushed = dict(
+            self._connection.execute(
+                f"SELECT sku, stock FROM feed_snapshot "
+                f"WHERE key = ? AND sku IN ({placeholders})",
+                [self.key, *map(_sku_key, stock_batch)],
+            ).fetchall()
+        )
+        return {
+            sku: stock
+            for sku, stock in stock_batch.items()
+            if pushed.get(_sku_key(sku)) != stock
+        }
+
+    def commit(self, stock_batch):
+        """Records a batch of stock data as successfully pushed.
+
+        :param stock_batch: A dictionary mapping SKUs to their stock quantities.
+        """
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO feed_snapshot VALUES (?, ?, ?)",
+            [(self.key, _sku_key(sku), stock) for sku, stock in stock_batch.items()],
+        )
+        self._connection.commit()
+
+    def reconciled_at(self):
+        """Returns the time of the last full reconcile, None if there was none yet"""
+        row = self._connection.execute(
+            "SELECT reconciled_at FROM feed_snapshot_reconcile WHERE key = ?",
+            [self.key],
+        ).fetchone()
+        return row[0] if row else None
+
+    def is_reconcile_due(self, interval_seconds):
+        """Checks whether a full reconcile is due.
+
+        :param interval_seconds: Seconds between full reconciles, None to never reconcile again.
+        :return: True if there was no full reconcile yet or the last one is older than the interval.
+        """
+        reconciled_at = self.reconciled_at()
+        if reconciled_at is None:
+            return True
+        if interval_seconds is None:
+            return False
+        return self.clock() - reconciled_at >= interval_seconds
+
+    def mark_reconciled(self):
+        """Records the completion of a full reconcile"""
+        self._connection.execute(
+            "INSERT OR REPLACE INTO feed_snapshot_reconcile VALUES (?, ?)",
+            [self.key, self.clock()],
+        )
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+
+def _sku_key(sku):
+    return "\t".join(sku) if isinstance(sku, tuple) else sku
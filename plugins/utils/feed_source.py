@@ -0,0 +1,154 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+from contextlib import contextmanager
+from urllib.parse import unquote, urlparse
+
+from utils.optional_imports import optional_module
+
+COMPRESSION_EXTENSIONS = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".zst": "zstd",
+    ".zstd": "zstd",
+}
+# Used to infer the compression of file objects without a name
+COMPRESSION_MAGIC_NUMBERS = {
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bz2",
+    b"\xfd7zXZ\x00": "xz",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+
+
+def feed_name(source):
+    """Name of a feed for logs and snapshot keys: the location, or the name of a file object"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    return str(getattr(source, "name", None) or type(source).__name__)
+
+
+def local_path(source):
+    """Returns the local file path of a feed location, or None if it is a file object or remote URL.
+
+    :param source: Local path, `file://` URL, fsspec URL or file object.
+    """
+    if isinstance(source, os.PathLike):
+        return os.fspath(source)
+    if not isinstance(source, str):
+        return None
+    if "://" not in source:
+        return source
+    url = urlparse(source)
+    if url.scheme == "file":
+        return unquote(url.path)
+    return None
+
+
+def feed_compression(source):
+    """Infers the compression of a feed from the extension of its location.
+
+    :param source: Local path, URL or file object.
+    :return: "gzip", "bz2", "xz", "zstd" or None.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        name = os.fspath(source)
+    else:
+        name = getattr(source, "name", None)
+    if not isinstance(name, str):
+        return None
+    path = urlparse(name).path if "://" in name else name
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+@contextmanager
+def open_feed(source, text=True, decompress=True):
+    """Opens a stock feed for streaming, decompressing it on the fly.
+    Compressed feeds are decompressed in small chunks as they are read,
+    so memory use does not depend on the size of the file.
+
+    :param source: Local path, `file://` URL, fsspec URL (if fsspec is installed) or
+                   file object opened in text or binary mode. File objects are not closed.
+    :param text: Yield a text stream for the csv module, otherwise a binary stream.
+    :param decompress: Decompress .gz, .bz2, .xz and .zst feeds. Compression of file
+                       objects without a name is detected from their first bytes.
+    :return: Context manager yielding the file object.
+    :raises ValueError: If the feed is not supported or a required package is missing.
+    """
+    with _open_binary(source) as raw:
+        if isinstance(raw, io.TextIOBase):
+            # Text file objects are read as they are
+            yield raw
+            return
+        compression = None
+        if decompress:
+            compression = feed_compression(source)
+            if compression is None and raw is source and not hasattr(raw, "name"):
+                compression = _sniff_compression(raw)
+        binary = _decompress(raw, compression) if compression else raw
+        stream = (
+            io.TextIOWrapper(binary, encoding="utf-8", newline="") if text else binary
+        )
+        try:
+            yield stream
+        finally:
+            # Closing the readers must not close the underlying file object
+            if text:
+                stream.detach()
+            if binary is not raw:
+                binary.close()
+
+
+@contextmanager
+def _open_binary(source):
+    path = local_path(source)
+    if path is not None:
+        with open(path, "rb") as file:
+            yield file
+    elif isinstance(source, str):
+        fsspec = optional_module("fsspec")
+        if fsspec is None:
+            raise ValueError(f"Reading {source} requires fsspec to be installed")
+        with fsspec.open(source, "rb") as file:
+            yield file
+    elif hasattr(source, "read"):
+        yield source
+    else:
+        raise ValueError(f"Unsupported feed: {source!r}")
+
+
+def _sniff_compression(raw):
+    if hasattr(raw, "peek"):
+        head = raw.peek(6)[:6]
+    elif raw.seekable():
+        position = raw.tell()
+        head = raw.read(6)
+        raw.seek(position)
+    else:
+        return None
+    for magic_number, compression in COMPRESSION_MAGIC_NUMBERS.items():
+        if head.startswith(magic_number):
+            return compression
+    return None
+
+
+def _decompress(raw, compression):
+    # The decompressing readers leave file objects passed to them open when closed
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    if compression == "bz2":
+        return bz2.BZ2File(raw, mode="rb")
+    if compression == "xz":
+        return lzma.LZMAFile(raw, mode="rb")
+    zstandard = optional_module("zstandard")
+    if zstandard is None:
+        raise ValueError(
+            "Reading zstd compressed feeds requires zstandard to be installed"
+        )
+    return io.BufferedReader(
+        zstandard.ZstdDecompressor().stream_reader(raw, closefd=False)
+    )
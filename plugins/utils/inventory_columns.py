@@ -0,0 +1,115 @@
+from array import array
+
+from utils.optional_imports import optional_module
+
+INVENTORY_ITEM_GID_PREFIX = "gid://shopify/InventoryItem/"
+
+
+class InventoryColumns:
+    """Compact column store of the inventory items and available stock at a location.
+    Holds the numeric part of the inventory item ids and the quantities in `array('q')`
+    columns, indexed by SKU, instead of one tuple of strings per SKU.
+    Stock changes of a batch are computed as one vectorized operation if NumPy is
+    installed, with a pure Python fallback otherwise.
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self._item_ids = array("q")
+        self._quantities = array("q")
+        # Ids not following the usual gid format, by row
+        self._other_item_ids = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, sku):
+        return sku in self._rows
+
+    def add(self, sku, inventory_item_id, quantity):
+        """Adds or replaces the inventory item and available stock of a SKU"""
+        numeric_id = -1
+        if inventory_item_id.startswith(INVENTORY_ITEM_GID_PREFIX):
+            suffix = inventory_item_id[len(INVENTORY_ITEM_GID_PREFIX) :]
+            if suffix.isdigit():
+                numeric_id = int(suffix)
+
+        row = self._rows.get(sku)
+        if row is None:
+            row = len(self._item_ids)
+            self._rows[sku] = row
+            self._item_ids.append(numeric_id)
+            self._quantities.append(quantity)
+        else:
+            self._item_ids[row] = numeric_id
+            self._quantities[row] = quantity
+        if numeric_id < 0:
+            self._other_item_ids[row] = inventory_item_id
+        else:
+            self._other_item_ids.pop(row, None)
+
+    def get(self, sku):
+        """Returns the (inventory item id, quantity) tuple of a SKU or None"""
+        row = self._rows.get(sku)
+        if row is None:
+            return None
+        return self._item_id(row), self._quantities[row]
+
+    def changes(self, desired_stock, changed_skus=None):
+        """Calculates the stock changes of a batch against the stored quantities.
+        SKUs not stored are skipped, as are SKUs whose quantity already matches.
+
+        :param desired_stock: A dictionary mapping SKUs to their desired stock quantities.
+        :param changed_skus: Optional list the SKU of each change is appended to, in the order of the changes.
+        :return: List of (inventory item id, desired stock, current stock) tuples
+                 and the number of SKUs found.
+        """
+        np = optional_module("numpy")
+        if np is not None:
+            return self._changes_vectorized(np, desired_stock, changed_skus)
+
+        changes = []
+        found = 0
+        for sku, desired in desired_stock.items():
+            row = self._rows.get(sku)
+            if row is None:
+                continue
+            found += 1
+            current = self._quantities[row]
+            if desired != current:
+                changes.append((self._item_id(row), desired, current))
+                if changed_skus is not None:
+                    changed_skus.append(sku)
+        return changes, found
+
+    def _changes_vectorized(self, np, desired_stock, changed_skus):
+        count = len(desired_stock)
+        rows = np.fromiter(
+            (self._rows.get(sku, -1) for sku in desired_stock), np.int64, count
+        )
+        desired = np.fromiter(desired_stock.values(), np.int64, count)
+        found = rows >= 0
+        rows = rows[found]
+        desired = desired[found]
+        current = np.frombuffer(self._quantities, np.int64)[rows]
+        changed = desired != current
+        if changed_skus is not None:
+            skus = list(desired_stock)
+            changed_skus.extend(
+                skus[index] for index in np.flatnonzero(found)[changed].tolist()
+            )
+        changes = [
+            (self._item_id(row), desired_quantity, current_quantity)
+            for row, desired_quantity, current_quantity in zip(
+                rows[changed].tolist(),
+                desired[changed].tolist(),
+                current[changed].tolist(),
+            )
+        ]
+        return changes, len(rows)
+
+    def _item_id(self, row):
+        numeric_id = self._item_ids[row]
+        if numeric_id < 0:
+            return self._other_item_ids[row]
+        return f"{INVENTORY_ITEM_GID_PREFIX}{numeric_id}"
@@ -0,0 +1,269 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+INVENTORY_ITEM_GID_PREFIX = "gid://shopify/InventoryItem/"
+LOCATION_GID_PREFIX = "gid://shopify/Location/"
+REJECTED_WEBHOOKS_DIRECTORY = "rejected"
+
+
+class InventoryLevelStore:
+    """Persistent SQLite store of the available stock of inventory items at locations.
+    Fed by `inventory_levels/update` webhook payloads and by the stock read and
+    updated during syncs, so that later syncs can skip reading the stock of SKUs
+    whose level is fresh.
+    Webhooks only identify inventory items, their SKUs are learned from the reads of a sync.
+    A level is fresh for `ttl_seconds` after it was last read, updated or received,
+    older levels are read again from Shopify, reconciling the store periodically.
+    :param path: File location of the SQLite database
+    :param ttl_seconds: Seconds a level is considered fresh
+    :param clock: Clock function, injectable for testing
+    :param log: Logger rejected webhook payloads are logged to
+    """
+
+    def __init__(self, path, ttl_seconds=60 * 60, clock=time.time, log=None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.log = log or logging.getLogger(__name__)
+        self.hits = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS inventory_levels (
+                location_id TEXT NOT NULL,
+                inventory_item_id TEXT NOT NULL,
+                sku TEXT,
+                available INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                observed_at REAL NOT NULL,
+                PRIMARY KEY (location_id, inventory_item_id)
+            )""")
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS inventory_levels_sku "
+            "ON inventory_levels (location_id, sku)"
+        )
+        self._connection.commit()
+
+    def get_many(self, location_id, skus):
+        """Returns the fresh levels of SKUs at a location.
+
+        :param location_id: Shopify location GraphQL API id.
+        :param skus: List of SKUs to look up.
+        :return: List of (sku, inventory item id, available stock) tuples of the fresh SKUs.
+        """
+        if not skus:
+            return []
+        placeholders = ",".join("?" * len(skus))
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT sku, inventory_item_id, available FROM inventory_levels "
+                f"WHERE location_id = ? AND observed_at >= ? AND sku IN ({placeholders})",
+                [location_id, self.clock() - self.ttl_seconds, *skus],
+            ).fetchall()
+            self.hits += len(rows)
+        return rows
+
+    def get_item_ids(self, location_id, skus):
+        """Returns the inventory items of SKUs with a stored level at a location, fresh or not.
+
+        :param location_id: Shopify location GraphQL API id.
+        :param skus: List of SKUs to look up.
+        :return: Dictionary mapping the SKUs stocked at the location to their inventory item ids.
+        """
+        if not skus:
+            return {}
+        placeholders = ",".join("?" * len(skus))
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT sku, inventory_item_id FROM inventory_levels "
+                f"WHERE location_id = ? AND sku IN ({placeholders})",
+                [location_id, *skus],
+            ).fetchall()
+        return dict(rows)
+
+    def put_many(self, location_id, current_stock):
+        """Records the stock read from Shopify for SKUs at a location.
+
+        :param location_id: Shopify location GraphQL API id.
+        :param current_stock: List of (sku, inventory item id, available stock) tuples.
+        """
+        if not current_stock:
+            return
+        now = self.clock()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO inventory_levels VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (location_id, inventory_item_id, sku, available, now, now)
+                    for sku, inventory_item_id, available in current_stock
+                ],
+            )
+            self._connection.commit()
+
+    def update_quantities(self, inventory_changes):
+        """Records the stock of successfully sent stock changes.
+
+        :param inventory_changes: List of (inventory item id, location id, desired stock, current stock) tuples.
+        """
+        if not inventory_changes:
+            return
+        now = self.clock()
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE inventory_levels SET available = ?, updated_at = ?, observed_at = ? "
+                "WHERE location_id = ? AND inventory_item_id = ?",
+                [
+                    (desired, now, now, location_id, inventory_item_id)
+                    for inventory_item_id, location_id, desired, _ in inventory_changes
+                ],
+            )
+            self._connection.commit()
+
+    def invalidate(self, location_id, skus):
+        """Removes the levels of SKUs at a location, e.g. after a conflicting update.
+
+        :param location_id: Shopify location GraphQL API id.
+        :param skus: List of SKUs to remove.
+        """
+        if not skus:
+            return
+        with self._lock:
+            self._connection.executemany(
+                "DELETE FROM inventory_levels WHERE location_id = ? AND sku = ?",
+                [(location_id, sku) for sku in skus],
+            )
+            self._connection.commit()
+
+    def apply_webhook(self, payload):
+        """Applies an `inventory_levels/update` webhook payload.
+        Payloads older than the stored level are ignored, as webhooks may arrive out of order.
+        A level without available stock, e.g. of an untracked item, is removed.
+
+        :param payload: Dictionary of the webhook payload.
+        :return: True if the level was applied.
+        :raises ValueError: If the payload is not an inventory level.
+        """
+        try:
+            inventory_item_id = _gid(
+                INVENTORY_ITEM_GID_PREFIX, payload["inventory_item_id"]
+            )
+            location_id = _gid(LOCATION_GID_PREFIX, payload["location_id"])
+            updated_at = datetime.fromisoformat(payload["updated_at"]).timestamp()
+            available = payload.get("available")
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid inventory level webhook payload: {e!r}")
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT updated_at FROM inventory_levels "
+                "WHERE location_id = ? AND inventory_item_id = ?",
+                [location_id, inventory_item_id],
+            ).fetchone()
+            if row is not None and row[0] > updated_at:
+                return False
+            if available is None:
+                self._connection.execute(
+                    "DELETE FROM inventory_levels "
+                    "WHERE location_id = ? AND inventory_item_id = ?",
+                    [location_id, inventory_item_id],
+                )
+            else:
+                # Keeps the SKU learned from earlier reads
+                self._connection.execute(
+                    """
+                    INSERT INTO inventory_levels VALUES (?, ?, NULL, ?, ?, ?)
+                    ON CONFLICT (location_id, inventory_item_id) DO UPDATE SET
+                        available = excluded.available,
+                        updated_at = excluded.updated_at,
+                        observed_at = excluded.observed_at""",
+                    [
+                        location_id,
+                        inventory_item_id,
+                        available,
+                        updated_at,
+                        self.clock(),
+                    ],
+                )
+            self._connection.commit()
+        return True
+
+    def ingest_webhook_files(self, directory):
+        """Applies the webhook payloads queued as `.json` files in a directory, in file name order.
+        Applied files are removed. Writers should create the files atomically,
+        e.g. by renaming them to `.json` once written.
+        Invalid payloads are moved to the `rejected` subdirectory and counted in `rejected`,
+        so that they do not block the payloads queued after them.
+
+        :param directory: Directory of the queued webhook payloads.
+        :return: Number of applied payloads.
+        """
+        applied = 0
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                with open(path) as file:
+                    payload = json.load(file)
+                applied += self.apply_webhook(payload)
+            except ValueError as e:
+                self.reject_webhook_file(directory, name, e)
+                continue
+            os.remove(path)
+        return applied
+
+    def reject_webhook_file(self, directory, name, error):
+        """Moves an invalid webhook file to the `rejected` subdirectory of the queue.
+
+        :param directory: Directory of the queued webhook payloads.
+        :param name: File name of the invalid payload.
+        :param error: The error raised for the payload.
+        """
+        rejected_directory = os.path.join(directory, REJECTED_WEBHOOKS_DIRECTORY)
+        os.makedirs(rejected_directory, exist_ok=True)
+        os.replace(
+            os.path.join(directory, name), os.path.join(rejected_directory, name)
+        )
+        self.rejected += 1
+        self.log.warning(
+            f"Rejected invalid webhook file {name}, moved to {rejected_directory}: {error}"
+        )
+
+    def evict(self):
+        """Removes levels not read, updated or received for `ttl_seconds`.
+
+        :return: Number of removed levels.
+        """
+        with self._lock:
+            removed = self._connection.execute(
+                "DELETE FROM inventory_levels WHERE observed_at < ?",
+                [self.clock() - self.ttl_seconds],
+            ).rowcount
+            self._connection.commit()
+        return removed
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM inventory_levels"
+            ).fetchone()[0]
+
+    def close(self):
+        """Evicts stale levels and closes the database connection"""
+        self.evict()
+        self._connection.close()
+
+
+def _gid(prefix, value):
+    value = str(value)
+    if value.startswith("gid://"):
+        return value
+    if not value.isdigit():
+        raise ValueError(f"Invalid id: {value}")
+    return f"{prefix}{value}"
@@ -0,0 +1,68 @@
+import time
+from collections import deque
+
+
+class MutationBuffer:
+    """Collects the stock changes of consecutive batches, so that they are sent in full
+    mutations instead of one small mutation per batch.
+    Batches are released in their original order once all their changes were taken,
+    so they can be committed to checkpoints and snapshots as before.
+    :param max_changes: Maximum number of changes per mutation
+    :param max_delay_seconds: Seconds after which the oldest pending change is due
+                              even if the mutation is not full, None to wait for a full one
+    :param clock: Monotonic clock function, injectable for testing
+    """
+
+    def __init__(self, max_changes, max_delay_seconds=None, clock=time.monotonic):
+        self.max_changes = max_changes
+        self.max_delay_seconds = max_delay_seconds
+        self.clock = clock
+        self._changes = deque()
+        # [batch result, number of pending changes, time added] in batch order
+        self._batches = deque()
+
+    def __len__(self):
+        return len(self._changes)
+
+    def add(self, batch_result, changes):
+        """Adds a batch and its changes, which may be empty.
+
+        :param batch_result: Result of the batch, released once its changes were taken.
+        :param changes: List of the stock changes of the batch.
+        """
+        self._changes.extend((change, batch_result) for change in changes)
+        self._batches.append([batch_result, len(changes), self.clock()])
+
+    def is_due(self):
+        """Whether a full mutation is pending or the oldest pending change waited too long"""
+        if len(self._changes) >= self.max_changes:
+            return True
+        if not self._changes or self.max_delay_seconds is None:
+            return False
+        added_at = next(entry[2] for entry in self._batches if entry[1])
+        return self.clock() - added_at >= self.max_delay_seconds
+
+    def take(self):
+        """Takes the changes of the next mutation.
+
+        :return: List of up to `max_changes` changes and the result of the
+                 last batch they belong to.
+        """
+        changes = []
+        batch_result = None
+        pending = {id(entry[0]): entry for entry in self._batches}
+        while self._changes and len(changes) < self.max_changes:
+            change, batch_result = self._changes.popleft()
+            changes.append(change)
+            pending[id(batch_result)][1] -= 1
+        return changes, batch_result
+
+    def completed(self):
+        """Releases the batches at the front whose changes were all taken.
+
+        :return: List of batch results in batch order.
+        """
+        completed = []
+        while self._batches and self._batches[0][1] == 0:
+            completed.append(self._batches.popleft()[0])
+        return completed
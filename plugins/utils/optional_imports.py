@@ -0,0 +1,21 @@
+import functools
+import importlib
+
+
+@functools.lru_cache(maxsize=None)
+def optional_module(name, *submodules):
+    """Imports an optional or slow to import dependency on first use, e.g. pyarrow.
+    Keeps importing the plugin cheap for the scheduler and DAG file processors,
+    which never run a sync.
+
+    :param name: Name of the package, e.g. "pyarrow".
+    :param submodules: Names of submodules to import as well, e.g. "pyarrow.csv".
+    :return: The package, or None if it or one of the submodules is not installed.
+    """
+    try:
+        module = importlib.import_module(name)
+        for submodule in submodules:
+            importlib.import_module(submodule)
+    except ImportError:
+        return None
+    return module
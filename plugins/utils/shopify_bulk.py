@@ -0,0 +1,89 @@
+import json
+import time
+import urllib.request
+
+from airflow.exceptions import AirflowException
+from utils.shopify_queries import (
+    BULK_OPERATION_RUN_QUERY,
+    BULK_OPERATION_STATUS,
+)
+
+BULK_OPERATION_FINISHED_STATUSES = {"COMPLETED", "CANCELED", "EXPIRED", "FAILED"}
+
+
+def run_bulk_query(
+    client,
+    throttle,
+    query,
+    poll_seconds=5,
+    timeout_seconds=3600,
+    clock=time.monotonic,
+    sleep=time.sleep,
+):
+    """Starts a Shopify bulk query operation and polls it until it is finished.
+
+    :param client: The Shopify GraphQL client to use for executing the queries.
+    :param throttle: The ShopifyCostThrottle used for the requests.
+    :param query: The GraphQL query to run as bulk operation.
+    :param poll_seconds: Seconds to wait between status requests.
+    :param timeout_seconds: Seconds after which waiting for the operation is aborted.
+    :return: The URL of the JSONL result file, None if the query returned no objects.
+    :raises AirflowException: If the operation could not be started, failed or timed out.
+    """
+    result = throttle.execute(
+        client,
+        BULK_OPERATION_RUN_QUERY,
+        variables={"query": query},
+        operation_name="BulkOperationRunQuery",
+    )
+    if "errors" in result:
+        raise AirflowException(
+            f"Errors returned by Shopify API for bulk operation query: {result['errors']}"
+        )
+    run_result = result["data"]["bulkOperationRunQuery"]
+    if run_result["userErrors"]:
+        raise AirflowException(
+            f"Error starting bulk operation: {run_result['userErrors']}"
+        )
+
+    bulk_operation_id = run_result["bulkOperation"]["id"]
+    deadline = clock() + timeout_seconds
+    while True:
+        result = throttle.execute(
+            client,
+            BULK_OPERATION_STATUS,
+            variables={"id": bulk_operation_id},
+            operation_name="BulkOperationStatus",
+        )
+        if "errors" in result:
+            raise AirflowException(
+                f"Errors returned by Shopify API for bulk operation status query: {result['errors']}"
+            )
+        bulk_operation = result["data"]["node"]
+        if bulk_operation["status"] in BULK_OPERATION_FINISHED_STATUSES:
+            break
+        if clock() >= deadline:
+            raise AirflowException(
+                f"Bulk operation {bulk_operation_id} not finished after {timeout_seconds}s"
+            )
+        sleep(poll_seconds)
+
+    if bulk_operation["status"] != "COMPLETED":
+        raise AirflowException(
+            f"Bulk operation {bulk_operation_id} finished with status "
+            f"{bulk_operation['status']}: {bulk_operation['errorCode']}"
+        )
+    return bulk_operation["url"]
+
+
+def iter_bulk_result(url, timeout=60):
+    """Streams the JSONL result file of a bulk operation line by line.
+
+    :param url: The URL of the JSONL result file.
+    :param timeout: Request timeout in seconds.
+    :return: Generator of the parsed objects.
+    """
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        for line in response:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,188 @@
+import json
+
+PRODUCT_VARIANTS_BY_SKU = """
+query ProductVariantsBySku($first: Int!, $after: String, $query: String!, $locationId: ID!) {
+  productVariants(first: $first, after: $after, query: $query) {
+    edges {
+      cursor
+      node {
+        sku
+        inventoryItem {
+          id
+          inventoryLevel(locationId: $locationId) {
+            quantities(names: ["available"]) {
+              quantity
+            }
+          }
+        }
+      }
+    }
+    pageInfo {
+      hasNextPage
+      endCursor
+    }
+  }
+}
+"""
+
+INVENTORY_ITEMS_BY_ID = """
+query InventoryItemsById($ids: [ID!]!, $locationId: ID!) {
+  nodes(ids: $ids) {
+    ... on InventoryItem {
+      id
+      sku
+      inventoryLevel(locationId: $locationId) {
+        quantities(names: ["available"]) {
+          quantity
+        }
+      }
+    }
+  }
+}
+"""
+
+INVENTORY_ADJUST = """
+mutation InventoryAdjust($input: InventoryAdjustQuantitiesInput!) {
+  inventoryAdjustQuantities(input: $input) {
+    userErrors {
+      code
+      field
+      message
+    }
+  }
+}
+"""
+
+INVENTORY_SET = """
+mutation InventorySet($input: InventorySetQuantitiesInput!) {
+  inventorySetQuantities(input: $input) {
+    userErrors {
+      code
+      field
+      message
+    }
+  }
+}
+"""
+
+BULK_OPERATION_RUN_QUERY = """
+mutation BulkOperationRunQuery($query: String!) {
+  bulkOperationRunQuery(query: $query) {
+    bulkOperation {
+      id
+      status
+    }
+    userErrors {
+      field
+      message
+    }
+  }
+}
+"""
+
+BULK_OPERATION_STATUS = """
+query BulkOperationStatus($id: ID!) {
+  node(id: $id) {
+    ... on BulkOperation {
+      id
+      status
+      errorCode
+      objectCount
+      url
+    }
+  }
+}
+"""
+
+
+def bulk_inventory_snapshot_query(location_id):
+    """Builds the bulk operation query reading the available stock of all product variants at a location.
+    Bulk operation queries take no variables, so the location id is embedded as string literal.
+
+    :param location_id: Shopify location GraphQL API id.
+    :return: The GraphQL query.
+    """
+    return (
+        """
+{
+  productVariants {
+    edges {
+      node {
+        sku
+        inventoryItem {
+          id
+          inventoryLevel(locationId: """
+        + json.dumps(location_id)
+        + """) {
+            quantities(names: ["available"]) {
+              quantity
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+    )
+
+
+def sku_search_query(skus):
+    """Builds the search query matching any of the given SKUs.
+    SKUs are quoted, so that SKUs containing spaces, colons or quotes match exactly.
+
+    :param skus: List of SKUs.
+    :return: The search query, e.g. `sku:"SKU1" OR sku:"SKU2"`.
+    """
+    return " OR ".join(
+        'sku:"' + sku.replace("\\", "\\\\").replace('"', '\\"') + '"' for sku in skus
+    )
+
+
+def inventory_adjust_variables(inventory_changes):
+    """Builds the variables of the inventoryAdjustQuantities mutation adjusting stock by the calculated deltas.
+
+    :param inventory_changes: List of (inventory item id, location id, desired stock, current stock) tuples.
+    :return: The variables of the GraphQL mutation.
+    """
+    return {
+        "input": {
+            "reason": "other",
+            "name": "available",
+            "changes": [
+                {
+                    "inventoryItemId": inventory_item_id,
+                    "delta": desired - current,
+                    "locationId": location_id,
+                }
+                for inventory_item_id, location_id, desired, current in inventory_changes
+            ],
+        }
+    }
+
+
+def inventory_set_variables(inventory_changes, compare_quantity=True):
+    """Builds the variables of the inventorySetQuantities mutation setting absolute stock quantities.
+
+    :param inventory_changes: List of (inventory item id, location id, desired stock, current stock) tuples.
+    :param compare_quantity: Only set stock if it still equals the current stock.
+    :return: The variables of the GraphQL mutation.
+    """
+    quantities = []
+    for inventory_item_id, location_id, desired, current in inventory_changes:
+        quantity = {
+            "inventoryItemId": inventory_item_id,
+            "locationId": location_id,
+            "quantity": desired,
+        }
+        if compare_quantity:
+            quantity["compareQuantity"] = current
+        quantities.append(quantity)
+    return {
+        "input": {
+            "reason": "correction",
+            "name": "available",
+            "ignoreCompareQuantity": not compare_quantity,
+            "quantities": quantities,
+        }
+    }
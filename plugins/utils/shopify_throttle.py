@@ -0,0 +1,233 @@
+import asyncio
+import json
+import threading
+import time
+
+
+class ShopifyCostThrottle:
+    """Leaky-bucket rate controller for the Shopify GraphQL Admin API.
+    Tracks the cost bucket reported in the `extensions.cost` block of every response
+    and sleeps only as long as needed for the next request to fit into the bucket.
+    Requests rejected with a THROTTLED error are retried with backoff.
+    The throttle is thread-safe, concurrent requests reserve their expected cost
+    so that they share one budget. `execute_async` does the same for asyncio clients.
+    :param max_retries: Number of retries for a request that was throttled
+    :param backoff_seconds: Initial wait before retrying a throttled request, if the
+                            response carries no throttle status to derive it from
+    :param clock: Monotonic clock function, injectable for testing
+    :param sleep: Sleep function, injectable for testing
+    :param async_sleep: Coroutine function sleeping in `execute_async`, injectable for testing
+    :param share: Share of the shop's cost bucket and restore rate available to this throttle,
+                  e.g. 0.25 for one of four tasks syncing the same shop at the same time
+    """
+
+    def __init__(
+        self,
+        max_retries=5,
+        backoff_seconds=1.0,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        async_sleep=asyncio.sleep,
+        share=1.0,
+    ):
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.clock = clock
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.share = share
+
+        self.maximum_available = None
+        self.currently_available = None
+        self.restore_rate = None
+        self.updated_at = None
+        self.minimum_available = None
+
+        self.requested_costs = {}
+        self.total_actual_cost = 0
+        self.total_sleep_seconds = 0.0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def available(self):
+        """Estimates the points currently available in this throttle's share of the bucket,
+        based on the last reported throttle status and the time passed since then.
+
+        :return: Estimated available cost points or None if no status is known yet.
+        """
+        with self._lock:
+            return self._available()
+
+    def _available(self):
+        if self.currently_available is None:
+            return None
+        restored = (self.clock() - self.updated_at) * self.restore_rate
+        return (
+            min(self.maximum_available, self.currently_available + restored)
+            * self.share
+        )
+
+    def wait(self, cost):
+        """Sleeps until the bucket is expected to hold at least `cost` points
+        and reserves them for the next request.
+
+        :param cost: Expected cost of the next request.
+        :return: Seconds slept.
+        """
+        seconds = self.reserve(cost)
+        self._sleep(seconds)
+        return seconds
+
+    def reserve(self, cost):
+        """Reserves `cost` points for the next request without sleeping.
+
+        :param cost: Expected cost of the next request.
+        :return: Seconds until the bucket is expected to hold the points.
+        """
+        with self._lock:
+            available = self._available()
+            if available is None or not cost:
+                return 0
+            # A request can never cost more than the bucket is able to hold
+            cost = min(cost, self.maximum_available * self.share)
+            # The shop's bucket is tracked, this throttle only draws its share of it
+            self.currently_available = (available - cost) / self.share
+            self.updated_at = self.clock()
+            return max(cost - available, 0) / (self.restore_rate * self.share)
+
+    def update(self, result):
+        """Updates the bucket state from the `extensions.cost` block of a response.
+
+        :param result: Parsed Shopify API response.
+        :return: The cost block of the response or an empty dict.
+        """
+        cost = (result.get("extensions") or {}).get("cost") or {}
+        status = cost.get("throttleStatus")
+        with self._lock:
+            if status:
+                self.maximum_available = status["maximumAvailable"]
+                self.currently_available = status["currentlyAvailable"]
+                self.restore_rate = status["restoreRate"]
+                self.updated_at = self.clock()
+                if (
+                    self.minimum_available is None
+                    or self.currently_available < self.minimum_available
+                ):
+                    self.minimum_available = self.currently_available
+            if cost.get("actualQueryCost") is not None:
+                self.total_actual_cost += cost["actualQueryCost"]
+        return cost
+
+    def execute(
+        self, client, query, variables=None, operation_name=None, request_stats=None
+    ):
+        """Executes a query once the bucket has room for it and retries it on THROTTLED errors.
+
+        :param client: The Shopify GraphQL client to use for executing the query.
+        :param query: The GraphQL document.
+        :param variables: The variables of the GraphQL document.
+        :param operation_name: Name of the operation, also used to remember
+                               the requested cost of similar requests.
+        :param request_stats: Optional dictionary receiving the "seconds" spent in requests,
+                              excluding waits for the bucket, and the throttled "retries".
+        :return: The parsed response of the last attempt.
+        """
+        operation = operation_name or "default"
+        attempt = 0
+        request_seconds = 0.0
+        while True:
+            self.wait(self.requested_costs.get(operation))
+
+            request_start = self.clock()
+            result = json.loads(
+                client.execute(
+                    query, variables=variables, operation_name=operation_name
+                )
+            )
+            request_seconds += self.clock() - request_start
+            retry_seconds = self._handle_result(operation, result, attempt)
+            if retry_seconds is None:
+                if request_stats is not None:
+                    request_stats["seconds"] = request_seconds
+                    request_stats["retries"] = attempt
+                return result
+            self._sleep(retry_seconds)
+            attempt += 1
+
+    async def execute_async(self, client, query, variables=None, operation_name=None):
+        """Executes a query like `execute`, but awaits the client and sleeps without
+        blocking the event loop.
+
+        :param client: Shopify GraphQL client with a coroutine `execute` method.
+        :param query: The GraphQL document.
+        :param variables: The variables of the GraphQL document.
+        :param operation_name: Name of the operation, also used to remember
+                               the requested cost of similar requests.
+        :return: The parsed response of the last attempt.
+        """
+        operation = operation_name or "default"
+        attempt = 0
+        while True:
+            await self._sleep_async(self.reserve(self.requested_costs.get(operation)))
+
+            result = json.loads(
+                await client.execute(
+                    query, variables=variables, operation_name=operation_name
+                )
+            )
+            retry_seconds = self._handle_result(operation, result, attempt)
+            if retry_seconds is None:
+                return result
+            await self._sleep_async(retry_seconds)
+            attempt += 1
+
+    def _handle_result(self, operation, result, attempt):
+        """Records the cost of a response and decides whether to retry it.
+
+        :return: Seconds to wait before retrying, None if the result is final.
+        """
+        cost = self.update(result)
+        if cost.get("requestedQueryCost") is not None:
+            self.requested_costs[operation] = cost["requestedQueryCost"]
+
+        if not is_throttled(result) or attempt >= self.max_retries:
+            return None
+
+        with self._lock:
+            self.retries += 1
+        return self._backoff_seconds(cost, attempt)
+
+    def _backoff_seconds(self, cost, attempt):
+        """Calculates the wait before retrying a throttled request"""
+        requested = cost.get("requestedQueryCost")
+        status = cost.get("throttleStatus")
+        if requested is not None and status and status["restoreRate"]:
+            missing = requested - status["currentlyAvailable"]
+            return max(missing / status["restoreRate"], self.backoff_seconds)
+        return self.backoff_seconds * 2**attempt
+
+    def _sleep(self, seconds):
+        if seconds > 0:
+            with self._lock:
+                self.total_sleep_seconds += seconds
+            self.sleep(seconds)
+
+    async def _sleep_async(self, seconds):
+        if seconds > 0:
+            with self._lock:
+                self.total_sleep_seconds += seconds
+            await self.async_sleep(seconds)
+
+
+def is_throttled(result):
+    """Checks whether a parsed Shopify API response was rejected because of throttling.
+
+    :param result: Parsed Shopify API response.
+    :return: True if any of the returned errors has the code THROTTLED.
+    """
+    errors = result.get("errors")
+    if not isinstance(errors, list):
+        return False
+    return any(
+        (error.get("extensions") or {}).get("code") == "THROTTLED" for error in errors
+    )
@@ -0,0 +1,123 @@
+import sqlite3
+import threading
+import time
+
+
+class SkuIndex:
+    """Persistent SQLite index mapping SKUs to Shopify inventory item ids.
+    Warmed by the product variant lookups of earlier runs, so that later runs
+    can skip the lookup query for known SKUs.
+    :param path: File location of the SQLite database
+    :param ttl_seconds: Seconds after which an entry is considered stale, None to keep entries forever
+    :param max_entries: Maximum number of entries kept, least recently used entries are evicted first
+    :param clock: Clock function, injectable for testing
+    """
+
+    def __init__(self, path, ttl_seconds=None, max_entries=None, clock=time.time):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS sku_index (
+                sku TEXT PRIMARY KEY,
+                inventory_item_id TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS sku_index_accessed_at ON sku_index (accessed_at)"
+        )
+        self._connection.commit()
+
+    def get_many(self, skus):
+        """Returns the inventory item ids of all known and fresh SKUs.
+
+        :param skus: List of SKUs to look up.
+        :return: A dictionary mapping SKUs to their inventory item ids.
+        """
+        if not skus:
+            return {}
+        now = self.clock()
+        min_updated_at = now - self.ttl_seconds if self.ttl_seconds else 0
+        placeholders = ",".join("?" * len(skus))
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT sku, inventory_item_id FROM sku_index "
+                f"WHERE updated_at >= ? AND sku IN ({placeholders})",
+                [min_updated_at, *skus],
+            ).fetchall()
+            self._connection.executemany(
+                "UPDATE sku_index SET accessed_at = ? WHERE sku = ?",
+                [(now, row[0]) for row in rows],
+            )
+            self._connection.commit()
+        return dict(rows)
+
+    def put_many(self, inventory_item_ids):
+        """Adds or refreshes entries.
+
+        :param inventory_item_ids: A dictionary mapping SKUs to their inventory item ids.
+        """
+        if not inventory_item_ids:
+            return
+        now = self.clock()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO sku_index VALUES (?, ?, ?, ?)",
+                [
+                    (sku, item_id, now, now)
+                    for sku, item_id in inventory_item_ids.items()
+                ],
+            )
+            self._connection.commit()
+
+    def invalidate(self, skus):
+        """Removes entries, e.g. for SKUs that were not found in Shopify.
+
+        :param skus: List of SKUs to remove.
+        """
+        if not skus:
+            return
+        with self._lock:
+            self._connection.executemany(
+                "DELETE FROM sku_index WHERE sku = ?", [(sku,) for sku in skus]
+            )
+            self._connection.commit()
+
+    def evict(self):
+        """Removes stale entries and least recently used entries beyond `max_entries`.
+
+        :return: Number of removed entries.
+        """
+        removed = 0
+        with self._lock:
+            if self.ttl_seconds:
+                removed += self._connection.execute(
+                    "DELETE FROM sku_index WHERE updated_at < ?",
+                    [self.clock() - self.ttl_seconds],
+                ).rowcount
+            if self.max_entries is not None:
+                removed += self._connection.execute(
+                    """
+                    DELETE FROM sku_index WHERE sku IN (
+                        SELECT sku FROM sku_index ORDER BY accessed_at DESC
+                        LIMIT -1 OFFSET ?
+                    )""",
+                    [self.max_entries],
+                ).rowcount
+            self._connection.commit()
+        return removed
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM sku_index"
+            ).fetchone()[0]
+
+    def close(self):
+        """Evicts entries and closes the database connection"""
+        self.evict()
+        self._connection.close()
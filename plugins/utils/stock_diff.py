@@ -0,0 +1,199 @@
+import json
+
+from airflow.exceptions import AirflowException
+from utils.shopify_queries import (
+    INVENTORY_ADJUST,
+    INVENTORY_SET,
+    inventory_adjust_variables,
+    inventory_set_variables,
+)
+
+STALE_QUANTITY_CODE = "COMPARE_QUANTITY_STALE"
+
+# GraphQL document, operation name and mutation field of each update mode
+STOCK_MUTATIONS = {
+    "adjust": (INVENTORY_ADJUST, "InventoryAdjust", "inventoryAdjustQuantities"),
+    "set": (INVENTORY_SET, "InventorySet", "inventorySetQuantities"),
+}
+
+
+def new_batch_result(stock_batch):
+    """Creates the result of a batch before any request was sent.
+
+    :param stock_batch: A dictionary mapping the SKUs of the batch to their desired stock quantities.
+    :return: Dictionary with the stock update mutations and responses of the batch.
+    """
+    return {
+        "stock_batch": stock_batch,
+        "skus": len(stock_batch),
+        "query": None,
+        "mutations": [],
+        "responses": [],
+        "conflicts": 0,
+        "changed": 0,
+        "unchanged": 0,
+        "not_found": 0,
+        "unmatched": 0,
+        "lookup_seconds": 0.0,
+        "mutation_seconds": 0.0,
+    }
+
+
+def group_by_location(stock_batch, location_id):
+    """Groups the desired stock of a batch by location.
+
+    :param stock_batch: A dictionary mapping the SKUs of the batch, or (sku, location id)
+                        tuples for multiple locations, to their desired stock quantities.
+    :param location_id: Location of SKUs not keyed by location.
+    :return: Dictionary mapping location ids to dictionaries of SKUs and desired stock quantities.
+    """
+    desired_stock = {}
+    for key, stock in stock_batch.items():
+        sku, sku_location_id = key if isinstance(key, tuple) else (key, location_id)
+        desired_stock.setdefault(sku_location_id, {})[sku] = stock
+    return desired_stock
+
+
+def variant_stock(product_variant_edges):
+    """Reads the inventory items and available stock of productVariants edges.
+
+    :param product_variant_edges: Edges of the productVariants query.
+    :return: List of (sku, inventory item id, current stock) tuples of the variants stocked
+             at the location, and a dictionary mapping the SKUs of all variants to their
+             inventory item ids.
+    """
+    current_stock = []
+    inventory_item_ids = {}
+    for product_variant in product_variant_edges:
+        inventory_item = product_variant["node"]["inventoryItem"]
+        inventory_item_ids[product_variant["node"]["sku"]] = inventory_item["id"]
+        # Skip product variants not stocked at the location
+        if inventory_item["inventoryLevel"] is None:
+            continue
+        current_stock.append(
+            (
+                product_variant["node"]["sku"],
+                inventory_item["id"],
+                inventory_item["inventoryLevel"]["quantities"][0]["quantity"],
+            )
+        )
+    return current_stock, inventory_item_ids
+
+
+def stock_changes(location_id, location_stock, current_stock, changed_skus=None):
+    """Compares the current stock at a location against the desired stock.
+    Variants whose SKU is not part of the desired stock are skipped, the SKU search
+    is case-insensitive and may also return prefix matches.
+
+    :param location_id: Shopify location GraphQL API id.
+    :param location_stock: Dictionary mapping SKUs to their desired stock quantities.
+    :param current_stock: List of (sku, inventory item id, current stock) tuples.
+    :param changed_skus: Optional list the SKU of each change is appended to, in the order of the changes.
+    :return: List of (inventory item id, location id, desired stock, current stock) tuples
+             of the SKUs whose stock changed, the number of SKUs found and the number
+             of skipped variants.
+    """
+    inventory_changes = []
+    found = 0
+    for sku, inventory_item_id, quantity in current_stock:
+        desired = location_stock.get(sku)
+        if desired is None:
+            continue
+        found += 1
+        if desired != quantity:
+            inventory_changes.append(
+                (inventory_item_id, location_id, desired, quantity)
+            )
+            if changed_skus is not None:
+                changed_skus.append(sku)
+    return inventory_changes, found, len(current_stock) - found
+
+
+def record_changes(batch_result, inventory_changes, found, unmatched=0):
+    """Records the SKU counts of a lookup of the batch, replacing those of earlier attempts.
+
+    :param batch_result: Dictionary of the batch result.
+    :param inventory_changes: List of the stock changes of the batch.
+    :param found: Number of SKUs of the batch found at their location.
+    :param unmatched: Number of variants found whose SKU is not part of the batch.
+    """
+    batch_result["changed"] = len(inventory_changes)
+    batch_result["unchanged"] = found - len(inventory_changes)
+    batch_result["not_found"] = batch_result["skus"] - found
+    batch_result["unmatched"] = unmatched
+
+
+def stock_mutation_variables(inventory_changes, update_mode, compare_quantity=True):
+    """Builds the variables of the stock update mutation of the update mode.
+
+    :param inventory_changes: List of (inventory item id, location id, desired stock, current stock) tuples.
+    :param update_mode: "adjust" or "set".
+    :param compare_quantity: In "set" mode, compare against the current stock unless it was not read.
+    :return: The variables of the GraphQL mutation.
+    """
+    if update_mode == "set":
+        return inventory_set_variables(inventory_changes, compare_quantity)
+    return inventory_adjust_variables(inventory_changes)
+
+
+def split_stock_changes(inventory_changes, max_changes_per_mutation):
+    """Splits the stock changes of a batch into the changes of each mutation.
+
+    :param inventory_changes: List of the stock changes of the batch.
+    :param max_changes_per_mutation: Maximum number of stock changes sent in a single mutation.
+    :return: List of lists of stock changes.
+    """
+    return [
+        inventory_changes[index : index + max_changes_per_mutation]
+        for index in range(0, len(inventory_changes), max_changes_per_mutation)
+    ]
+
+
+def mutation_user_errors(stock_update_response, mutation_name):
+    """Returns the user errors of a stock update response, if any"""
+    mutation_result = (stock_update_response.get("data") or {}).get(mutation_name) or {}
+    return mutation_result.get("userErrors")
+
+
+def check_conflict(batch_result, user_errors, max_conflict_retries):
+    """Counts a conflict retry of the batch if its stock changed since it was read.
+
+    :param batch_result: Dictionary of the batch result.
+    :param user_errors: User errors returned for a stock update mutation of the batch.
+    :param max_conflict_retries: Number of retries of a batch whose stock changed.
+    :raises AirflowException: If the user errors are not conflicts or the retries are exhausted.
+    """
+    if (
+        all(error.get("code") == STALE_QUANTITY_CODE for error in user_errors)
+        and batch_result["conflicts"] < max_conflict_retries
+    ):
+        batch_result["conflicts"] += 1
+        return
+    raise AirflowException(
+        f"User errors returned by Shopify API for stock update query: {user_errors}"
+    )
+
+
+def log_batch_result(log, batch_result, dry_run, mutation_name):
+    """Logs the result of a processed batch.
+
+    :param log: Logger of the operator or trigger.
+    :param batch_result: Dictionary of the batch result.
+    :param dry_run: Whether the mutations were only built.
+    :param mutation_name: Name of the stock update mutation.
+    """
+    if "diff" in batch_result:
+        log.info(
+            f"DRY RUN - {len(batch_result['diff'])} stock changes of batch written to report"
+        )
+    elif batch_result["query"] is None:
+        log.info(
+            "Update stock query skipped, because of no stock level changes for product variants in batch"
+        )
+    elif dry_run:
+        log.info(f"DRY RUN - {mutation_name} input for batch:")
+        for variables in batch_result["mutations"]:
+            log.info(json.dumps(variables["input"]))
+    else:
+        for response in batch_result["responses"]:
+            log.info(f"Update stock query cost: {response['extensions']}")
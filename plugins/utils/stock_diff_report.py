@@ -0,0 +1,118 @@
+import csv
+import gzip
+
+from utils.optional_imports import optional_module
+
+DIFF_REPORT_COLUMNS = [
+    "sku",
+    "location_id",
+    "inventory_item_id",
+    "current",
+    "desired",
+    "delta",
+]
+
+
+class StockDiffReport:
+    """Streaming report of the stock changes found by a dry run, one row per changed SKU.
+    Rows are written as they are found and only running statistics are kept,
+    so memory use does not depend on the number of SKUs.
+    Written as CSV with a header, gzip compressed for a `.gz` location,
+    or as Parquet for a `.parquet` location if pyarrow is installed.
+    :param path: File location of the report
+    :param row_group_size: Rows per Parquet row group, buffered before they are written
+    """
+
+    def __init__(self, path, row_group_size=64 * 1024):
+        self.path = path
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self.total_increase = 0
+        self.total_decrease = 0
+        self.max_increase = 0
+        self.max_decrease = 0
+        self.to_zero = 0
+
+        self._file = None
+        self._writer = None
+        self._parquet_writer = None
+        self._buffer = []
+        if path.endswith(".parquet"):
+            self._pyarrow = optional_module("pyarrow", "pyarrow.parquet")
+            if self._pyarrow is None:
+                raise ValueError("Parquet reports require pyarrow to be installed")
+            schema = self._pyarrow.schema(
+                [(name, self._pyarrow.string()) for name in DIFF_REPORT_COLUMNS[:3]]
+                + [(name, self._pyarrow.int64()) for name in DIFF_REPORT_COLUMNS[3:]]
+            )
+            self._parquet_writer = self._pyarrow.parquet.ParquetWriter(path, schema)
+        else:
+            if path.endswith(".gz"):
+                self._file = gzip.open(path, "wt", newline="")
+            else:
+                self._file = open(path, "w", newline="")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(DIFF_REPORT_COLUMNS)
+
+    def write(self, rows):
+        """Adds rows to the report.
+
+        :param rows: Iterable of (sku, location id, inventory item id, current stock, desired stock) tuples.
+        """
+        for sku, location_id, inventory_item_id, current, desired in rows:
+            delta = desired - current
+            self._count(desired, delta)
+            row = (sku, location_id, inventory_item_id, current, desired, delta)
+            if self._parquet_writer is None:
+                self._writer.writerow(row)
+                continue
+            self._buffer.append(row)
+            if len(self._buffer) >= self.row_group_size:
+                self._write_row_group()
+
+    def summary(self):
+        """Statistics of the changes written so far"""
+        return {
+            "diff_rows": self.rows,
+            "diff_total_increase": self.total_increase,
+            "diff_total_decrease": self.total_decrease,
+            "diff_net_delta": self.total_increase - self.total_decrease,
+            "diff_max_increase": self.max_increase,
+            "diff_max_decrease": self.max_decrease,
+            "diff_to_zero": self.to_zero,
+        }
+
+    def close(self):
+        """Writes the buffered rows and closes the file"""
+        if self._parquet_writer is not None:
+            if self._buffer:
+                self._write_row_group()
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _count(self, desired, delta):
+        self.rows += 1
+        if desired == 0:
+            self.to_zero += 1
+        if delta > 0:
+            self.total_increase += delta
+            self.max_increase = max(self.max_increase, delta)
+        elif delta < 0:
+            self.total_decrease -= delta
+            self.max_decrease = max(self.max_decrease, -delta)
+
+    def _write_row_group(self):
+        schema = self._parquet_writer.schema
+        self._parquet_writer.write_table(
+            self._pyarrow.Table.from_arrays(
+                [
+                    self._pyarrow.array(column, type=field.type)
+                    for column, field in zip(zip(*self._buffer), schema)
+                ],
+                schema=schema,
+            )
+        )
+        self._buffer = []
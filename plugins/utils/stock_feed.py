@@ -0,0 +1,338 @@
+import bisect
+import csv
+import heapq
+import io
+import itertools
+import tempfile
+import zlib
+from collections import Counter
+
+from utils.feed_source import feed_compression, local_path, open_feed
+from utils.optional_imports import optional_module
+
+# Stocks pyarrow casts exactly like `int()`, i.e. without sign, underscores or overflow,
+# all other stocks are converted row by row
+INTEGER_PATTERN = r"^-?\d{1,18}$"
+# Stock quantities are stored as signed 64-bit integers
+MAX_STOCK = 2**63 - 1
+
+
+class StockRowErrors:
+    """Collects the invalid rows of a stock feed, so that they are skipped and reported
+    instead of aborting the whole file.
+    :param max_errors: Number of invalid rows after which reading is aborted, None to never abort
+    :param max_examples: Number of invalid rows kept as examples for the report
+    """
+
+    def __init__(self, max_errors=None, max_examples=10):
+        self.max_errors = max_errors
+        self.max_examples = max_examples
+        self.counts = Counter()
+        self.examples = []
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def add(self, row_number, reason, row):
+        """Records an invalid row.
+
+        :param row_number: Number of the row in the file, starting at 1.
+        :param reason: Reason the row is invalid, e.g. "invalid stock".
+        :param row: The row, as list of columns or raw text.
+        :raises ValueError: If more than `max_errors` invalid rows were found.
+        """
+        self.counts[reason] += 1
+        if len(self.examples) < self.max_examples:
+            self.examples.append(f"row {row_number}: {reason} {row!r}")
+        if self.max_errors is not None and len(self) > self.max_errors:
+            raise ValueError(
+                f"More than {self.max_errors} invalid rows. {self.report()}"
+            )
+
+    def report(self):
+        """Summarizes the invalid rows by reason, with examples"""
+        counts = ", ".join(
+            f"{reason}: {count}" for reason, count in self.counts.items()
+        )
+        return f"Invalid rows ({counts}), e.g. {'; '.join(self.examples)}"
+
+
+def read_stock_rows(csv_file, locations=None, errors=None):
+    """Reads (sku, stock) rows from a CSV file object with two columns per row: SKU and stock quantity.
+    If `locations` is given, a third column holds the location of the row and the
+    rows are keyed by (sku, location id) instead. Blank lines are ignored.
+
+    :param csv_file: Open CSV file object.
+    :param locations: Optional dictionary mapping the location column values to Shopify location ids.
+    :param errors: Optional StockRowErrors, invalid rows are recorded and skipped instead of raising.
+    :return: Generator of (sku, stock) or ((sku, location id), stock) tuples in file order.
+    :raises ValueError: If a row is invalid or refers to an unknown location and no `errors` is given.
+    """
+    yield from _parse_rows(csv.reader(csv_file), locations, errors)
+
+
+def read_stock_rows_fast(
+    source, locations=None, errors=None, block_size=8 * 1024 * 1024
+):
+    """Reads (sku, stock) rows like `read_stock_rows`, but with pyarrow's multithreaded
+    CSV reader, which parses and validates whole blocks of the file at once.
+    Falls back to `read_stock_rows` if pyarrow is not installed.
+    Blank lines are not counted in the row numbers of invalid rows reported by pyarrow.
+
+    :param source: Feed location or file object, compressed feeds are decompressed
+                   on the fly, see `open_feed`.
+    :param locations: Optional dictionary mapping the location column values to Shopify location ids.
+    :param errors: Optional StockRowErrors, invalid rows are recorded and skipped instead of raising.
+    :param block_size: Bytes parsed at a time.
+    :return: Generator of (sku, stock) or ((sku, location id), stock) tuples in file order.
+    :raises ValueError: If a row is invalid or refers to an unknown location and no `errors` is given.
+    """
+    pyarrow = optional_module("pyarrow", "pyarrow.compute", "pyarrow.csv")
+    path = local_path(source)
+    if pyarrow is not None and path is not None and feed_compression(path) is None:
+        # Uncompressed local files are read by pyarrow directly
+        yield from _read_stock_rows_arrow(pyarrow, path, locations, errors, block_size)
+        return
+    with open_feed(source, text=pyarrow is None) as feed:
+        if pyarrow is None or isinstance(feed, io.TextIOBase):
+            yield from read_stock_rows(feed, locations, errors)
+        else:
+            yield from _read_stock_rows_arrow(
+                pyarrow, feed, locations, errors, block_size
+            )
+
+
+def _read_stock_rows_arrow(pyarrow, source, locations, errors, block_size):
+    column_count = 2 if locations is None else 3
+    column_names = [f"f{index}" for index in range(column_count)]
+    compute = pyarrow.compute
+    # Rows dropped by the reader are missing from the batches, their numbers
+    # are kept to find the number in the file of the rows after them
+    dropped_rows = []
+
+    def invalid_row(row):
+        if row.number is not None:
+            bisect.insort(dropped_rows, row.number)
+        if errors is None:
+            return "error"
+        errors.add(row.number, "wrong column count", row.text)
+        return "skip"
+
+    reader = pyarrow.csv.open_csv(
+        source,
+        read_options=pyarrow.csv.ReadOptions(
+            column_names=column_names, block_size=block_size
+        ),
+        parse_options=pyarrow.csv.ParseOptions(invalid_row_handler=invalid_row),
+        convert_options=pyarrow.csv.ConvertOptions(
+            column_types={name: pyarrow.string() for name in column_names},
+            strings_can_be_null=False,
+        ),
+    )
+    row_offset = 0
+    for batch in reader:
+        stocks = compute.utf8_trim_whitespace(batch.column(1))
+        valid = compute.and_(
+            compute.not_equal(compute.utf8_trim_whitespace(batch.column(0)), ""),
+            compute.match_substring_regex(stocks, INTEGER_PATTERN),
+        )
+        keys = batch.column(0).to_pylist()
+        if locations is not None:
+            valid = compute.and_(
+                valid,
+                compute.is_in(
+                    batch.column(2), value_set=pyarrow.array(list(locations))
+                ),
+            )
+            location_ids = [locations.get(key) for key in batch.column(2).to_pylist()]
+            keys = list(zip(keys, location_ids))
+        if compute.all(valid).as_py():
+            rows = zip(keys, compute.cast(stocks, pyarrow.int64()).to_pylist())
+        else:
+            stocks = compute.if_else(valid, stocks, "0")
+            rows = list(zip(keys, compute.cast(stocks, pyarrow.int64()).to_pylist()))
+            # The other rows are validated and converted one by one in place
+            for index in compute.indices_nonzero(compute.invert(valid)).to_pylist():
+                row = [column[index].as_py() for column in batch.columns]
+                row_number = _source_row_number(row_offset + index + 1, dropped_rows)
+                rows[index] = _parse_row(row_number, row, locations, errors)
+            rows = [row for row in rows if row is not None]
+        row_offset += batch.num_rows
+        yield from rows
+
+
+def _source_row_number(row_number, dropped_rows):
+    """Number of a row in the file from its number among the rows not dropped"""
+    source_row_number = row_number
+    while True:
+        shifted = row_number + bisect.bisect_right(dropped_rows, source_row_number)
+        if shifted == source_row_number:
+            return source_row_number
+        source_row_number = shifted
+
+
+def _parse_rows(rows, locations, errors):
+    row_number = 0
+    for row in rows:
+        row_number += 1
+        # Fast path for valid rows without location, the rest is validated by _parse_row
+        if locations is None:
+            try:
+                sku, stock = row[0], int(row[1])
+            except (IndexError, ValueError):
+                sku = None
+            if sku and not sku.isspace() and abs(stock) <= MAX_STOCK:
+                yield sku, stock
+                continue
+        if row:
+            parsed = _parse_row(row_number, row, locations, errors)
+            if parsed is not None:
+                yield parsed
+
+
+def _parse_row(row_number, row, locations, errors):
+    """Validates and converts a row, returns None for rows recorded as invalid"""
+    if len(row) < (2 if locations is None else 3):
+        return _invalid(errors, row_number, "wrong column count", row)
+    if not row[0].strip():
+        return _invalid(errors, row_number, "blank sku", row)
+    try:
+        stock = int(row[1])
+    except ValueError:
+        return _invalid(errors, row_number, "invalid stock", row)
+    if abs(stock) > MAX_STOCK:
+        return _invalid(errors, row_number, "invalid stock", row)
+    if locations is None:
+        return row[0], stock
+    if row[2] not in locations:
+        return _invalid(errors, row_number, "unknown location", row)
+    return (row[0], locations[row[2]]), stock
+
+
+def _invalid(errors, row_number, reason, row):
+    if errors is None:
+        raise ValueError(f"Row {row_number}: {reason} {row!r}")
+    errors.add(row_number, reason, row)
+
+
+def write_stock_rows(rows, csv_file):
+    """Writes (sku, stock) rows to a CSV file object in the format read by `read_stock_rows`.
+
+    :param rows: Iterable of (sku, stock) tuples.
+    :param csv_file: Open CSV file object.
+    :return: Number of rows written.
+    """
+    row_count = 0
+    writer = csv.writer(csv_file)
+    for sku, stock in rows:
+        writer.writerow((sku, stock))
+        row_count += 1
+    return row_count
+
+
+def shard_index(sku, shards):
+    """Returns the shard of a SKU, stable across processes and runs unlike `hash()`.
+
+    :param sku: The SKU.
+    :param shards: Number of shards.
+    :return: Index of the shard, from 0 to `shards` - 1.
+    """
+    return zlib.crc32(sku.encode("utf-8")) % shards
+
+
+def partition_stock_rows(csv_file, shard_files):
+    """Splits a CSV feed into shards by the SKU in the first column.
+    Rows are copied unchanged and keep their order, so all rows of a SKU, including
+    those of other locations, end up in the same shard and the last one still wins.
+    Blank lines are dropped, all other rows are validated when the shards are read.
+
+    :param csv_file: Open CSV file object of the feed.
+    :param shard_files: Open CSV file objects of the shards, written to.
+    :return: List of the number of rows written to each shard.
+    """
+    writers = [csv.writer(shard_file) for shard_file in shard_files]
+    counts = [0] * len(writers)
+    for row in csv.reader(csv_file):
+        if not row:
+            continue
+        index = shard_index(row[0], len(writers))
+        writers[index].writerow(row)
+        counts[index] += 1
+    return counts
+
+
+def deduplicate_stock_rows(rows, max_rows_in_memory=1_000_000):
+    """Removes duplicate SKUs from a stream of (sku, stock) rows, the last occurrence wins.
+    SKUs may also be tuples of strings, e.g. (sku, location id).
+    Rows are collected in memory up to `max_rows_in_memory` unique SKUs. Inputs that fit
+    are yielded in order of the first occurrence of each SKU. Larger inputs are spilled
+    to sorted temporary files, which are merged and yielded in SKU order.
+
+    :param rows: Iterable of (sku, stock) tuples.
+    :param max_rows_in_memory: Maximum number of unique SKUs held in memory.
+    :return: Generator of unique (sku, stock) tuples.
+    """
+    rows = iter(rows)
+    chunk = _read_unique_chunk(rows, max_rows_in_memory)
+    next_row = next(rows, None)
+    if next_row is None:
+        yield from chunk.items()
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        spill_files = []
+        rows = itertools.chain([next_row], rows)
+        while chunk:
+            spill_files.append(_spill_chunk(chunk, tmp_dir, len(spill_files)))
+            chunk = _read_unique_chunk(rows, max_rows_in_memory)
+
+        readers = [
+            _read_spill_file(spill_file, chunk_index)
+            for chunk_index, spill_file in enumerate(spill_files)
+        ]
+        merged = heapq.merge(*readers)
+        for sku, group in itertools.groupby(merged, key=lambda row: row[0]):
+            # Rows of the same SKU are ordered by chunk, the last chunk wins
+            *_, (_, _, stock) = group
+            yield sku, stock
+
+
+def batch_stock_rows(rows, batch_size):
+    """Groups a stream of (sku, stock) rows into batches.
+
+    :param rows: Iterable of (sku, stock) tuples.
+    :param batch_size: Maximum number of SKUs per batch.
+    :return: Generator of dictionaries mapping SKUs to stock quantities.
+    """
+    rows = iter(rows)
+    while True:
+        batch = dict(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _read_unique_chunk(rows, max_rows):
+    chunk = {}
+    for sku, stock in rows:
+        chunk[sku] = stock
+        if len(chunk) >= max_rows:
+            break
+    return chunk
+
+
+def _spill_chunk(chunk, tmp_dir, chunk_index):
+    path = f"{tmp_dir}/chunk_{chunk_index}.csv"
+    with open(path, "w", newline="") as spill_file:
+        csv.writer(spill_file).writerows(
+            (*(sku if isinstance(sku, tuple) else (sku,)), stock)
+            for sku, stock in sorted(chunk.items())
+        )
+    return path
+
+
+def _read_spill_file(path, chunk_index):
+    with open(path, newline="") as spill_file:
+        for row in csv.reader(spill_file):
+            sku = tuple(row[:-1]) if len(row) > 2 else row[0]
+            yield sku, chunk_index, int(row[-1])
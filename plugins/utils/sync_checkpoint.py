@@ -0,0 +1,92 @@
+import hashlib
+import sqlite3
+import time
+
+from utils.feed_source import open_feed
+
+
+class SyncCheckpoint:
+    """Persistent SQLite checkpoint of the batches of a feed already synced to Shopify.
+    Lets a retried task resume after the last completed batch instead of starting over.
+    The checkpoint is bound to a fingerprint of the file, a changed file starts from zero.
+    :param path: File location of the SQLite database
+    :param key: Key identifying the feed, e.g. file location and Shopify location id
+    :param clock: Clock function, injectable for testing
+    """
+
+    def __init__(self, path, key, clock=time.time):
+        self.path = path
+        self.key = key
+        self.clock = clock
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS sync_checkpoint (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                batches_done INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        self._connection.commit()
+
+    def load(self, fingerprint):
+        """Returns the number of batches already synced for a file.
+
+        :param fingerprint: Fingerprint of the file and batching parameters.
+        :return: Number of completed batches, 0 if there is no checkpoint for the fingerprint.
+        """
+        row = self._connection.execute(
+            "SELECT fingerprint, batches_done FROM sync_checkpoint WHERE key = ?",
+            [self.key],
+        ).fetchone()
+        if row is None or row[0] != fingerprint:
+            return 0
+        return row[1]
+
+    def save(self, fingerprint, batches_done):
+        """Records the number of batches completed so far.
+
+        :param fingerprint: Fingerprint of the file and batching parameters.
+        :param batches_done: Number of completed batches.
+        """
+        self._connection.execute(
+            "INSERT OR REPLACE INTO sync_checkpoint VALUES (?, ?, ?, ?)",
+            [self.key, fingerprint, batches_done, self.clock()],
+        )
+        self._connection.commit()
+
+    def clear(self):
+        """Removes the checkpoint after the sync completed"""
+        self._connection.execute(
+            "DELETE FROM sync_checkpoint WHERE key = ?", [self.key]
+        )
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+
+def file_fingerprint(path, *params, chunk_size=1024 * 1024):
+    """Hashes the contents of a file together with parameters that affect how it is read.
+    Compressed files are hashed as they are, without decompressing them.
+
+    :param path: File location, URL or seekable file object, which is rewound afterwards.
+    :param params: Additional values, e.g. the batch size.
+    :param chunk_size: Bytes read at a time.
+    :return: Hex digest of the SHA-256 hash.
+    :raises ValueError: If the file object is not seekable.
+    """
+    digest = hashlib.sha256()
+    with open_feed(path, text=False, decompress=False) as file:
+        if file is path:
+            if not file.seekable():
+                raise ValueError(
+                    "Fingerprinting a file object requires it to be seekable"
+                )
+            position = file.tell()
+        while chunk := file.read(chunk_size):
+            digest.update(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"))
+        if file is path:
+            file.seek(position)
+    for param in params:
+        digest.update(f"\0{param}".encode("utf-8"))
+    return digest.hexdigest()
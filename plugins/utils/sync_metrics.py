@@ -0,0 +1,111 @@
+import time
+from collections import Counter
+
+from airflow.stats import Stats
+
+
+class SyncMetrics:
+    """Aggregates the timings, SKU counts and query cost of a stock sync into a summary
+    and emits it to Airflow's StatsD `Stats` facade.
+    Batch results are recorded by the thread consuming them, so no locking is needed.
+    :param prefix: Prefix of the emitted metric names
+    :param tags: Tags attached to the emitted metrics
+    :param batch_metrics: Also emit the timings of every batch, e.g. for histograms
+    :param stats: Stats facade, injectable for testing
+    """
+
+    def __init__(
+        self, prefix="shopify_stock_sync", tags=None, batch_metrics=False, stats=Stats
+    ):
+        self.prefix = prefix
+        self.tags = tags or {}
+        self.batch_metrics = batch_metrics
+        self.stats = stats
+        self.seconds = Counter()
+        self.counts = Counter()
+        self._started_at = time.perf_counter()
+
+    def add_seconds(self, phase, seconds):
+        """Adds time spent in a phase, e.g. parse, lookup or mutation"""
+        self.seconds[phase] += seconds
+
+    def increment(self, name, count=1):
+        """Increments a counter of the summary"""
+        self.counts[name] += count
+
+    def record_batch(self, batch_result):
+        """Adds the counts and timings of a processed batch.
+
+        :param batch_result: Dictionary returned for the batch by the operator.
+        """
+        self.counts["batches"] += 1
+        for name in (
+            "skus",
+            "changed",
+            "unchanged",
+            "not_found",
+            "unmatched",
+            "conflicts",
+        ):
+            self.counts[name] += batch_result[name]
+        self.counts["mutations"] += len(batch_result["responses"])
+        self.seconds["lookup"] += batch_result["lookup_seconds"]
+        self.seconds["mutation"] += batch_result["mutation_seconds"]
+
+        if self.batch_metrics:
+            for phase in ("lookup", "mutation"):
+                self.stats.timing(
+                    f"{self.prefix}.batch_{phase}_seconds",
+                    batch_result[f"{phase}_seconds"] * 1000,
+                    tags=self.tags,
+                )
+            self.stats.timing(
+                f"{self.prefix}.batch_seconds",
+                (batch_result["lookup_seconds"] + batch_result["mutation_seconds"])
+                * 1000,
+                tags=self.tags,
+            )
+
+    def summary(self, throttle):
+        """Builds the summary of the sync.
+
+        :param throttle: The ShopifyCostThrottle used for the requests of the sync.
+        :return: Dictionary of timings in seconds, SKU counts and query cost points.
+        """
+        return {
+            "total_seconds": time.perf_counter() - self._started_at,
+            "parse_seconds": self.seconds["parse"],
+            # Lookup and mutation time includes waiting for the cost throttle
+            "lookup_seconds": self.seconds["lookup"],
+            "mutation_seconds": self.seconds["mutation"],
+            "throttle_seconds": throttle.total_sleep_seconds,
+            "batches": self.counts["batches"],
+            "batches_resumed": self.counts["resumed_batches"],
+            "skus_resumed": self.counts["resumed_skus"],
+            "rows_invalid": self.counts["invalid_rows"],
+            "skus": self.counts["skus"],
+            "skus_changed": self.counts["changed"],
+            "skus_unchanged": self.counts["unchanged"],
+            "skus_not_found": self.counts["not_found"],
+            "variants_unmatched": self.counts["unmatched"],
+            "skus_skipped": self.counts["skipped"],
+            "skus_cached": self.counts["cached"],
+            "webhooks_rejected": self.counts["rejected_webhooks"],
+            "mutations": self.counts["mutations"],
+            "conflict_retries": self.counts["conflicts"],
+            "throttle_retries": throttle.retries,
+            "cost_consumed": throttle.total_actual_cost,
+            "cost_maximum_available": throttle.maximum_available,
+            "cost_minimum_available": throttle.minimum_available,
+            "cost_restore_rate": throttle.restore_rate,
+        }
+
+    def emit(self, summary):
+        """Emits a summary as StatsD timers (durations) and gauges (everything else)"""
+        for name, value in summary.items():
+            if value is None:
+                continue
+            if name.endswith("_seconds"):
+                self.stats.timing(f"{self.prefix}.{name}", value * 1000, tags=self.tags)
+            else:
+                self.stats.gauge(f"{self.prefix}.{name}", value, tags=self.tags)
@@ -1,6 +1,12 @@
 from airflow.plugins_manager import AirflowPlugin
 
 from plugins.hooks.shopify_hook import ShopifyHook
+from plugins.operators.shopify_multi_store_update_stock_csv_operator import (
+    ShopifyMultiStoreUpdateStockCsvOperator,
+)
+from plugins.operators.shopify_partition_stock_csv_operator import (
+    ShopifyPartitionStockCsvOperator,
+)
 from plugins.operators.shopify_update_stock_csv_operator import (
     ShopifyUpdateStockCsvOperator,
 )
@@ -9,4 +15,8 @@ from plugins.operators.shopify_update_stock_csv_operator import (
 class ShopifyStockPlugin(AirflowPlugin):
     name = "shopify_stock_plugin"
     hooks = [ShopifyHook]
-    operators = [ShopifyUpdateStockCsvOperator]
+    operators = [
+        ShopifyUpdateStockCsvOperator,
+        ShopifyMultiStoreUpdateStockCsvOperator,
+        ShopifyPartitionStockCsvOperator,
+    ]
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from airflow import configuration
+
+from benchmarks.fake_shopify_server import FakeShopifyServer
+from benchmarks.run_benchmarks import LOCATION_ID, generate_feed, sync_feed
+
+
+class TestFakeShopifyServer(unittest.TestCase):
+
+    def setUp(self):
+        configuration.conf.load_test_config()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_location = os.path.join(self.tmp_dir.name, "stock.csv")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def sync(self, inventory, update_mode, **server_kwargs):
+        server = FakeShopifyServer(
+            inventory, location_id=LOCATION_ID, **server_kwargs
+        ).start()
+        try:
+            result = sync_feed(
+                server.url,
+                self.file_location,
+                {"sku_per_request": 50, "update_mode": update_mode},
+            )
+        finally:
+            server.stop()
+        return server, result
+
+    def test_sync_converges_stock(self):
+        for update_mode in ("adjust", "set"):
+            with self.subTest(update_mode=update_mode):
+                inventory = generate_feed(self.file_location, 500, 0.5)
+                with open(self.file_location) as csv_file:
+                    expected = {
+                        sku: int(stock)
+                        for sku, stock in (line.split(",") for line in csv_file)
+                    }
+
+                server, result = self.sync(inventory, update_mode)
+
+                self.assertEqual(server.quantities, expected)
+                self.assertEqual(server.calls["ProductVariantsBySku"], 10)
+                self.assertGreater(server.total_cost, 0)
+
+    def test_throttled_requests_are_retried(self):
+        inventory = generate_feed(self.file_location, 200, 1.0)
+
+        server, result = self.sync(
+            inventory, "adjust", maximum_available=60, restore_rate=1000
+        )
+
+        self.assertGreater(server.throttled + result["throttled_seconds"], 0)
+        # Throttled attempts are retried, each batch is applied once
+        self.assertEqual(server.applied["InventoryAdjust"], 4)
@@ -1,3 +1,4 @@
+import sys
 import unittest
 from unittest import mock
 
@@ -12,9 +13,11 @@ class TestShopifyHook(unittest.TestCase):
     def setUp(self):
         configuration.conf.load_test_config()
 
-    @mock.patch("plugins.hooks.shopify_hook.shopify")
+    @mock.patch.dict(sys.modules, {"shopify": mock.MagicMock()})
     @mock.patch.object(BaseHook, "get_connection")
-    def test_get_conn_success(self, mock_get_connection, mock_shopify):
+    def test_get_conn_success(self, mock_get_connection):
+        # The Shopify SDK is imported on first use
+        mock_shopify = sys.modules["shopify"]
 
         # Mock the Airflow connection
         mock_connection = mock.MagicMock()
@@ -41,3 +44,45 @@ class TestShopifyHook(unittest.TestCase):
         )
         mock_shopify.GraphQL.assert_called_once()
         self.assertEqual(client, mock_graphql_client)
+
+    @mock.patch("plugins.hooks.shopify_hook.requests.Session")
+    @mock.patch.dict(sys.modules, {"shopify": mock.MagicMock()})
+    @mock.patch.object(BaseHook, "get_connection")
+    def test_get_session_client(self, mock_get_connection, mock_session_class):
+        mock_shopify = sys.modules["shopify"]
+        mock_connection = mock.MagicMock()
+        mock_connection.host = "myshop.myshopify.com"
+        mock_connection.password = "access_token "
+        mock_get_connection.return_value = mock_connection
+
+        mock_session = mock_session_class.return_value
+        mock_session.headers = {}
+        mock_session.post.return_value.text = '{"data": {}}'
+
+        hook = ShopifyHook(conn_id="shopify_default", pool_size=4)
+        client = hook.get_session_client()
+        response = client.execute("query { shop { name } }", {"a": 1})
+        client.execute("query { shop { name } }")
+
+        # No process-global session is activated
+        mock_shopify.ShopifyResource.activate_session.assert_not_called()
+        self.assertEqual(response, '{"data": {}}')
+
+        # Client and session are reused for the whole task
+        self.assertIs(hook.get_session_client(), client)
+        mock_session_class.assert_called_once()
+        self.assertEqual(client._adapter._pool_maxsize, 4)
+        self.assertEqual(mock_session.headers["X-Shopify-Access-Token"], "access_token")
+        self.assertEqual(mock_session.headers["Accept-Encoding"], "gzip")
+        mock_session.post.assert_any_call(
+            "https://myshop.myshopify.com/admin/api/2025-01/graphql.json",
+            json={
+                "query": "query { shop { name } }",
+                "variables": {"a": 1},
+                "operationName": None,
+            },
+            timeout=(10, 60),
+        )
+
+        hook.close()
+        self.assertIsNone(hook.session_client)
@@ -0,0 +1,155 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from airflow import configuration
+from airflow.exceptions import AirflowException
+
+from plugins.operators.shopify_multi_store_update_stock_csv_operator import (
+    ShopifyMultiStoreUpdateStockCsvOperator,
+)
+
+
+def product_variants_result(client, skus, location_id=None):
+    return {
+        "data": {
+            "productVariants": {
+                "edges": [
+                    {
+                        "node": {
+                            "sku": sku,
+                            "inventoryItem": {
+                                "id": f"{location_id}/{sku}",
+                                "inventoryLevel": {"quantities": [{"quantity": 0}]},
+                            },
+                        }
+                    }
+                    for sku in skus
+                ]
+            }
+        }
+    }
+
+
+class TestShopifyMultiStoreUpdateStockCsvOperator(unittest.TestCase):
+
+    def setUp(self):
+        configuration.conf.load_test_config()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_location = os.path.join(self.tmp_dir.name, "stock.csv")
+        with open(self.file_location, "w") as csv_file:
+            csv_file.write("SKU1,10\nSKU2,20\nSKU3,x\nSKU1,5\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_invalid_sku_index_location(self):
+        with self.assertRaises(AirflowException):
+            ShopifyMultiStoreUpdateStockCsvOperator(
+                task_id="test_task",
+                stores={"shop_a": "location_a"},
+                file_location=self.file_location,
+                sku_index_location="/tmp/sku_index.db",
+            )
+
+    def test_deferrable_not_supported(self):
+        with self.assertRaises(AirflowException):
+            ShopifyMultiStoreUpdateStockCsvOperator(
+                task_id="test_task",
+                stores={"shop_a": "location_a"},
+                file_location=self.file_location,
+                deferrable=True,
+            )
+
+    @mock.patch(
+        "plugins.operators.shopify_multi_store_update_stock_csv_operator.ShopifyHook"
+    )
+    def test_execute_syncs_all_stores(self, mock_shopify_hook):
+        clients = {"shop_a": mock.Mock(), "shop_b": mock.Mock()}
+        for client in clients.values():
+            client.execute.return_value = json.dumps(
+                {
+                    "data": {"inventoryAdjustQuantities": {"userErrors": []}},
+                    "extensions": {},
+                }
+            )
+        mock_shopify_hook.side_effect = lambda conn_id, **kwargs: mock.Mock(
+            get_session_client=mock.Mock(return_value=clients[conn_id])
+        )
+        operator = ShopifyMultiStoreUpdateStockCsvOperator(
+            task_id="test_task",
+            stores={"shop_a": "location_a", "shop_b": "location_b"},
+            file_location=self.file_location,
+            cost_share=0.5,
+        )
+        operator.get_product_variants = mock.Mock(side_effect=product_variants_result)
+        store_throttles = []
+        for_store = operator.for_store
+
+        def record_store_throttle(*args):
+            store_operator = for_store(*args)
+            store_throttles.append(store_operator.throttle)
+            return store_operator
+
+        operator.for_store = record_store_throttle
+
+        result = operator.execute({})
+
+        # The invalid row is reported once for all stores
+        self.assertEqual(result["spool"]["skus"], 2)
+        self.assertEqual(result["spool"]["rows_invalid"], 1)
+        store_results = result["stores"]
+        self.assertEqual(set(store_results), {"shop_a", "shop_b"})
+        self.assertEqual([throttle.share for throttle in store_throttles], [0.5, 0.5])
+        for conn_id, client in clients.items():
+            self.assertEqual(store_results[conn_id]["status"], "success")
+            location_id = operator.stores[conn_id]
+            self.assertEqual(
+                client.execute.call_args.kwargs["variables"]["input"]["changes"],
+                [
+                    {
+                        "inventoryItemId": f"{location_id}/SKU1",
+                        "delta": 5,
+                        "locationId": location_id,
+                    },
+                    {
+                        "inventoryItemId": f"{location_id}/SKU2",
+                        "delta": 20,
+                        "locationId": location_id,
+                    },
+                ],
+            )
+        # The CSV file is parsed once, each store runs with its own throttle
+        self.assertIsNone(operator.spool_location)
+        self.assertEqual(operator.throttle.total_actual_cost, 0)
+
+    @mock.patch(
+        "plugins.operators.shopify_multi_store_update_stock_csv_operator.ShopifyHook"
+    )
+    def test_execute_isolates_store_failures(self, mock_shopify_hook):
+        clients = {"shop_a": mock.Mock(), "shop_b": mock.Mock()}
+        clients["shop_a"].execute.side_effect = Exception("Connection reset")
+        clients["shop_b"].execute.return_value = json.dumps(
+            {
+                "data": {"inventoryAdjustQuantities": {"userErrors": []}},
+                "extensions": {},
+            }
+        )
+        mock_shopify_hook.side_effect = lambda conn_id, **kwargs: mock.Mock(
+            get_session_client=mock.Mock(return_value=clients[conn_id])
+        )
+        operator = ShopifyMultiStoreUpdateStockCsvOperator(
+            task_id="test_task",
+            stores={"shop_a": "location_a", "shop_b": "location_b"},
+            file_location=self.file_location,
+        )
+        operator.get_product_variants = mock.Mock(side_effect=product_variants_result)
+
+        with self.assertRaises(AirflowException) as context:
+            operator.execute({})
+
+        self.assertIn("shop_a", str(context.exception))
+        self.assertNotIn("shop_b", str(context.exception))
+        clients["shop_b"].execute.assert_called_once()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+from airflow import configuration
+from airflow.exceptions import AirflowException
+
+from plugins.operators.shopify_partition_stock_csv_operator import (
+    ShopifyPartitionStockCsvOperator,
+)
+from plugins.utils.stock_feed import shard_index
+
+
+class TestShopifyPartitionStockCsvOperator(unittest.TestCase):
+
+    def setUp(self):
+        configuration.conf.load_test_config()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_location = os.path.join(self.tmp_dir.name, "stock.csv")
+        self.output_location = os.path.join(self.tmp_dir.name, "shards")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def partition(self, shards):
+        return ShopifyPartitionStockCsvOperator(
+            task_id="partition",
+            file_location=self.file_location,
+            output_location=self.output_location,
+            shards=shards,
+        ).execute({})
+
+    def test_execute(self):
+        rows = [f"SKU{index},{index}" for index in range(100)] + ["SKU7,70", ""]
+        with open(self.file_location, "w") as csv_file:
+            csv_file.write("\n".join(rows) + "\n")
+
+        shard_locations = self.partition(4)
+
+        self.assertEqual(len(shard_locations), 4)
+        shard_rows = {}
+        for shard_location in shard_locations:
+            with open(shard_location) as shard_file:
+                shard_rows[shard_location] = shard_file.read().splitlines()
+        self.assertCountEqual(sum(shard_rows.values(), []), rows[:-1])
+        for shard_location, lines in shard_rows.items():
+            skus = {line.split(",")[0] for line in lines}
+            self.assertEqual(
+                {shard_index(sku, 4) for sku in skus},
+                {shard_locations.index(shard_location)},
+            )
+        # Duplicates stay in order within their shard
+        seven = shard_rows[shard_locations[shard_index("SKU7", 4)]]
+        self.assertLess(seven.index("SKU7,7"), seven.index("SKU7,70"))
+
+    def test_execute_skips_empty_shards(self):
+        with open(self.file_location, "w") as csv_file:
+            csv_file.write("SKU1,1\n")
+
+        shard_locations = self.partition(8)
+
+        self.assertEqual(len(shard_locations), 1)
+        self.assertEqual(
+            os.listdir(self.output_location),
+            ["shard-{:04d}-of-0008.csv".format(shard_index("SKU1", 8))],
+        )
+
+    def test_execute_file_not_found(self):
+        with self.assertRaises(AirflowException) as context:
+            self.partition(2)
+        self.assertIn("Error trying to partition file", str(context.exception))
+
+    def test_invalid_shards(self):
+        with self.assertRaises(AirflowException):
+            ShopifyPartitionStockCsvOperator(
+                task_id="partition",
+                file_location=self.file_location,
+                output_location=self.output_location,
+                shards=0,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,37 @@
+import csv
+import gzip
+import io
 import json
+import math
+import os
+import tempfile
 import unittest
+from contextlib import nullcontext
 from unittest import mock
 
 from airflow import configuration
-from airflow.exceptions import AirflowException
+from airflow.exceptions import AirflowException, TaskDeferred
 
+from benchmarks.fake_shopify_server import FakeShopifyServer
+from benchmarks.run_benchmarks import LOCATION_ID, generate_feed
+from plugins.hooks.shopify_hook import ShopifyGraphQLClient
 from plugins.operators.shopify_update_stock_csv_operator import (
     ShopifyUpdateStockCsvOperator,
 )
+from plugins.utils.adaptive_batch_size import AdaptiveBatchSize
+from plugins.utils.inventory_level_store import InventoryLevelStore
+from plugins.utils.shopify_queries import (
+    INVENTORY_SET,
+    PRODUCT_VARIANTS_BY_SKU,
+)
+
+
+def inventory_item(inventory_item_id, available):
+    return {
+        "id": inventory_item_id,
+        "inventoryLevel": {"quantities": [{"quantity": available}]},
+    }
+
 
 PRODUCT_VARIANTS_RESULT = {
     "data": {
@@ -16,15 +40,13 @@ PRODUCT_VARIANTS_RESULT = {
                 {
                     "node": {
                         "sku": "SKU1",
-                        "inventoryQuantity": 30,
-                        "inventoryItem": {"id": "inventory_item_id1"},
+                        "inventoryItem": inventory_item("inventory_item_id1", 30),
                     }
                 },
                 {
                     "node": {
                         "sku": "SKU2",
-                        "inventoryQuantity": 150,
-                        "inventoryItem": {"id": "inventory_item_id2"},
+                        "inventoryItem": inventory_item("inventory_item_id2", 150),
                     }
                 },
             ]
@@ -34,33 +56,28 @@ PRODUCT_VARIANTS_RESULT = {
 }
 
 
-def get_inventory_query(sku_per_request, sku_query):
-    query = (
-        """
-            query {
-            productVariants(first: """
-        + str(sku_per_request)
-        + """, query: \""""
-        + sku_query
-        + """\") {
-                edges {
-                cursor
-                node {
-                    sku
-                    inventoryQuantity
-                    inventoryItem {
-                    id
-                    }
-                }
-                }
-                pageInfo {
-                    hasNextPage
-                    hasPreviousPage
-                }
+def filter_product_variants_result(client, skus, location_id=None):
+    edges = PRODUCT_VARIANTS_RESULT["data"]["productVariants"]["edges"]
+    return {
+        "data": {
+            "productVariants": {
+                "edges": [edge for edge in edges if edge["node"]["sku"] in skus]
             }
-            }"""
+        }
+    }
+
+
+def get_inventory_query_call(sku_per_request, sku_query, cursor=None):
+    return mock.call(
+        PRODUCT_VARIANTS_BY_SKU,
+        variables={
+            "first": sku_per_request,
+            "after": cursor,
+            "query": sku_query,
+            "locationId": "test_location",
+        },
+        operation_name="ProductVariantsBySku",
     )
-    return query
 
 
 class TestShopifyUpdateStockCsvOperator(unittest.TestCase):
@@ -77,32 +94,133 @@ class TestShopifyUpdateStockCsvOperator(unittest.TestCase):
         )
 
     @mock.patch(
-        "plugins.operators.shopify_update_stock_csv_operator.open",
-        new_callable=mock.mock_open,
-        read_data="SKU1,10\nSKU2,20\n",
+        "plugins.operators.shopify_update_stock_csv_operator.open_feed",
+        side_effect=lambda source: nullcontext(io.StringIO("SKU1,10\nSKU2,20\n")),
+    )
+    def test_read_stock_batches_success(self, mock_file):
+        stock_batches = list(self.operator.read_stock_batches())
+        expected_stock_batches = [{"SKU1": 10, "SKU2": 20}]
+        self.assertEqual(stock_batches, expected_stock_batches)
+
+    @mock.patch(
+        "plugins.operators.shopify_update_stock_csv_operator.open_feed",
+        side_effect=lambda source: nullcontext(
+            io.StringIO("SKU1,10\nSKU2,20\nSKU3,30\nSKU1,5\nSKU4,40\n")
+        ),
+    )
+    def test_read_stock_batches_duplicates_last_wins(self, mock_file):
+        self.operator.sku_per_request = 2
+        stock_batches = list(self.operator.read_stock_batches())
+        expected_stock_batches = [{"SKU1": 5, "SKU2": 20}, {"SKU3": 30, "SKU4": 40}]
+        self.assertEqual(stock_batches, expected_stock_batches)
+
+    @mock.patch(
+        "plugins.operators.shopify_update_stock_csv_operator.open_feed",
+        side_effect=lambda source: nullcontext(
+            io.StringIO("SKU1,10\nSKU2,twenty\n,5\nSKU3,30\n")
+        ),
+    )
+    def test_read_stock_batches_skips_invalid_rows(self, mock_file):
+        stock_batches = list(self.operator.read_stock_batches())
+        self.assertEqual(stock_batches, [{"SKU1": 10, "SKU3": 30}])
+        self.assertEqual(self.operator.metrics.counts["invalid_rows"], 2)
+
+        self.operator.max_invalid_rows = 1
+        with self.assertRaises(AirflowException) as context:
+            list(self.operator.read_stock_batches())
+        self.assertIn("More than 1 invalid rows", str(context.exception))
+
+    @mock.patch(
+        "plugins.operators.shopify_update_stock_csv_operator.open_feed",
+        side_effect=lambda source: nullcontext(
+            io.StringIO("sku;stock\nSKU1;10\nSKU2;20\n")
+        ),
     )
-    def test_read_stock_data_success(self, mock_file):
-        stock_data = self.operator.read_stock_data()
-        expected_stock_data = {"SKU1": 10, "SKU2": 20}
-        self.assertEqual(stock_data, expected_stock_data)
+    def test_read_stock_batches_rejects_file_without_valid_rows(self, mock_file):
+        # Wrong delimiter, rejected even without limit on the invalid rows
+        with self.assertRaises(AirflowException) as context:
+            list(self.operator.read_stock_batches())
+        self.assertIn("No valid rows in csv file", str(context.exception))
+        self.assertEqual(self.operator.metrics.counts["invalid_rows"], 3)
+
+    def test_read_stock_batches_compressed_url(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_location = os.path.join(tmp_dir, "stock.csv.gz")
+            with gzip.open(file_location, "wt") as csv_file:
+                csv_file.write("SKU1,10\nSKU2,20\n")
+
+            for fast_csv_parser in (False, True):
+                with self.subTest(fast_csv_parser=fast_csv_parser):
+                    self.operator.file_location = f"file://{file_location}"
+                    self.operator.fast_csv_parser = fast_csv_parser
+                    stock_batches = list(self.operator.read_stock_batches())
+                    self.assertEqual(stock_batches, [{"SKU1": 10, "SKU2": 20}])
 
     @mock.patch(
-        "plugins.operators.shopify_update_stock_csv_operator.open",
+        "plugins.operators.shopify_update_stock_csv_operator.open_feed",
         side_effect=Exception("[Errno 2] No such file or directory"),
     )
-    def test_read_stock_data_file_not_found(self, mock_file):
+    def test_read_stock_batches_file_not_found(self, mock_file):
         with self.assertRaises(AirflowException) as context:
-            self.operator.read_stock_data()
+            list(self.operator.read_stock_batches())
 
         self.assertIn(
             "Error trying to read file. [Errno 2] No such file or directory",
             str(context.exception),
         )
 
+    def test_execute_deferrable(self):
+        self.operator.deferrable = True
+        self.operator.max_workers = 4
+
+        with self.assertRaises(TaskDeferred) as context:
+            self.operator.execute({})
+
+        self.assertEqual(context.exception.method_name, "execute_complete")
+        _, trigger_kwargs = context.exception.trigger.serialize()
+        self.assertEqual(trigger_kwargs["location_id"], "test_location")
+        self.assertEqual(trigger_kwargs["file_location"], "test.csv")
+        self.assertEqual(trigger_kwargs["max_workers"], 4)
+
+        self.operator.delta_snapshot_location = "snapshot.db"
+        with self.assertRaises(AirflowException) as context:
+            self.operator.execute({})
+        self.assertIn("delta_snapshot_location", str(context.exception))
+
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.Pool.get_pool")
+    def test_get_cost_share(self, mock_get_pool):
+        self.assertEqual(self.operator.get_cost_share(), 1.0)
+        mock_get_pool.assert_not_called()
+
+        # A pool sized to 100 points per second, of which the task takes 25
+        self.operator.pool = "shopify_budget"
+        self.operator.pool_slots = 25
+        mock_get_pool.return_value.slots = 100
+        self.assertEqual(self.operator.get_cost_share(), 0.25)
+
+        self.operator.cost_share = 0.5
+        self.assertEqual(self.operator.get_cost_share(), 0.5)
+        self.operator.cost_share = 2
+        with self.assertRaises(AirflowException):
+            self.operator.get_cost_share()
+
+    def test_execute_complete(self):
+        summary = {"skus": 2, "skus_changed": 1}
+        self.assertEqual(
+            self.operator.execute_complete(
+                {}, {"status": "success", "summary": summary}
+            ),
+            summary,
+        )
+
+        with self.assertRaises(AirflowException) as context:
+            self.operator.execute_complete({}, {"status": "error", "message": "boom"})
+        self.assertIn("Stock sync failed: boom", str(context.exception))
+
     def test_get_product_variants_success(self):
         skus = ["SKU1", "SKU2"]
         sku_per_request = self.operator.sku_per_request
-        sku_query = "sku:SKU1 OR sku:SKU2"
+        sku_query = 'sku:"SKU1" OR sku:"SKU2"'
 
         sample_response = {
             "data": {
@@ -112,20 +230,22 @@ class TestShopifyUpdateStockCsvOperator(unittest.TestCase):
                             "cursor": "cursor1",
                             "node": {
                                 "sku": "SKU1",
-                                "inventoryQuantity": 100,
-                                "inventoryItem": {"id": "inventory_item_id1"},
+                                "inventoryItem": inventory_item(
+                                    "inventory_item_id1", 100
+                                ),
                             },
                         },
                         {
                             "cursor": "cursor2",
                             "node": {
                                 "sku": "SKU2",
-                                "inventoryQuantity": 200,
-                                "inventoryItem": {"id": "inventory_item_id2"},
+                                "inventoryItem": inventory_item(
+                                    "inventory_item_id2", 200
+                                ),
                             },
                         },
                     ],
-                    "pageInfo": {"hasNextPage": False, "hasPreviousPage": False},
+                    "pageInfo": {"hasNextPage": False, "endCursor": "cursor2"},
                 }
             },
             "extensions": {
@@ -148,15 +268,107 @@ class TestShopifyUpdateStockCsvOperator(unittest.TestCase):
 
         response = self.operator.get_product_variants(mock_client, skus)
 
-        mock_client.execute.assert_called_with(
-            get_inventory_query(sku_per_request, sku_query)
+        self.assertEqual(
+            mock_client.execute.call_args,
+            get_inventory_query_call(sku_per_request, sku_query),
         )
         self.assertEqual(response, sample_response)
 
+    def test_get_product_variants_follows_pages(self):
+        skus = ["SKU1", "SKU2"]
+        sku_query = 'sku:"SKU1" OR sku:"SKU2"'
+        pages = [
+            {
+                "data": {
+                    "productVariants": {
+                        "edges": [
+                            PRODUCT_VARIANTS_RESULT["data"]["productVariants"]["edges"][
+                                0
+                            ]
+                        ],
+                        "pageInfo": {"hasNextPage": True, "endCursor": "cursor1"},
+                    }
+                }
+            },
+            {
+                "data": {
+                    "productVariants": {
+                        "edges": [
+                            PRODUCT_VARIANTS_RESULT["data"]["productVariants"]["edges"][
+                                1
+                            ]
+                        ],
+                        "pageInfo": {"hasNextPage": False, "endCursor": "cursor2"},
+                    }
+                }
+            },
+        ]
+        mock_client = mock.Mock()
+        mock_client.execute.side_effect = [json.dumps(page) for page in pages]
+
+        response = self.operator.get_product_variants(mock_client, skus)
+
+        self.assertEqual(
+            mock_client.execute.call_args_list,
+            [
+                get_inventory_query_call(100, sku_query),
+                get_inventory_query_call(100, sku_query, "cursor1"),
+            ],
+        )
+        self.assertEqual(
+            [
+                edge["node"]["sku"]
+                for edge in response["data"]["productVariants"]["edges"]
+            ],
+            ["SKU1", "SKU2"],
+        )
+
+    def test_get_current_stock_at_location(self):
+        product_variants_result = json.loads(json.dumps(PRODUCT_VARIANTS_RESULT))
+        # SKU2 is not stocked at the location
+        product_variants_result["data"]["productVariants"]["edges"][1]["node"][
+            "inventoryItem"
+        ]["inventoryLevel"] = None
+        self.operator.get_product_variants = mock.Mock(
+            return_value=product_variants_result
+        )
+
+        current_stock = self.operator.get_current_stock(mock.Mock(), ["SKU1", "SKU2"])
+
+        self.assertEqual(current_stock, [("SKU1", "inventory_item_id1", 30)])
+
+    def test_process_batch_skips_variants_not_in_batch(self):
+        # The SKU search is case-insensitive, SKU2 also matches the variant sku2
+        product_variants_result = json.loads(json.dumps(PRODUCT_VARIANTS_RESULT))
+        product_variants_result["data"]["productVariants"]["edges"][1]["node"][
+            "sku"
+        ] = "sku2"
+        self.operator.get_product_variants = mock.Mock(
+            return_value=product_variants_result
+        )
+        self.operator.dry_run = True
+
+        batch_result = self.operator.process_batch(
+            mock.Mock(), {"SKU1": 10, "SKU2": 20}
+        )
+
+        self.assertEqual(
+            batch_result["mutations"][0]["input"]["changes"],
+            [
+                {
+                    "inventoryItemId": "inventory_item_id1",
+                    "delta": -20,
+                    "locationId": "test_location",
+                }
+            ],
+        )
+        self.assertEqual(batch_result["not_found"], 1)
+        self.assertEqual(batch_result["unmatched"], 1)
+
     def test_get_product_variants_execute_exception(self):
         skus = ["SKU1", "SKU2"]
         sku_per_request = self.operator.sku_per_request
-        sku_query = "sku:SKU1 OR sku:SKU2"
+        sku_query = 'sku:"SKU1" OR sku:"SKU2"'
 
         mock_client = mock.Mock()
         mock_client.execute.side_effect = Exception("Client execution error")
@@ -168,14 +380,15 @@ class TestShopifyUpdateStockCsvOperator(unittest.TestCase):
             "Error fetching product variants: Client execution error",
             str(context.exception),
         )
-        mock_client.execute.assert_called_with(
-            get_inventory_query(sku_per_request, sku_query)
+        self.assertEqual(
+            mock_client.execute.call_args,
+            get_inventory_query_call(sku_per_request, sku_query),
         )
 
     def test_get_product_variants_api_error(self):
         skus = ["SKU1", "SKU2"]
         sku_per_request = self.operator.sku_per_request
-        sku_query = "sku:SKU1 OR sku:SKU2"
+        sku_query = 'sku:"SKU1" OR sku:"SKU2"'
 
         mock_client = mock.Mock()
 
@@ -196,8 +409,9 @@ class TestShopifyUpdateStockCsvOperator(unittest.TestCase):
             "Errors returned by Shopify API for product variants query: [{'message': 'Error returned by Shopify API'}]",
             str(context.exception),
         )
-        mock_client.execute.assert_called_with(
-            get_inventory_query(sku_per_request, sku_query)
+        self.assertEqual(
+            mock_client.execute.call_args,
+            get_inventory_query_call(sku_per_request, sku_query),
         )
 
     @mock.patch(
@@ -207,10 +421,10 @@ class TestShopifyUpdateStockCsvOperator(unittest.TestCase):
     @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
     def test_execute_success(self, mock_shopify_hook, mock_sleep):
         mock_client = mock.Mock()
-        mock_shopify_hook.return_value.get_conn.return_value = mock_client
+        mock_shopify_hook.return_value.get_session_client.return_value = mock_client
 
-        self.operator.read_stock_data = mock.Mock(
-            return_value={"SKU1": 50, "SKU2": 150}
+        self.operator.read_stock_batches = mock.Mock(
+            return_value=[{"SKU1": 50, "SKU2": 150}]
         )
 
         self.operator.get_product_variants = mock.Mock(
@@ -247,13 +461,22 @@ class TestShopifyUpdateStockCsvOperator(unittest.TestCase):
 
         context = {}
 
-        self.operator.execute(context)
+        summary = self.operator.execute(context)
 
-        self.operator.read_stock_data.assert_called_once()
+        self.operator.read_stock_batches.assert_called_once()
         self.operator.get_product_variants.assert_called()
         mock_client.execute.assert_called_once()  # Stock update query
         mock_sleep.assert_called()
 
+        # Summary is returned to XCom
+        self.assertEqual(summary["skus"], 2)
+        self.assertEqual(summary["skus_changed"], 1)
+        self.assertEqual(summary["skus_unchanged"], 1)
+        self.assertEqual(summary["skus_not_found"], 0)
+        self.assertEqual(summary["mutations"], 1)
+        self.assertEqual(summary["cost_consumed"], 11)
+        self.assertEqual(summary["cost_minimum_available"], 1989)
+
     @mock.patch(
         "plugins.operators.shopify_update_stock_csv_operator.time.sleep",
         return_value=None,
@@ -261,10 +484,10 @@ class TestShopifyUpdateStockCsvOperator(unittest.TestCase):
     @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
     def test_execute_no_stock_changes(self, mock_shopify_hook, mock_sleep):
         mock_client = mock.Mock()
-        mock_shopify_hook.return_value.get_conn.return_value = mock_client
+        mock_shopify_hook.return_value.get_session_client.return_value = mock_client
 
-        self.operator.read_stock_data = mock.Mock(
-            return_value={"SKU1": 30, "SKU2": 150}
+        self.operator.read_stock_batches = mock.Mock(
+            return_value=[{"SKU1": 30, "SKU2": 150}]
         )
 
         self.operator.get_product_variants = mock.Mock(
@@ -275,7 +498,7 @@ class TestShopifyUpdateStockCsvOperator(unittest.TestCase):
 
         self.operator.execute(context)
 
-        self.operator.read_stock_data.assert_called_once()
+        self.operator.read_stock_batches.assert_called_once()
         self.operator.get_product_variants.assert_called()
         mock_client.execute.assert_not_called()  # No stock update query
         mock_sleep.assert_called()
@@ -287,10 +510,10 @@ class TestShopifyUpdateStockCsvOperator(unittest.TestCase):
     @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
     def test_execute_error_updating_stock(self, mock_shopify_hook, mock_sleep):
         mock_client = mock.Mock()
-        mock_shopify_hook.return_value.get_conn.return_value = mock_client
+        mock_shopify_hook.return_value.get_session_client.return_value = mock_client
 
-        self.operator.read_stock_data = mock.Mock(
-            return_value={"SKU1": 50, "SKU2": 150}
+        self.operator.read_stock_batches = mock.Mock(
+            return_value=[{"SKU1": 50, "SKU2": 150}]
         )
 
         self.operator.get_product_variants = mock.Mock(
@@ -307,7 +530,7 @@ class TestShopifyUpdateStockCsvOperator(unittest.TestCase):
         self.assertIn(
             "Error updating stock: Error updating stock", str(context_manager.exception)
         )
-        self.operator.read_stock_data.assert_called_once()
+        self.operator.read_stock_batches.assert_called_once()
         self.operator.get_product_variants.assert_called()
         mock_client.execute.assert_called()
 
@@ -318,7 +541,7 @@ class TestShopifyUpdateStockCsvOperator(unittest.TestCase):
     @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
     def test_execute_dry_run_mode(self, mock_shopify_hook, mock_sleep):
         mock_client = mock.Mock()
-        mock_shopify_hook.return_value.get_conn.return_value = mock_client
+        mock_shopify_hook.return_value.get_session_client.return_value = mock_client
 
         operator_dry_run = ShopifyUpdateStockCsvOperator(
             task_id="test_task",
@@ -329,8 +552,8 @@ class TestShopifyUpdateStockCsvOperator(unittest.TestCase):
             wait_seconds=1,
             dry_run=True,
         )
-        operator_dry_run.read_stock_data = mock.Mock(
-            return_value={"SKU1": 50, "SKU2": 100}
+        operator_dry_run.read_stock_batches = mock.Mock(
+            return_value=[{"SKU1": 50, "SKU2": 100}]
         )
 
         operator_dry_run.get_product_variants = mock.Mock(
@@ -343,3 +566,923 @@ class TestShopifyUpdateStockCsvOperator(unittest.TestCase):
 
         # Assert that the client does not execute the query
         mock_client.execute.assert_not_called()
+
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
+    def test_execute_concurrent_mode(self, mock_shopify_hook):
+        mock_client = mock.Mock()
+        mock_shopify_hook.return_value.get_session_client.return_value = mock_client
+
+        operator_concurrent = ShopifyUpdateStockCsvOperator(
+            task_id="test_task",
+            conn_id="test_conn",
+            location_id="test_location",
+            file_location="test.csv",
+            sku_per_request=1,
+            max_workers=4,
+            dry_run=True,
+        )
+        operator_concurrent.read_stock_batches = mock.Mock(
+            return_value=[{f"SKU{i}": i + 1} for i in range(20)]
+        )
+
+        def get_product_variants(client, skus, location_id=None):
+            return {
+                "data": {
+                    "productVariants": {
+                        "edges": [
+                            {
+                                "node": {
+                                    "sku": sku,
+                                    "inventoryItem": inventory_item(f"id_{sku}", 0),
+                                }
+                            }
+                            for sku in skus
+                        ]
+                    }
+                }
+            }
+
+        operator_concurrent.get_product_variants = mock.Mock(
+            side_effect=get_product_variants
+        )
+        operator_concurrent.log_batch_result = mock.Mock()
+
+        operator_concurrent.execute({})
+
+        # Session client is used instead of the process-global session
+        mock_shopify_hook.return_value.get_conn.assert_not_called()
+        self.assertEqual(operator_concurrent.get_product_variants.call_count, 20)
+
+        # Batch results are logged in order
+        logged_changes = [
+            call.args[0]["mutations"][0]["input"]["changes"]
+            for call in operator_concurrent.log_batch_result.call_args_list
+        ]
+        self.assertEqual(
+            logged_changes,
+            [
+                [
+                    {
+                        "inventoryItemId": f"id_SKU{i}",
+                        "delta": i + 1,
+                        "locationId": "test_location",
+                    }
+                ]
+                for i in range(20)
+            ],
+        )
+
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
+    def test_execute_multiple_locations(self, mock_shopify_hook):
+        mock_client = mock.Mock()
+        mock_shopify_hook.return_value.get_session_client.return_value = mock_client
+        mock_client.execute.return_value = json.dumps(
+            {
+                "data": {
+                    "nodes": [
+                        {
+                            "id": "inventory_item_id1",
+                            "sku": "SKU1",
+                            "inventoryLevel": {"quantities": [{"quantity": 5}]},
+                        }
+                    ]
+                }
+            }
+        )
+        operator_multi = ShopifyUpdateStockCsvOperator(
+            task_id="test_task",
+            conn_id="test_conn",
+            location_id={"store": "location1", "warehouse": "location2"},
+            file_location="test.csv",
+            dry_run=True,
+            max_changes_per_mutation=1,
+        )
+        operator_multi.read_stock_batches = mock.Mock(
+            return_value=[
+                {
+                    ("SKU1", "location1"): 50,
+                    ("SKU2", "location1"): 150,
+                    ("SKU1", "location2"): 10,
+                }
+            ]
+        )
+        operator_multi.get_product_variants = mock.Mock(
+            side_effect=filter_product_variants_result
+        )
+        operator_multi.log_batch_result = mock.Mock()
+
+        operator_multi.execute({})
+
+        # Each SKU is looked up once, the inventory item of SKU1 is reused
+        self.assertEqual(
+            operator_multi.get_product_variants.call_args_list,
+            [mock.call(mock_client, ["SKU1", "SKU2"], location_id="location1")],
+        )
+        self.assertEqual(
+            mock_client.execute.call_args.kwargs["variables"],
+            {"ids": ["inventory_item_id1"], "locationId": "location2"},
+        )
+
+        # Changes of both locations are split into mutations of one change each
+        mutations = operator_multi.log_batch_result.call_args[0][0]["mutations"]
+        self.assertEqual(
+            [variables["input"]["changes"] for variables in mutations],
+            [
+                [
+                    {
+                        "inventoryItemId": "inventory_item_id1",
+                        "delta": 20,
+                        "locationId": "location1",
+                    }
+                ],
+                [
+                    {
+                        "inventoryItemId": "inventory_item_id1",
+                        "delta": 5,
+                        "locationId": "location2",
+                    }
+                ],
+            ],
+        )
+
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
+    def test_execute_with_sku_index(self, mock_shopify_hook):
+        mock_client = mock.Mock()
+        mock_shopify_hook.return_value.get_session_client.return_value = mock_client
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            operator_index = ShopifyUpdateStockCsvOperator(
+                task_id="test_task",
+                conn_id="test_conn",
+                location_id="test_location",
+                file_location="test.csv",
+                sku_index_location=os.path.join(tmp_dir, "sku_index.db"),
+                dry_run=True,
+            )
+            operator_index.read_stock_batches = mock.Mock(
+                return_value=[{"SKU1": 50, "SKU2": 150, "SKU3": 1}]
+            )
+            operator_index.get_product_variants = mock.Mock(
+                return_value=PRODUCT_VARIANTS_RESULT
+            )
+
+            # First run warms the index
+            operator_index.execute({})
+            operator_index.get_product_variants.assert_called_once_with(
+                mock_client, ["SKU1", "SKU2", "SKU3"], location_id="test_location"
+            )
+
+            # Second run reads known SKUs by inventory item id
+            operator_index.read_stock_batches.return_value = [{"SKU1": 50, "SKU2": 150}]
+            operator_index.get_product_variants.reset_mock()
+            operator_index.get_product_variants.return_value = {
+                "data": {"productVariants": {"edges": []}}
+            }
+            operator_index.log_batch_result = mock.Mock()
+            mock_client.execute.return_value = json.dumps(
+                {
+                    "data": {
+                        "nodes": [
+                            {
+                                "id": "inventory_item_id1",
+                                "sku": "SKU1",
+                                "inventoryLevel": {"quantities": [{"quantity": 40}]},
+                            },
+                            None,
+                        ]
+                    }
+                }
+            )
+
+            operator_index.execute({})
+
+            # SKU2 was deleted in Shopify and is looked up again
+            operator_index.get_product_variants.assert_called_once_with(
+                mock_client, ["SKU2"], location_id="test_location"
+            )
+            variables = operator_index.log_batch_result.call_args[0][0]["mutations"][0]
+            self.assertEqual(
+                variables["input"]["changes"],
+                [
+                    {
+                        "inventoryItemId": "inventory_item_id1",
+                        "delta": 10,
+                        "locationId": "test_location",
+                    }
+                ],
+            )
+
+            # A batch with the unknown SKU3 is looked up in a single request
+            operator_index.read_stock_batches.return_value = [{"SKU1": 50, "SKU3": 1}]
+            operator_index.get_product_variants.reset_mock()
+            mock_client.execute.reset_mock()
+
+            operator_index.execute({})
+
+            mock_client.execute.assert_not_called()
+            operator_index.get_product_variants.assert_called_once_with(
+                mock_client, ["SKU1", "SKU3"], location_id="test_location"
+            )
+
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.iter_bulk_result")
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.run_bulk_query")
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
+    def test_execute_bulk_snapshot(
+        self, mock_shopify_hook, mock_run_bulk_query, mock_iter_bulk_result
+    ):
+        mock_client = mock.Mock()
+        mock_shopify_hook.return_value.get_session_client.return_value = mock_client
+        mock_run_bulk_query.return_value = "http://localhost/result.jsonl"
+        with open(
+            os.path.join(
+                os.path.dirname(__file__),
+                "../utils/test_data/bulk_product_variants.jsonl",
+            )
+        ) as jsonl_file:
+            mock_iter_bulk_result.return_value = [
+                json.loads(line) for line in jsonl_file
+            ]
+
+        operator_bulk = ShopifyUpdateStockCsvOperator(
+            task_id="test_task",
+            conn_id="test_conn",
+            location_id="test_location",
+            file_location="test.csv",
+            bulk_snapshot=True,
+            dry_run=True,
+        )
+        operator_bulk.read_stock_batches = mock.Mock(
+            return_value=[{"SKU1": 50, "SKU2": 150, "SKU3": 5, "SKU4": 1}]
+        )
+        operator_bulk.get_product_variants = mock.Mock()
+        operator_bulk.log_batch_result = mock.Mock()
+
+        operator_bulk.execute({})
+
+        self.assertIn(
+            'inventoryLevel(locationId: "test_location")',
+            mock_run_bulk_query.call_args.args[2],
+        )
+        operator_bulk.get_product_variants.assert_not_called()
+        mock_iter_bulk_result.assert_called_once_with("http://localhost/result.jsonl")
+        self.assertEqual(
+            {
+                sku: operator_bulk.inventory_snapshot["test_location"].get(sku)
+                for sku in ("SKU1", "SKU2", "SKU3")
+            },
+            {
+                "SKU1": ("gid://shopify/InventoryItem/1", 30),
+                "SKU2": ("gid://shopify/InventoryItem/2", 150),
+                "SKU3": None,
+            },
+        )
+        variables = operator_bulk.log_batch_result.call_args[0][0]["mutations"][0]
+        self.assertEqual(
+            variables["input"]["changes"],
+            [
+                {
+                    "inventoryItemId": "gid://shopify/InventoryItem/1",
+                    "delta": 20,
+                    "locationId": "test_location",
+                }
+            ],
+        )
+
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.iter_bulk_result")
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.run_bulk_query")
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
+    def test_execute_bulk_snapshot_conflict(
+        self, mock_shopify_hook, mock_run_bulk_query, mock_iter_bulk_result
+    ):
+        mock_client = mock.Mock()
+        mock_shopify_hook.return_value.get_session_client.return_value = mock_client
+        mock_run_bulk_query.return_value = "http://localhost/result.jsonl"
+        with open(
+            os.path.join(
+                os.path.dirname(__file__),
+                "../utils/test_data/bulk_product_variants.jsonl",
+            )
+        ) as jsonl_file:
+            mock_iter_bulk_result.return_value = [
+                json.loads(line) for line in jsonl_file
+            ]
+        mock_client.execute.side_effect = [
+            json.dumps(
+                {
+                    "data": {
+                        "inventorySetQuantities": {
+                            "userErrors": [{"code": "COMPARE_QUANTITY_STALE"}]
+                        }
+                    }
+                }
+            ),
+            json.dumps(
+                {
+                    "data": {"inventorySetQuantities": {"userErrors": []}},
+                    "extensions": {},
+                }
+            ),
+        ]
+
+        operator_bulk = ShopifyUpdateStockCsvOperator(
+            task_id="test_task",
+            conn_id="test_conn",
+            location_id="test_location",
+            file_location="test.csv",
+            update_mode="set",
+            bulk_snapshot=True,
+        )
+        operator_bulk.read_stock_batches = mock.Mock(
+            return_value=[{"SKU1": 50, "SKU2": 150}]
+        )
+        operator_bulk.get_product_variants = mock.Mock(
+            return_value=PRODUCT_VARIANTS_RESULT
+        )
+
+        operator_bulk.execute({})
+
+        # The stale snapshot is only used for the first attempt
+        operator_bulk.get_product_variants.assert_called_once_with(
+            mock_client, ["SKU1", "SKU2"], location_id="test_location"
+        )
+        self.assertEqual(
+            [
+                call.kwargs["variables"]["input"]["quantities"]
+                for call in mock_client.execute.call_args_list
+            ],
+            [
+                [
+                    {
+                        "inventoryItemId": item_id,
+                        "locationId": "test_location",
+                        "quantity": 50,
+                        "compareQuantity": 30,
+                    }
+                ]
+                for item_id in ("gid://shopify/InventoryItem/1", "inventory_item_id1")
+            ],
+        )
+
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
+    def test_execute_delta_sync(self, mock_shopify_hook):
+        mock_client = mock.Mock()
+        mock_shopify_hook.return_value.get_session_client.return_value = mock_client
+        mock_client.execute.return_value = json.dumps({"data": {}, "extensions": {}})
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            operator_delta = ShopifyUpdateStockCsvOperator(
+                task_id="test_task",
+                conn_id="test_conn",
+                location_id="test_location",
+                file_location="test.csv",
+                delta_snapshot_location=os.path.join(tmp_dir, "feed_snapshot.db"),
+            )
+            operator_delta.get_product_variants = mock.Mock(
+                side_effect=filter_product_variants_result
+            )
+
+            # First run is a full reconcile of all SKUs
+            operator_delta.read_stock_batches = mock.Mock(
+                return_value=[{"SKU1": 50, "SKU2": 150}]
+            )
+            operator_delta.execute({})
+            operator_delta.get_product_variants.assert_called_once_with(
+                mock_client, ["SKU1", "SKU2"], location_id="test_location"
+            )
+
+            # Second run only syncs SKUs changed in the file
+            operator_delta.get_product_variants.reset_mock()
+            operator_delta.read_stock_batches = mock.Mock(
+                return_value=[{"SKU1": 50, "SKU2": 140}, {"SKU3": 1}]
+            )
+            operator_delta.execute({})
+            operator_delta.get_product_variants.assert_called_once_with(
+                mock_client, ["SKU2", "SKU3"], location_id="test_location"
+            )
+
+            # Forced full reconcile syncs all SKUs again
+            operator_delta.get_product_variants.reset_mock()
+            operator_delta.force_full_reconcile = True
+            operator_delta.read_stock_batches = mock.Mock(
+                return_value=[{"SKU1": 50, "SKU2": 140}]
+            )
+            operator_delta.execute({})
+            operator_delta.get_product_variants.assert_called_once_with(
+                mock_client, ["SKU1", "SKU2"], location_id="test_location"
+            )
+
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
+    def test_execute_resumes_from_checkpoint(self, mock_shopify_hook):
+        mock_client = mock.Mock()
+        mock_shopify_hook.return_value.get_session_client.return_value = mock_client
+        mock_client.execute.return_value = json.dumps(
+            {
+                "data": {"inventoryAdjustQuantities": {"userErrors": []}},
+                "extensions": {},
+            }
+        )
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_location = os.path.join(tmp_dir, "stock.csv")
+            with open(file_location, "w") as csv_file:
+                csv_file.write("SKU1,50\nSKU2,140\nSKU3,1\n")
+            operator_checkpoint = ShopifyUpdateStockCsvOperator(
+                task_id="test_task",
+                conn_id="test_conn",
+                location_id="test_location",
+                file_location=file_location,
+                sku_per_request=1,
+                checkpoint_location=os.path.join(tmp_dir, "checkpoint.db"),
+            )
+            operator_checkpoint.get_product_variants = mock.Mock(
+                side_effect=[
+                    filter_product_variants_result(None, ["SKU1"]),
+                    Exception("Connection reset"),
+                ]
+            )
+
+            # First attempt fails in the second batch
+            with self.assertRaises(Exception):
+                operator_checkpoint.execute({})
+            self.assertEqual(mock_client.execute.call_count, 1)
+
+            # Retry resumes with the failed batch
+            operator_checkpoint.get_product_variants = mock.Mock(
+                side_effect=filter_product_variants_result
+            )
+            summary = operator_checkpoint.execute({})
+            self.assertEqual(
+                operator_checkpoint.get_product_variants.call_args_list,
+                [
+                    mock.call(mock_client, ["SKU2"], location_id="test_location"),
+                    mock.call(mock_client, ["SKU3"], location_id="test_location"),
+                ],
+            )
+            self.assertEqual(summary["batches_resumed"], 1)
+
+            # The checkpoint is cleared after a completed sync
+            operator_checkpoint.get_product_variants.reset_mock()
+            operator_checkpoint.execute({})
+            self.assertEqual(operator_checkpoint.get_product_variants.call_count, 3)
+
+    def test_sync_stock_adaptive_batch_size(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_location = os.path.join(tmp_dir, "stock.csv")
+            inventory = generate_feed(file_location, 300, 0.5)
+            server = FakeShopifyServer(inventory, location_id=LOCATION_ID).start()
+            try:
+                client = ShopifyGraphQLClient("127.0.0.1", "2025-01", "token")
+                client.endpoint = server.url
+                operator_adaptive = ShopifyUpdateStockCsvOperator(
+                    task_id="test_task",
+                    conn_id="test_conn",
+                    location_id=LOCATION_ID,
+                    file_location=file_location,
+                    sku_per_request=20,
+                    adaptive_batch_size=True,
+                    max_sku_per_request=60,
+                )
+                summary = operator_adaptive.sync_stock(client)
+            finally:
+                server.stop()
+
+        self.assertEqual(summary["skus"], 300)
+        self.assertEqual(summary["batch_size_min"], 20)
+        self.assertEqual(summary["batch_size_max"], 60)
+        self.assertLess(summary["batches"], 15)
+        self.assertEqual(server.calls["ProductVariantsBySku"], summary["batches"])
+
+    def test_sync_stock_coalesce_mutations(self):
+        results = {}
+        for coalesce_mutations in (False, True):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                file_location = os.path.join(tmp_dir, "stock.csv")
+                inventory = generate_feed(file_location, 1000, 0.05)
+                server = FakeShopifyServer(inventory, location_id=LOCATION_ID).start()
+                try:
+                    client = ShopifyGraphQLClient("127.0.0.1", "2025-01", "token")
+                    client.endpoint = server.url
+                    operator_coalesce = ShopifyUpdateStockCsvOperator(
+                        task_id="test_task",
+                        conn_id="test_conn",
+                        location_id=LOCATION_ID,
+                        file_location=file_location,
+                        sku_per_request=50,
+                        max_workers=2,
+                        max_changes_per_mutation=30,
+                        coalesce_mutations=coalesce_mutations,
+                        checkpoint_location=os.path.join(tmp_dir, "checkpoint.db"),
+                    )
+                    summary = operator_coalesce.sync_stock(client)
+                finally:
+                    server.stop()
+                with open(file_location) as csv_file:
+                    expected = {
+                        sku: int(stock)
+                        for sku, stock in (line.strip().split(",") for line in csv_file)
+                    }
+                self.assertEqual(server.quantities, expected)
+                results[coalesce_mutations] = (summary, server.calls["InventoryAdjust"])
+
+        summary, mutation_calls = results[True]
+        self.assertEqual(summary["batches"], 20)
+        self.assertEqual(summary["skus_changed"], results[False][0]["skus_changed"])
+        self.assertEqual(summary["mutations"], mutation_calls)
+        self.assertEqual(mutation_calls, math.ceil(summary["skus_changed"] / 30))
+        # Without coalescing every batch with changes sends its own mutation
+        self.assertLess(mutation_calls, results[False][1])
+
+    def test_sync_stock_inventory_level_store(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_location = os.path.join(tmp_dir, "stock.csv")
+            webhook_location = os.path.join(tmp_dir, "webhooks")
+            os.mkdir(webhook_location)
+            inventory = generate_feed(file_location, 100, 0.5)
+            server = FakeShopifyServer(inventory, location_id=LOCATION_ID).start()
+            try:
+                client = ShopifyGraphQLClient("127.0.0.1", "2025-01", "token")
+                client.endpoint = server.url
+
+                def sync():
+                    server.reset_stats()
+                    return ShopifyUpdateStockCsvOperator(
+                        task_id="test_task",
+                        conn_id="test_conn",
+                        location_id=LOCATION_ID,
+                        file_location=file_location,
+                        sku_per_request=25,
+                        inventory_level_store_location=os.path.join(
+                            tmp_dir, "inventory_levels.db"
+                        ),
+                        inventory_webhook_location=webhook_location,
+                    ).sync_stock(client)
+
+                summary = sync()
+                self.assertEqual(summary["skus_cached"], 0)
+                self.assertEqual(server.calls["ProductVariantsBySku"], 4)
+
+                # An order sells one unit of the first SKU, reported by a webhook
+                server.quantities["SKU0000000"] -= 1
+                with open(os.path.join(webhook_location, "0001.json"), "w") as file:
+                    json.dump(
+                        {
+                            "inventory_item_id": 1,
+                            "location_id": 1,
+                            "available": server.quantities["SKU0000000"],
+                            "updated_at": "2099-01-01T00:00:00+00:00",
+                        },
+                        file,
+                    )
+
+                summary = sync()
+            finally:
+                server.stop()
+
+            # Stock is computed from the stored levels without reading it again
+            self.assertEqual(summary["skus_cached"], 100)
+            self.assertEqual(summary["skus_changed"], 1)
+            self.assertEqual(server.calls["ProductVariantsBySku"], 0)
+            self.assertEqual(os.listdir(webhook_location), [])
+            with open(file_location) as csv_file:
+                expected = {
+                    sku: int(stock)
+                    for sku, stock in (line.strip().split(",") for line in csv_file)
+                }
+            self.assertEqual(server.quantities, expected)
+
+    def test_sync_stock_dry_run_report(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_location = os.path.join(tmp_dir, "stock.csv")
+            report_location = os.path.join(tmp_dir, "diff.csv")
+            inventory = generate_feed(file_location, 300, 0.5)
+            server = FakeShopifyServer(inventory, location_id=LOCATION_ID).start()
+            try:
+                client = ShopifyGraphQLClient("127.0.0.1", "2025-01", "token")
+                client.endpoint = server.url
+                operator_report = ShopifyUpdateStockCsvOperator(
+                    task_id="test_task",
+                    conn_id="test_conn",
+                    location_id=LOCATION_ID,
+                    file_location=file_location,
+                    sku_per_request=50,
+                    max_workers=2,
+                    update_mode="set",
+                    compare_quantity=False,
+                    dry_run=True,
+                    dry_run_report_location=report_location,
+                )
+                operator_report.log_batch_result = mock.Mock()
+                summary = operator_report.sync_stock(client)
+            finally:
+                server.stop()
+
+            self.assertEqual(server.calls["InventorySet"], 0)
+            self.assertEqual(server.quantities, inventory)
+            with open(file_location) as csv_file:
+                desired = {
+                    sku: int(stock)
+                    for sku, stock in (line.strip().split(",") for line in csv_file)
+                }
+            with open(report_location) as report_file:
+                rows = list(csv.DictReader(report_file))
+            # Rows are written in file order, without rendering mutations
+            self.assertEqual(
+                [row["sku"] for row in rows],
+                [sku for sku in desired if desired[sku] != inventory[sku]],
+            )
+            for row in rows:
+                self.assertEqual(int(row["current"]), inventory[row["sku"]])
+                self.assertEqual(int(row["desired"]), desired[row["sku"]])
+                self.assertEqual(
+                    int(row["delta"]), desired[row["sku"]] - inventory[row["sku"]]
+                )
+            self.assertEqual(summary["diff_rows"], summary["skus_changed"])
+            self.assertEqual(
+                summary["diff_net_delta"],
+                sum(desired.values()) - sum(inventory.values()),
+            )
+            for call in operator_report.log_batch_result.call_args_list:
+                self.assertEqual(call.args[0]["mutations"], [])
+
+        with self.assertRaises(AirflowException):
+            ShopifyUpdateStockCsvOperator(
+                task_id="test_task",
+                conn_id="test_conn",
+                location_id=LOCATION_ID,
+                file_location=file_location,
+                dry_run_report_location=report_location,
+            )
+
+    def test_coalesce_mutations_requires_adjust_mode(self):
+        with self.assertRaises(AirflowException):
+            ShopifyUpdateStockCsvOperator(
+                task_id="test_task",
+                conn_id="test_conn",
+                location_id="test_location",
+                file_location="test.csv",
+                update_mode="set",
+                coalesce_mutations=True,
+            )
+
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
+    def test_execute_connection_pool_size(self, mock_shopify_hook):
+        self.operator.max_workers = 2
+        self.operator.sync_stock = mock.Mock(return_value={})
+
+        # Coalesced mutations are sent alongside the workers' reads
+        for coalesce_mutations, pool_size in ((False, 2), (True, 3)):
+            with self.subTest(coalesce_mutations=coalesce_mutations):
+                self.operator.coalesce_mutations = coalesce_mutations
+                self.operator.execute({})
+                mock_shopify_hook.assert_called_with(
+                    conn_id="test_conn", pool_size=pool_size
+                )
+
+    def test_process_batch_adaptive_splits_failed_lookups(self):
+        def get_product_variants(client, skus, location_id=None):
+            if len(skus) > 1:
+                raise AirflowException("Query cost is too high")
+            return filter_product_variants_result(client, skus)
+
+        self.operator.adaptive_batch_size = True
+        self.operator.min_sku_per_request = 1
+        self.operator.dry_run = True
+        self.operator.batch_size = AdaptiveBatchSize(initial=2, minimum=1)
+        self.operator.get_product_variants = mock.Mock(side_effect=get_product_variants)
+
+        stock_batch = {"SKU1": 50, "SKU2": 150}
+        batch_result = self.operator.process_batch(mock.Mock(), stock_batch)
+
+        self.assertEqual(batch_result["stock_batch"], stock_batch)
+        self.assertEqual(batch_result["skus"], 2)
+        self.assertEqual(batch_result["changed"], 1)
+        self.assertEqual(batch_result["unchanged"], 1)
+        self.assertEqual(len(batch_result["mutations"]), 1)
+        self.assertEqual(self.operator.batch_size.size, 1)
+
+        # Batches at the minimum size are not split
+        self.operator.get_product_variants.side_effect = AirflowException("Error")
+        with self.assertRaises(AirflowException):
+            self.operator.process_batch(mock.Mock(), {"SKU1": 1})
+
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
+    def test_execute_set_mode_retries_conflicts(self, mock_shopify_hook):
+        mock_client = mock.Mock()
+        mock_shopify_hook.return_value.get_session_client.return_value = mock_client
+
+        operator_set = ShopifyUpdateStockCsvOperator(
+            task_id="test_task",
+            conn_id="test_conn",
+            location_id="test_location",
+            file_location="test.csv",
+            update_mode="set",
+        )
+        operator_set.read_stock_batches = mock.Mock(
+            return_value=[{"SKU1": 50, "SKU2": 150}]
+        )
+        operator_set.get_product_variants = mock.Mock(
+            return_value=PRODUCT_VARIANTS_RESULT
+        )
+
+        stale_response = {
+            "data": {
+                "inventorySetQuantities": {
+                    "userErrors": [
+                        {
+                            "code": "COMPARE_QUANTITY_STALE",
+                            "field": ["input", "quantities", "0", "compareQuantity"],
+                            "message": "The compareQuantity value does not match",
+                        }
+                    ]
+                }
+            }
+        }
+        success_response = {
+            "data": {"inventorySetQuantities": {"userErrors": []}},
+            "extensions": {},
+        }
+        mock_client.execute.side_effect = [
+            json.dumps(stale_response),
+            json.dumps(success_response),
+        ]
+
+        operator_set.execute({})
+
+        # Stock is read again before retrying the mutation
+        self.assertEqual(operator_set.get_product_variants.call_count, 2)
+        self.assertEqual(mock_client.execute.call_count, 2)
+        self.assertEqual(mock_client.execute.call_args.args[0], INVENTORY_SET)
+        self.assertEqual(
+            mock_client.execute.call_args.kwargs["variables"]["input"],
+            {
+                "reason": "correction",
+                "name": "available",
+                "ignoreCompareQuantity": False,
+                "quantities": [
+                    {
+                        "inventoryItemId": "inventory_item_id1",
+                        "locationId": "test_location",
+                        "quantity": 50,
+                        "compareQuantity": 30,
+                    }
+                ],
+            },
+        )
+
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
+    def test_execute_set_mode_conflict_retries_exhausted(self, mock_shopify_hook):
+        mock_client = mock.Mock()
+        mock_shopify_hook.return_value.get_session_client.return_value = mock_client
+
+        operator_set = ShopifyUpdateStockCsvOperator(
+            task_id="test_task",
+            conn_id="test_conn",
+            location_id="test_location",
+            file_location="test.csv",
+            update_mode="set",
+            max_conflict_retries=1,
+        )
+        operator_set.read_stock_batches = mock.Mock(return_value=[{"SKU1": 50}])
+        operator_set.get_product_variants = mock.Mock(
+            side_effect=filter_product_variants_result
+        )
+        mock_client.execute.return_value = json.dumps(
+            {
+                "data": {
+                    "inventorySetQuantities": {
+                        "userErrors": [{"code": "COMPARE_QUANTITY_STALE"}]
+                    }
+                }
+            }
+        )
+
+        with self.assertRaises(AirflowException) as context_manager:
+            operator_set.execute({})
+
+        self.assertIn("COMPARE_QUANTITY_STALE", str(context_manager.exception))
+        self.assertEqual(mock_client.execute.call_count, 2)
+
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
+    def test_execute_set_mode_without_reads(self, mock_shopify_hook):
+        mock_client = mock.Mock()
+        mock_shopify_hook.return_value.get_session_client.return_value = mock_client
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store_location = os.path.join(tmp_dir, "inventory_levels.db")
+            # Levels stored long ago are no longer fresh, but known to exist
+            inventory_levels = InventoryLevelStore(store_location, clock=lambda: 0)
+            inventory_levels.put_many(
+                "test_location",
+                [
+                    ("SKU1", "inventory_item_id1", 30),
+                    ("SKU2", "inventory_item_id2", 140),
+                ],
+            )
+            inventory_levels.close()
+            operator_set = ShopifyUpdateStockCsvOperator(
+                task_id="test_task",
+                conn_id="test_conn",
+                location_id="test_location",
+                file_location="test.csv",
+                inventory_level_store_location=store_location,
+                update_mode="set",
+                compare_quantity=False,
+                dry_run=True,
+            )
+            operator_set.read_stock_batches = mock.Mock(
+                return_value=[{"SKU1": 50, "SKU2": 150, "SKU3": 5}]
+            )
+            operator_set.get_product_variants = mock.Mock(
+                side_effect=filter_product_variants_result
+            )
+            operator_set.log_batch_result = mock.Mock()
+
+            operator_set.execute({})
+
+        # Stored levels are set without reading them, other SKUs are still looked up
+        operator_set.get_product_variants.assert_called_once_with(
+            mock_client, ["SKU3"], location_id="test_location"
+        )
+        mock_client.execute.assert_not_called()
+        variables = operator_set.log_batch_result.call_args[0][0]["mutations"][0]
+        self.assertTrue(variables["input"]["ignoreCompareQuantity"])
+        self.assertEqual(
+            variables["input"]["quantities"],
+            [
+                {
+                    "inventoryItemId": f"inventory_item_id{number}",
+                    "locationId": "test_location",
+                    "quantity": quantity,
+                }
+                for number, quantity in ((1, 50), (2, 150))
+            ],
+        )
+
+    @mock.patch("plugins.operators.shopify_update_stock_csv_operator.ShopifyHook")
+    def test_execute_set_mode_without_reads_multiple_locations(self, mock_shopify_hook):
+        mock_client = mock.Mock()
+        mock_shopify_hook.return_value.get_session_client.return_value = mock_client
+        mock_client.execute.return_value = json.dumps(
+            {
+                "data": {
+                    "nodes": [
+                        {
+                            "id": "inventory_item_id1",
+                            "sku": "SKU1",
+                            "inventoryLevel": {"quantities": [{"quantity": 5}]},
+                        },
+                        {
+                            "id": "inventory_item_id2",
+                            "sku": "SKU2",
+                            "inventoryLevel": None,
+                        },
+                    ]
+                }
+            }
+        )
+        operator_set = ShopifyUpdateStockCsvOperator(
+            task_id="test_task",
+            conn_id="test_conn",
+            location_id={"store": "location1", "warehouse": "location2"},
+            file_location="test.csv",
+            update_mode="set",
+            compare_quantity=False,
+            dry_run=True,
+        )
+        operator_set.read_stock_batches = mock.Mock(
+            return_value=[
+                {
+                    ("SKU1", "location1"): 50,
+                    ("SKU2", "location1"): 150,
+                    ("SKU1", "location2"): 10,
+                    ("SKU2", "location2"): 7,
+                }
+            ]
+        )
+        operator_set.get_product_variants = mock.Mock(
+            side_effect=filter_product_variants_result
+        )
+        operator_set.log_batch_result = mock.Mock()
+
+        operator_set.execute({})
+
+        # Levels at the second location are read, SKU2 is not stocked there
+        self.assertEqual(
+            mock_client.execute.call_args.kwargs["variables"],
+            {
+                "ids": ["inventory_item_id1", "inventory_item_id2"],
+                "locationId": "location2",
+            },
+        )
+        variables = operator_set.log_batch_result.call_args[0][0]["mutations"][0]
+        self.assertEqual(
+            variables["input"]["quantities"],
+            [
+                {
+                    "inventoryItemId": "inventory_item_id1",
+                    "locationId": location_id,
+                    "quantity": quantity,
+                }
+                for location_id, quantity in (("location1", 50), ("location2", 10))
+            ],
+        )
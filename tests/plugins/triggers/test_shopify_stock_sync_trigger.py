@@ -0,0 +1,112 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from airflow import configuration
+
+from benchmarks.fake_shopify_server import FakeShopifyServer
+from benchmarks.run_benchmarks import LOCATION_ID, generate_feed
+from plugins.hooks.shopify_hook import ShopifyAsyncGraphQLClient
+from plugins.triggers.shopify_stock_sync_trigger import ShopifyStockSyncTrigger
+
+
+async def collect_events(trigger):
+    return [event async for event in trigger.run()]
+
+
+class TestShopifyStockSyncTrigger(unittest.TestCase):
+
+    def setUp(self):
+        configuration.conf.load_test_config()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_location = os.path.join(self.tmp_dir.name, "stock.csv")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_trigger(self, server, **trigger_kwargs):
+        trigger = ShopifyStockSyncTrigger(
+            conn_id="shopify_default",
+            location_id=LOCATION_ID,
+            file_location=self.file_location,
+            task_id="sync",
+            sku_per_request=50,
+            **trigger_kwargs,
+        )
+        client = ShopifyAsyncGraphQLClient("127.0.0.1", "2025-01", "token")
+        client.endpoint = server.url
+        with mock.patch(
+            "plugins.triggers.shopify_stock_sync_trigger.ShopifyHook"
+        ) as mock_shopify_hook:
+            mock_shopify_hook.return_value.get_async_client.return_value = client
+            return asyncio.run(collect_events(trigger))
+
+    def test_serialize(self):
+        trigger = ShopifyStockSyncTrigger(
+            conn_id="shopify_default",
+            location_id=LOCATION_ID,
+            file_location="stock.csv",
+            max_workers=4,
+        )
+        classpath, kwargs = trigger.serialize()
+
+        self.assertTrue(
+            classpath.endswith("shopify_stock_sync_trigger.ShopifyStockSyncTrigger")
+        )
+        self.assertEqual(kwargs["max_workers"], 4)
+        self.assertEqual(ShopifyStockSyncTrigger(**kwargs).serialize()[1], kwargs)
+
+    def test_run_syncs_stock(self):
+        for update_mode, max_workers in (("adjust", 1), ("set", 4)):
+            with self.subTest(update_mode=update_mode, max_workers=max_workers):
+                inventory = generate_feed(self.file_location, 500, 0.5)
+                with open(self.file_location) as csv_file:
+                    expected = {
+                        sku: int(stock)
+                        for sku, stock in (line.strip().split(",") for line in csv_file)
+                    }
+                changed = sum(
+                    inventory[sku] != stock for sku, stock in expected.items()
+                )
+                server = FakeShopifyServer(inventory, location_id=LOCATION_ID).start()
+                try:
+                    events = self.run_trigger(
+                        server, update_mode=update_mode, max_workers=max_workers
+                    )
+                finally:
+                    server.stop()
+
+                self.assertEqual(len(events), 1)
+                self.assertEqual(events[0].payload["status"], "success")
+                summary = events[0].payload["summary"]
+                self.assertEqual(summary["batches"], 10)
+                self.assertEqual(summary["skus_changed"], changed)
+                self.assertEqual(server.quantities, expected)
+
+    def test_run_dry_run(self):
+        inventory = generate_feed(self.file_location, 100, 1.0)
+        server = FakeShopifyServer(dict(inventory), location_id=LOCATION_ID).start()
+        try:
+            events = self.run_trigger(server, dry_run=True)
+        finally:
+            server.stop()
+
+        self.assertEqual(events[0].payload["summary"]["skus_changed"], 100)
+        self.assertEqual(events[0].payload["summary"]["mutations"], 0)
+        self.assertEqual(server.quantities, inventory)
+
+    def test_run_error_event(self):
+        server = FakeShopifyServer({}, location_id=LOCATION_ID).start()
+        try:
+            events = self.run_trigger(server)
+        finally:
+            server.stop()
+
+        self.assertEqual(events[0].payload["status"], "error")
+        self.assertIn("Error trying to read file", events[0].payload["message"])
+
+
+if __name__ == "__main__":
+    unittest.main()
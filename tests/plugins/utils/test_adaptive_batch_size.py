@@ -0,0 +1,78 @@
+import unittest
+
+from plugins.utils.adaptive_batch_size import AdaptiveBatchSize
+
+
+def stock_rows(count, prefix="SKU"):
+    return [(f"{prefix}{index}", index) for index in range(count)]
+
+
+class TestAdaptiveBatchSize(unittest.TestCase):
+
+    def test_additive_increase_multiplicative_decrease(self):
+        batch_size = AdaptiveBatchSize(initial=100, minimum=10, maximum=150)
+
+        batch_size.record(100, 0.5)
+        self.assertEqual(batch_size.size, 110)
+        for _ in range(10):
+            batch_size.record(batch_size.size, 0.5)
+        self.assertEqual(batch_size.size, 150)
+
+        # Slow, throttled and failed lookups halve the size, down to the minimum
+        batch_size.record(150, 3.0)
+        self.assertEqual(batch_size.size, 75)
+        batch_size.record(75, 0.5, throttled=True)
+        self.assertEqual(batch_size.size, 37)
+        batch_size.record_error()
+        batch_size.record_error()
+        self.assertEqual(batch_size.size, 10)
+
+        self.assertEqual(
+            batch_size.summary(),
+            {
+                "batch_size_min": 10,
+                "batch_size_max": 150,
+                "batch_size_last": 10,
+                "batch_size_changes": 9,
+            },
+        )
+
+    def test_requested_cost_caps_size(self):
+        batch_size = AdaptiveBatchSize(initial=100, maximum=250)
+
+        # 2 points per sku with a bucket of 200, at most half of it per lookup
+        batch_size.record(100, 0.5, requested_cost=200, maximum_available=200)
+        self.assertEqual(batch_size.size, 50)
+
+    def test_batches_follow_current_size(self):
+        batch_size = AdaptiveBatchSize(initial=2, minimum=1, increase=1)
+        batches = batch_size.batches(stock_rows(10))
+
+        self.assertEqual(next(batches), {"SKU0": 0, "SKU1": 1})
+        batch_size.record(2, 0.1)
+        self.assertEqual(next(batches), {"SKU2": 2, "SKU3": 3, "SKU4": 4})
+        batch_size.record_error()
+        self.assertEqual(
+            list(batches),
+            [{"SKU5": 5}, {"SKU6": 6}, {"SKU7": 7}]
+            + [
+                {"SKU8": 8},
+                {"SKU9": 9},
+            ],
+        )
+
+    def test_batches_limit_search_query_length(self):
+        # sku:"SKU0" OR is 15 characters
+        batch_size = AdaptiveBatchSize(initial=100, max_search_length=45)
+
+        batches = list(batch_size.batches(stock_rows(7)))
+
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 1])
+
+    def test_invalid_bounds(self):
+        with self.assertRaises(ValueError):
+            AdaptiveBatchSize(minimum=100, maximum=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
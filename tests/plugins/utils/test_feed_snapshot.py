@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+
+from plugins.utils.feed_snapshot import FeedSnapshot
+
+
+class TestFeedSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "feed_snapshot.db")
+        self.now = 1000.0
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def clock(self):
+        return self.now
+
+    def test_changed(self):
+        snapshot = FeedSnapshot(self.path, "location:stock.csv")
+        snapshot.commit({"SKU1": 10, "SKU2": 20})
+        snapshot.close()
+
+        snapshot = FeedSnapshot(self.path, "location:stock.csv")
+        self.assertEqual(
+            snapshot.changed({"SKU1": 10, "SKU2": 25, "SKU3": 30}),
+            {"SKU2": 25, "SKU3": 30},
+        )
+        snapshot.close()
+
+    def test_snapshots_are_keyed(self):
+        snapshot = FeedSnapshot(self.path, "location1:stock.csv")
+        snapshot.commit({"SKU1": 10})
+        other_snapshot = FeedSnapshot(self.path, "location2:stock.csv")
+
+        self.assertEqual(other_snapshot.changed({"SKU1": 10}), {"SKU1": 10})
+        snapshot.close()
+        other_snapshot.close()
+
+    def test_location_keys(self):
+        snapshot = FeedSnapshot(self.path, "stock.csv")
+        snapshot.commit({("SKU1", "location1"): 10})
+
+        self.assertEqual(
+            snapshot.changed({("SKU1", "location1"): 10, ("SKU1", "location2"): 10}),
+            {("SKU1", "location2"): 10},
+        )
+        snapshot.close()
+
+    def test_reconcile_due(self):
+        snapshot = FeedSnapshot(self.path, "location:stock.csv", clock=self.clock)
+        self.assertTrue(snapshot.is_reconcile_due(100))
+
+        snapshot.mark_reconciled()
+        self.now += 50
+        self.assertFalse(snapshot.is_reconcile_due(100))
+        self.assertFalse(snapshot.is_reconcile_due(None))
+        self.now += 50
+        self.assertTrue(snapshot.is_reconcile_due(100))
+        snapshot.close()
@@ -0,0 +1,74 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import tempfile
+import unittest
+
+from plugins.utils.feed_source import feed_compression, feed_name, open_feed
+
+FEED = "SKU1,10\nSKU2,20\n"
+
+
+class TestFeedSource(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def write_feed(self, name, compress=lambda data: data):
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, "wb") as file:
+            file.write(compress(FEED.encode("utf-8")))
+        return path
+
+    def test_feed_compression(self):
+        self.assertEqual(feed_compression("stock.csv.gz"), "gzip")
+        self.assertEqual(feed_compression("s3://bucket/stock.CSV.ZST"), "zstd")
+        self.assertEqual(feed_compression("file:///tmp/stock.csv.xz"), "xz")
+        self.assertIsNone(feed_compression("stock.csv"))
+        self.assertIsNone(feed_compression(io.BytesIO()))
+
+    def test_feed_name(self):
+        self.assertEqual(feed_name("stock.csv"), "stock.csv")
+        self.assertEqual(feed_name(io.BytesIO()), "BytesIO")
+
+    def test_open_feed_compressed_files(self):
+        for name, compress in (
+            ("stock.csv", lambda data: data),
+            ("stock.csv.gz", gzip.compress),
+            ("stock.csv.bz2", bz2.compress),
+            ("stock.csv.xz", lzma.compress),
+        ):
+            with self.subTest(name=name):
+                path = self.write_feed(name, compress)
+                with open_feed(path) as feed:
+                    self.assertEqual(feed.read(), FEED)
+                with open_feed(f"file://{path}", text=False) as feed:
+                    self.assertEqual(feed.read(), FEED.encode("utf-8"))
+                with open_feed(path, decompress=False, text=False) as feed:
+                    self.assertEqual(feed.read(), compress(FEED.encode("utf-8")))
+
+    def test_open_feed_file_objects(self):
+        with open_feed(io.StringIO(FEED)) as feed:
+            self.assertEqual(feed.read(), FEED)
+
+        # Compression of file objects without a name is detected from their content
+        file_object = io.BytesIO(gzip.compress(FEED.encode("utf-8")))
+        with open_feed(file_object) as feed:
+            self.assertEqual(feed.read(), FEED)
+        self.assertFalse(file_object.closed)
+
+        with open(self.write_feed("stock.csv.bz2", bz2.compress), "rb") as file_object:
+            with open_feed(file_object) as feed:
+                self.assertEqual(feed.read(), FEED)
+            self.assertFalse(file_object.closed)
+
+    def test_open_feed_unsupported(self):
+        with self.assertRaises(ValueError):
+            with open_feed(42):
+                pass
+
+
+if __name__ == "__main__":
+    unittest.main()
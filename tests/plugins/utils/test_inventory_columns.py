@@ -0,0 +1,63 @@
+import unittest
+from unittest import mock
+
+from plugins.utils import inventory_columns
+from plugins.utils.inventory_columns import InventoryColumns
+from plugins.utils.optional_imports import optional_module
+
+numpy = optional_module("numpy")
+
+DESIRED_STOCK = {"SKU1": 50, "SKU2": 150, "SKU3": 0, "SKU4": 1}
+EXPECTED_CHANGES = (
+    [("gid://shopify/InventoryItem/1", 50, 30), ("custom-id", 0, 5)],
+    3,
+)
+
+
+class TestInventoryColumns(unittest.TestCase):
+
+    def setUp(self):
+        self.columns = InventoryColumns()
+        self.columns.add("SKU1", "gid://shopify/InventoryItem/1", 30)
+        self.columns.add("SKU2", "gid://shopify/InventoryItem/2", 150)
+        self.columns.add("SKU3", "custom-id", 5)
+
+    def test_get(self):
+        self.assertEqual(len(self.columns), 3)
+        self.assertEqual(
+            self.columns.get("SKU1"), ("gid://shopify/InventoryItem/1", 30)
+        )
+        self.assertEqual(self.columns.get("SKU3"), ("custom-id", 5))
+        self.assertIsNone(self.columns.get("SKU4"))
+        self.assertNotIn("SKU4", self.columns)
+
+    def test_add_replaces(self):
+        self.columns.add("SKU3", "gid://shopify/InventoryItem/3", 7)
+        self.assertEqual(len(self.columns), 3)
+        self.assertEqual(self.columns.get("SKU3"), ("gid://shopify/InventoryItem/3", 7))
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_changes_vectorized(self):
+        self.assertEqual(self.columns.changes(DESIRED_STOCK), EXPECTED_CHANGES)
+
+    def test_changes_without_numpy(self):
+        with mock.patch.object(inventory_columns, "optional_module", return_value=None):
+            self.assertEqual(self.columns.changes(DESIRED_STOCK), EXPECTED_CHANGES)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_changes_skus_vectorized(self):
+        desired_stock = {"SKU4": 1, "SKU3": 0, "SKU2": 150, "SKU1": 50}
+        changed_skus = []
+        changes, _ = self.columns.changes(desired_stock, changed_skus)
+        self.assertEqual(changed_skus, ["SKU3", "SKU1"])
+        self.assertEqual(
+            [change[0] for change in changes],
+            ["custom-id", "gid://shopify/InventoryItem/1"],
+        )
+
+    def test_changes_skus_without_numpy(self):
+        desired_stock = {"SKU4": 1, "SKU3": 0, "SKU2": 150, "SKU1": 50}
+        changed_skus = []
+        with mock.patch.object(inventory_columns, "optional_module", return_value=None):
+            self.columns.changes(desired_stock, changed_skus)
+        self.assertEqual(changed_skus, ["SKU3", "SKU1"])
@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from plugins.utils.inventory_level_store import InventoryLevelStore
+
+WEBHOOKS_LOCATION = os.path.join(
+    os.path.dirname(__file__), "test_data", "inventory_level_webhooks"
+)
+LOCATION_ID = "gid://shopify/Location/1"
+
+
+def item_id(number):
+    return f"gid://shopify/InventoryItem/{number}"
+
+
+class TestInventoryLevelStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "inventory_levels.db")
+        # Before all recorded webhooks, except an out of order one
+        self.now = datetime.fromisoformat("2026-10-01T09:00:00-04:00").timestamp()
+        self.store = InventoryLevelStore(self.path, ttl_seconds=3600, clock=self.clock)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def clock(self):
+        return self.now
+
+    def test_replay_recorded_webhooks(self):
+        self.store.put_many(
+            LOCATION_ID,
+            [
+                ("SKU1", item_id(101), 1),
+                ("SKU2", item_id(102), 2),
+                ("SKU3", item_id(103), 3),
+            ],
+        )
+        queue_location = os.path.join(self.tmp_dir.name, "queue")
+        shutil.copytree(WEBHOOKS_LOCATION, queue_location)
+
+        # The out of order webhook of item 101 is ignored
+        self.assertEqual(self.store.ingest_webhook_files(queue_location), 4)
+        self.assertEqual(os.listdir(queue_location), [])
+
+        # Item 103 is no longer tracked, item 104 has no known SKU yet
+        self.assertEqual(
+            self.store.get_many(LOCATION_ID, ["SKU1", "SKU2", "SKU3", "SKU4"]),
+            [("SKU1", item_id(101), 5), ("SKU2", item_id(102), 7)],
+        )
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.store.get_many("gid://shopify/Location/2", ["SKU1"]), [])
+
+        self.store.put_many(LOCATION_ID, [("SKU4", item_id(104), 12)])
+        self.assertEqual(
+            self.store.get_many(LOCATION_ID, ["SKU4"]), [("SKU4", item_id(104), 12)]
+        )
+        self.assertEqual(self.store.hits, 3)
+
+    def test_levels_expire(self):
+        self.store.put_many(LOCATION_ID, [("SKU1", item_id(101), 1)])
+        self.now += 3600
+        self.store.update_quantities([(item_id(101), LOCATION_ID, 4, 1)])
+
+        self.now += 3599
+        self.assertEqual(
+            self.store.get_many(LOCATION_ID, ["SKU1"]), [("SKU1", item_id(101), 4)]
+        )
+        self.now += 2
+        self.assertEqual(self.store.get_many(LOCATION_ID, ["SKU1"]), [])
+        # Expired levels are still known to exist at the location
+        self.assertEqual(
+            self.store.get_item_ids(LOCATION_ID, ["SKU1", "SKU2"]),
+            {"SKU1": item_id(101)},
+        )
+        self.assertEqual(self.store.evict(), 1)
+
+    def test_invalidate(self):
+        self.store.put_many(
+            LOCATION_ID, [("SKU1", item_id(101), 1), ("SKU2", item_id(102), 2)]
+        )
+        self.store.invalidate(LOCATION_ID, ["SKU1"])
+        self.assertEqual(
+            self.store.get_many(LOCATION_ID, ["SKU1", "SKU2"]),
+            [("SKU2", item_id(102), 2)],
+        )
+
+    def test_invalid_webhook(self):
+        with self.assertRaises(ValueError):
+            self.store.apply_webhook({"inventory_item_id": 101, "available": 1})
+
+    def test_reject_invalid_webhook_files(self):
+        self.store.put_many(
+            LOCATION_ID, [("SKU1", item_id(101), 1), ("SKU2", item_id(102), 2)]
+        )
+        queue_location = os.path.join(self.tmp_dir.name, "queue")
+        os.mkdir(queue_location)
+        shutil.copy(os.path.join(WEBHOOKS_LOCATION, "0001.json"), queue_location)
+        shutil.copy(os.path.join(WEBHOOKS_LOCATION, "0002.json"), queue_location)
+        with open(os.path.join(queue_location, "0001b.json"), "w") as file:
+            file.write('{"inventory_item_id": 101')
+        with open(os.path.join(queue_location, "0001c.json"), "w") as file:
+            file.write('{"inventory_item_id": 101, "available": 3}')
+
+        # Invalid payloads between the valid ones are moved aside
+        self.assertEqual(self.store.ingest_webhook_files(queue_location), 2)
+        self.assertEqual(self.store.rejected, 2)
+        self.assertEqual(os.listdir(queue_location), ["rejected"])
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(queue_location, "rejected"))),
+            ["0001b.json", "0001c.json"],
+        )
+        self.assertEqual(
+            self.store.get_many(LOCATION_ID, ["SKU1", "SKU2"]),
+            [("SKU1", item_id(101), 5), ("SKU2", item_id(102), 7)],
+        )
+
+        # Later runs are not blocked by the rejected payloads
+        self.assertEqual(self.store.ingest_webhook_files(queue_location), 0)
+        self.assertEqual(self.store.rejected, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
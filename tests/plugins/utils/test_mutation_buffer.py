@@ -0,0 +1,50 @@
+import unittest
+
+from plugins.utils.mutation_buffer import MutationBuffer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMutationBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.buffer = MutationBuffer(3, max_delay_seconds=10, clock=self.clock)
+
+    def test_take_full_mutations_across_batches(self):
+        batches = [{"batch": index} for index in range(4)]
+        self.buffer.add(batches[0], ["a", "b"])
+        self.buffer.add(batches[1], [])
+        self.assertFalse(self.buffer.is_due())
+        self.buffer.add(batches[2], ["c", "d"])
+        self.assertTrue(self.buffer.is_due())
+
+        self.assertEqual(self.buffer.take(), (["a", "b", "c"], batches[2]))
+        # Batches are released in order once all their changes were taken
+        self.assertEqual(self.buffer.completed(), [batches[0], batches[1]])
+        self.assertFalse(self.buffer.is_due())
+
+        self.buffer.add(batches[3], [])
+        self.assertEqual(self.buffer.completed(), [])
+        self.assertEqual(self.buffer.take(), (["d"], batches[2]))
+        self.assertEqual(self.buffer.completed(), [batches[2], batches[3]])
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_due_after_max_delay(self):
+        self.buffer.add({"batch": 0}, [])
+        self.clock.now = 5
+        self.buffer.add({"batch": 1}, ["a"])
+        self.clock.now = 14
+        self.assertFalse(self.buffer.is_due())
+        self.clock.now = 15
+        self.assertTrue(self.buffer.is_due())
+
+
+if __name__ == "__main__":
+    unittest.main()
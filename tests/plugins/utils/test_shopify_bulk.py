@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import unittest
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from airflow.exceptions import AirflowException
+
+from plugins.utils.shopify_bulk import iter_bulk_result, run_bulk_query
+from plugins.utils.shopify_throttle import ShopifyCostThrottle
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def bulk_response(status, url=None):
+    return json.dumps(
+        {
+            "data": {
+                "node": {
+                    "id": "gid://shopify/BulkOperation/1",
+                    "status": status,
+                    "errorCode": (
+                        None if status == "COMPLETED" else "INTERNAL_SERVER_ERROR"
+                    ),
+                    "objectCount": "3",
+                    "url": url,
+                }
+            }
+        }
+    )
+
+
+RUN_RESPONSE = json.dumps(
+    {
+        "data": {
+            "bulkOperationRunQuery": {
+                "bulkOperation": {
+                    "id": "gid://shopify/BulkOperation/1",
+                    "status": "CREATED",
+                },
+                "userErrors": [],
+            }
+        }
+    }
+)
+
+
+class TestShopifyBulk(unittest.TestCase):
+
+    def setUp(self):
+        self.throttle = ShopifyCostThrottle()
+        self.sleep = mock.Mock()
+
+    def test_run_bulk_query_polls_until_completed(self):
+        client = mock.Mock()
+        client.execute.side_effect = [
+            RUN_RESPONSE,
+            bulk_response("RUNNING"),
+            bulk_response("COMPLETED", "http://localhost/result.jsonl"),
+        ]
+
+        url = run_bulk_query(
+            client,
+            self.throttle,
+            "{ productVariants { edges { node { sku } } } }",
+            poll_seconds=2,
+            sleep=self.sleep,
+        )
+
+        self.assertEqual(url, "http://localhost/result.jsonl")
+        self.assertEqual(client.execute.call_count, 3)
+        self.assertEqual(
+            client.execute.call_args_list[0].kwargs["variables"],
+            {"query": "{ productVariants { edges { node { sku } } } }"},
+        )
+        self.sleep.assert_called_once_with(2)
+
+    def test_run_bulk_query_failed(self):
+        client = mock.Mock()
+        client.execute.side_effect = [RUN_RESPONSE, bulk_response("FAILED")]
+
+        with self.assertRaises(AirflowException) as context:
+            run_bulk_query(client, self.throttle, "{}", sleep=self.sleep)
+
+        self.assertIn(
+            "finished with status FAILED: INTERNAL_SERVER_ERROR", str(context.exception)
+        )
+
+    def test_run_bulk_query_user_errors(self):
+        client = mock.Mock()
+        client.execute.return_value = json.dumps(
+            {
+                "data": {
+                    "bulkOperationRunQuery": {
+                        "bulkOperation": None,
+                        "userErrors": [{"field": None, "message": "Already running"}],
+                    }
+                }
+            }
+        )
+
+        with self.assertRaises(AirflowException) as context:
+            run_bulk_query(client, self.throttle, "{}", sleep=self.sleep)
+
+        self.assertIn("Already running", str(context.exception))
+
+    def test_iter_bulk_result_streams_jsonl(self):
+        server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), partial(QuietHandler, directory=TEST_DATA)
+        )
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = (
+                f"http://127.0.0.1:{server.server_address[1]}"
+                "/bulk_product_variants.jsonl"
+            )
+            variants = list(iter_bulk_result(url))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(
+            [variant["sku"] for variant in variants], ["SKU1", "SKU2", "SKU3"]
+        )
+        self.assertEqual(
+            variants[0]["inventoryItem"]["inventoryLevel"]["quantities"][0]["quantity"],
+            30,
+        )
@@ -0,0 +1,15 @@
+import unittest
+
+from plugins.utils.shopify_queries import sku_search_query
+
+
+class TestShopifyQueries(unittest.TestCase):
+
+    def test_sku_search_query(self):
+        self.assertEqual(sku_search_query(["SKU1", "SKU2"]), 'sku:"SKU1" OR sku:"SKU2"')
+
+    def test_sku_search_query_quotes_skus(self):
+        self.assertEqual(
+            sku_search_query(["SKU 1", 'SKU"2', "SKU\\3"]),
+            'sku:"SKU 1" OR sku:"SKU\\"2" OR sku:"SKU\\\\3"',
+        )
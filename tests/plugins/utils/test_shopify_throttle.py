@@ -0,0 +1,182 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from plugins.utils.shopify_throttle import ShopifyCostThrottle, is_throttled
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeBucketClient:
+    """Fake GraphQL client simulating Shopify's leaky bucket"""
+
+    def __init__(self, clock, cost=100, maximum=1000, available=1000, restore_rate=50):
+        self.clock = clock
+        self.cost = cost
+        self.maximum = maximum
+        self.available = available
+        self.restore_rate = restore_rate
+        self.updated_at = clock()
+        self.calls = 0
+        self.throttled_calls = 0
+
+    def execute(self, query, variables=None, operation_name=None):
+        self.calls += 1
+        now = self.clock()
+        self.available = min(
+            self.maximum,
+            self.available + (now - self.updated_at) * self.restore_rate,
+        )
+        self.updated_at = now
+
+        cost = {
+            "requestedQueryCost": self.cost,
+            "throttleStatus": {
+                "maximumAvailable": self.maximum,
+                "currentlyAvailable": self.available,
+                "restoreRate": self.restore_rate,
+            },
+        }
+        if self.available < self.cost:
+            self.throttled_calls += 1
+            return json.dumps(
+                {
+                    "errors": [
+                        {"message": "Throttled", "extensions": {"code": "THROTTLED"}}
+                    ],
+                    "extensions": {"cost": cost},
+                }
+            )
+
+        self.available -= self.cost
+        cost["actualQueryCost"] = self.cost
+        cost["throttleStatus"]["currentlyAvailable"] = self.available
+        return json.dumps({"data": {}, "extensions": {"cost": cost}})
+
+
+class TestShopifyCostThrottle(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.throttle = ShopifyCostThrottle(clock=self.clock, sleep=self.clock.sleep)
+
+    def test_no_wait_while_bucket_has_room(self):
+        client = FakeBucketClient(self.clock)
+
+        for _ in range(10):
+            result = self.throttle.execute(client, "query")
+            self.assertFalse(is_throttled(result))
+
+        self.assertEqual(self.throttle.total_sleep_seconds, 0)
+        self.assertEqual(self.throttle.total_actual_cost, 1000)
+
+    def test_waits_only_as_long_as_needed(self):
+        client = FakeBucketClient(self.clock)
+
+        for _ in range(30):
+            result = self.throttle.execute(client, "query")
+            self.assertFalse(is_throttled(result))
+
+        # 20 requests beyond the initial bucket need 2s of restore time each
+        self.assertEqual(client.throttled_calls, 0)
+        self.assertEqual(client.calls, 30)
+        self.assertAlmostEqual(self.throttle.total_sleep_seconds, 40)
+
+    def test_retries_throttled_requests(self):
+        client = FakeBucketClient(self.clock, available=20)
+
+        result = self.throttle.execute(client, "query")
+
+        self.assertFalse(is_throttled(result))
+        self.assertEqual(client.throttled_calls, 1)
+        self.assertEqual(self.throttle.retries, 1)
+        self.assertAlmostEqual(self.throttle.total_sleep_seconds, 1.6)
+
+    def test_returns_throttled_result_after_max_retries(self):
+        client = FakeBucketClient(self.clock, cost=2000)
+        throttle = ShopifyCostThrottle(
+            max_retries=2, clock=self.clock, sleep=self.clock.sleep
+        )
+
+        result = throttle.execute(client, "query")
+
+        self.assertTrue(is_throttled(result))
+        self.assertEqual(client.calls, 3)
+        self.assertEqual(throttle.retries, 2)
+
+    def test_backoff_without_throttle_status(self):
+        self.assertEqual(self.throttle._backoff_seconds({}, 0), 1.0)
+        self.assertEqual(self.throttle._backoff_seconds({}, 3), 8.0)
+
+    def test_concurrent_requests_reserve_cost(self):
+        self.throttle.update(
+            {
+                "extensions": {
+                    "cost": {
+                        "throttleStatus": {
+                            "maximumAvailable": 1000,
+                            "currentlyAvailable": 250,
+                            "restoreRate": 50,
+                        }
+                    }
+                }
+            }
+        )
+
+        # Requests waiting without a response in between share the same budget
+        waits = [self.throttle.wait(100) for _ in range(4)]
+
+        self.assertEqual(waits[:2], [0, 0])
+        self.assertAlmostEqual(waits[2], 1)
+        self.assertAlmostEqual(waits[3], 2)
+
+    def test_execute_async_retries_throttled_requests(self):
+        async def async_sleep(seconds):
+            self.clock.sleep(seconds)
+
+        throttle = ShopifyCostThrottle(clock=self.clock, async_sleep=async_sleep)
+        client = FakeBucketClient(self.clock, cost=400, available=300)
+        async_client = mock.Mock()
+        async_client.execute = mock.AsyncMock(side_effect=client.execute)
+
+        for _ in range(3):
+            result = asyncio.run(throttle.execute_async(async_client, "query"))
+            self.assertFalse(is_throttled(result))
+
+        # Only the first request, sent before the bucket state was known, was throttled
+        self.assertEqual(client.throttled_calls, 1)
+        self.assertGreater(throttle.total_sleep_seconds, 0)
+        self.assertEqual(throttle.total_actual_cost, 1200)
+
+    def test_share_of_bucket(self):
+        throttle = ShopifyCostThrottle(
+            clock=self.clock, sleep=self.clock.sleep, share=0.25
+        )
+        throttle.update(
+            {
+                "extensions": {
+                    "cost": {
+                        "throttleStatus": {
+                            "maximumAvailable": 1000,
+                            "currentlyAvailable": 1000,
+                            "restoreRate": 100,
+                        }
+                    }
+                }
+            }
+        )
+
+        # A quarter of the bucket and of its restore rate is available
+        self.assertEqual(throttle.available(), 250)
+        self.assertEqual(throttle.wait(200), 0)
+        self.assertAlmostEqual(throttle.wait(200), 6)
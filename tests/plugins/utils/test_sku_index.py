@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from plugins.utils.sku_index import SkuIndex
+
+
+class TestSkuIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "sku_index.db")
+        self.now = 1000.0
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def clock(self):
+        return self.now
+
+    def test_persists_between_instances(self):
+        index = SkuIndex(self.path, clock=self.clock)
+        index.put_many({"SKU1": "id1", "SKU2": "id2"})
+        index.close()
+
+        index = SkuIndex(self.path, clock=self.clock)
+        self.assertEqual(
+            index.get_many(["SKU1", "SKU2", "SKU3"]), {"SKU1": "id1", "SKU2": "id2"}
+        )
+        self.assertEqual(len(index), 2)
+        index.close()
+
+    def test_invalidate(self):
+        index = SkuIndex(self.path, clock=self.clock)
+        index.put_many({"SKU1": "id1", "SKU2": "id2"})
+
+        index.invalidate(["SKU1"])
+
+        self.assertEqual(index.get_many(["SKU1", "SKU2"]), {"SKU2": "id2"})
+        index.close()
+
+    def test_ttl(self):
+        index = SkuIndex(self.path, ttl_seconds=100, clock=self.clock)
+        index.put_many({"SKU1": "id1"})
+        self.now += 50
+        index.put_many({"SKU2": "id2"})
+        self.now += 60
+
+        self.assertEqual(index.get_many(["SKU1", "SKU2"]), {"SKU2": "id2"})
+        self.assertEqual(index.evict(), 1)
+        self.assertEqual(len(index), 1)
+        index.close()
+
+    def test_lru_eviction(self):
+        index = SkuIndex(self.path, max_entries=2, clock=self.clock)
+        index.put_many({"SKU1": "id1"})
+        self.now += 1
+        index.put_many({"SKU2": "id2"})
+        self.now += 1
+        index.put_many({"SKU3": "id3"})
+        self.now += 1
+        index.get_many(["SKU1"])
+
+        self.assertEqual(index.evict(), 1)
+        self.assertEqual(
+            index.get_many(["SKU1", "SKU2", "SKU3"]), {"SKU1": "id1", "SKU3": "id3"}
+        )
+        index.close()
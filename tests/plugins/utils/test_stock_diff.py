@@ -0,0 +1,100 @@
+import unittest
+
+from airflow.exceptions import AirflowException
+
+from plugins.utils.stock_diff import (
+    check_conflict,
+    group_by_location,
+    new_batch_result,
+    record_changes,
+    split_stock_changes,
+    stock_changes,
+    variant_stock,
+)
+
+
+def variant_edge(sku, inventory_item_id, quantity):
+    return {
+        "node": {
+            "sku": sku,
+            "inventoryItem": {
+                "id": inventory_item_id,
+                "inventoryLevel": (
+                    None
+                    if quantity is None
+                    else {"quantities": [{"quantity": quantity}]}
+                ),
+            },
+        }
+    }
+
+
+class TestStockDiff(unittest.TestCase):
+
+    def test_group_by_location(self):
+        self.assertEqual(
+            group_by_location({"SKU1": 1, "SKU2": 2}, "location1"),
+            {"location1": {"SKU1": 1, "SKU2": 2}},
+        )
+        self.assertEqual(
+            group_by_location(
+                {("SKU1", "location1"): 1, ("SKU1", "location2"): 2}, None
+            ),
+            {"location1": {"SKU1": 1}, "location2": {"SKU1": 2}},
+        )
+
+    def test_variant_stock(self):
+        current_stock, inventory_item_ids = variant_stock(
+            [variant_edge("SKU1", "id1", 5), variant_edge("SKU2", "id2", None)]
+        )
+        # Variants not stocked at the location are known, but have no stock
+        self.assertEqual(current_stock, [("SKU1", "id1", 5)])
+        self.assertEqual(inventory_item_ids, {"SKU1": "id1", "SKU2": "id2"})
+
+    def test_stock_changes(self):
+        changed_skus = []
+        batch_result = new_batch_result({"SKU1": 5, "SKU2": 3, "SKU3": 1})
+        inventory_changes, found, unmatched = stock_changes(
+            "location1",
+            batch_result["stock_batch"],
+            # The SKU search is case-insensitive and matches prefixes
+            [
+                ("SKU1", "id1", 5),
+                ("SKU2", "id2", 7),
+                ("sku3", "id4", 1),
+                ("SKU10", "id5", 0),
+            ],
+            changed_skus,
+        )
+        record_changes(batch_result, inventory_changes, found, unmatched)
+
+        self.assertEqual(inventory_changes, [("id2", "location1", 3, 7)])
+        self.assertEqual(changed_skus, ["SKU2"])
+        self.assertEqual(
+            (
+                batch_result["changed"],
+                batch_result["unchanged"],
+                batch_result["not_found"],
+                batch_result["unmatched"],
+            ),
+            (1, 1, 1, 2),
+        )
+
+    def test_split_stock_changes(self):
+        self.assertEqual(split_stock_changes([1, 2, 3, 4, 5], 2), [[1, 2], [3, 4], [5]])
+
+    def test_check_conflict(self):
+        batch_result = new_batch_result({})
+        stale = [{"code": "COMPARE_QUANTITY_STALE"}]
+        check_conflict(batch_result, stale, 1)
+        self.assertEqual(batch_result["conflicts"], 1)
+
+        # Retries are exhausted, other errors are not retried
+        with self.assertRaises(AirflowException):
+            check_conflict(batch_result, stale, 1)
+        with self.assertRaises(AirflowException):
+            check_conflict(new_batch_result({}), [{"code": "INVALID"}], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
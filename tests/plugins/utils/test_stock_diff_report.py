@@ -0,0 +1,85 @@
+import csv
+import gzip
+import os
+import tempfile
+import unittest
+
+from plugins.utils.optional_imports import optional_module
+from plugins.utils.stock_diff_report import StockDiffReport
+
+pyarrow = optional_module("pyarrow", "pyarrow.parquet")
+
+ROWS = [
+    ("SKU1", "location1", "gid://shopify/InventoryItem/1", 10, 15),
+    ("SKU2", "location1", "gid://shopify/InventoryItem/2", 8, 0),
+    ("SKU3", "location2", "gid://shopify/InventoryItem/3", 4, 1),
+]
+EXPECTED_SUMMARY = {
+    "diff_rows": 3,
+    "diff_total_increase": 5,
+    "diff_total_decrease": 11,
+    "diff_net_delta": -6,
+    "diff_max_increase": 5,
+    "diff_max_decrease": 8,
+    "diff_to_zero": 1,
+}
+
+
+class TestStockDiffReport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def write_report(self, name, **kwargs):
+        path = os.path.join(self.tmp_dir.name, name)
+        report = StockDiffReport(path, **kwargs)
+        report.write(ROWS[:2])
+        report.write(ROWS[2:])
+        report.close()
+        self.assertEqual(report.summary(), EXPECTED_SUMMARY)
+        return path
+
+    def test_csv(self):
+        for name, open_file in (("diff.csv", open), ("diff.csv.gz", gzip.open)):
+            with self.subTest(name=name):
+                path = self.write_report(name)
+                with open_file(path, "rt", newline="") as csv_file:
+                    rows = list(csv.reader(csv_file))
+                self.assertEqual(
+                    rows[0],
+                    [
+                        "sku",
+                        "location_id",
+                        "inventory_item_id",
+                        "current",
+                        "desired",
+                        "delta",
+                    ],
+                )
+                self.assertEqual(
+                    rows[1:],
+                    [[str(value) for value in (*row, row[4] - row[3])] for row in ROWS],
+                )
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_parquet(self):
+        path = self.write_report("diff.parquet", row_group_size=2)
+
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        self.assertEqual(parquet_file.num_row_groups, 2)
+        self.assertEqual(
+            parquet_file.read().to_pylist()[1],
+            {
+                "sku": "SKU2",
+                "location_id": "location1",
+                "inventory_item_id": "gid://shopify/InventoryItem/2",
+                "current": 8,
+                "desired": 0,
+                "delta": -8,
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
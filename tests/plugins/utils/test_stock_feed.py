@@ -0,0 +1,170 @@
+import gzip
+import io
+import os
+import tempfile
+import unittest
+from contextlib import nullcontext
+from unittest import mock
+
+from plugins.utils import stock_feed
+from plugins.utils.optional_imports import optional_module
+from plugins.utils.stock_feed import (
+    StockRowErrors,
+    batch_stock_rows,
+    deduplicate_stock_rows,
+    read_stock_rows,
+    read_stock_rows_fast,
+)
+
+INVALID_FEED = 'SKU1,10\n,5\nSKU3,ten\n\nSKU4\n"SKU,5",50\n'
+
+pyarrow = optional_module("pyarrow", "pyarrow.compute", "pyarrow.csv")
+
+
+def pyarrow_installed(installed):
+    """Reads as if pyarrow was not installed, unless `installed`"""
+    if installed:
+        return nullcontext()
+    return mock.patch.object(stock_feed, "optional_module", return_value=None)
+
+
+class TestStockFeed(unittest.TestCase):
+
+    def test_read_stock_rows(self):
+        csv_file = io.StringIO('SKU1,10\n"SKU,2",20\n')
+        self.assertEqual(list(read_stock_rows(csv_file)), [("SKU1", 10), ("SKU,2", 20)])
+
+    def test_read_stock_rows_invalid_raises(self):
+        with self.assertRaises(ValueError):
+            list(read_stock_rows(io.StringIO(INVALID_FEED)))
+
+    def test_read_stock_rows_reports_invalid_rows(self):
+        errors = StockRowErrors()
+        rows = list(read_stock_rows(io.StringIO(INVALID_FEED), errors=errors))
+
+        self.assertEqual(rows, [("SKU1", 10), ("SKU,5", 50)])
+        self.assertEqual(
+            dict(errors.counts),
+            {"blank sku": 1, "invalid stock": 1, "wrong column count": 1},
+        )
+        self.assertIn("row 3: invalid stock ['SKU3', 'ten']", errors.report())
+
+    def test_read_stock_rows_max_errors(self):
+        with self.assertRaises(ValueError):
+            list(
+                read_stock_rows(
+                    io.StringIO(INVALID_FEED), errors=StockRowErrors(max_errors=2)
+                )
+            )
+
+    def test_read_stock_rows_fast(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "stock.csv")
+            with open(path, "w") as csv_file:
+                csv_file.write(INVALID_FEED)
+                # Converted like int(), stocks beyond 64-bit integers are invalid
+                csv_file.write("A,+5\nB,1_000\nC,99999999999999999999\nD, -7 \n")
+
+            for pyarrow in (True, False):
+                with self.subTest(pyarrow=pyarrow):
+                    with pyarrow_installed(pyarrow):
+                        errors = StockRowErrors()
+                        rows = list(read_stock_rows_fast(path, errors=errors))
+                    self.assertEqual(
+                        rows,
+                        [("SKU1", 10), ("SKU,5", 50), ("A", 5), ("B", 1000), ("D", -7)],
+                    )
+                    self.assertEqual(len(errors), 4)
+                    self.assertIn(
+                        "invalid stock ['C', '99999999999999999999']",
+                        errors.report(),
+                    )
+
+    def test_read_stock_rows_fast_compressed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "stock.csv.gz")
+            with gzip.open(path, "wt") as csv_file:
+                csv_file.write(INVALID_FEED)
+
+            for pyarrow in (True, False):
+                with self.subTest(pyarrow=pyarrow):
+                    with pyarrow_installed(pyarrow):
+                        errors = StockRowErrors()
+                        rows = list(read_stock_rows_fast(path, errors=errors))
+                    self.assertEqual(rows, [("SKU1", 10), ("SKU,5", 50)])
+                    self.assertEqual(len(errors), 3)
+
+    def test_read_stock_rows_fast_with_locations(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "stock.csv")
+            with open(path, "w") as csv_file:
+                csv_file.write("SKU1,10,store\nSKU1,20,outlet\nSKU2,-1,warehouse\n")
+            locations = {"store": "location1", "warehouse": "location2"}
+
+            errors = StockRowErrors()
+            rows = list(read_stock_rows_fast(path, locations, errors))
+
+        self.assertEqual(
+            rows, [(("SKU1", "location1"), 10), (("SKU2", "location2"), -1)]
+        )
+        self.assertEqual(dict(errors.counts), {"unknown location": 1})
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_read_stock_rows_fast_row_numbers(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "stock.csv")
+            with open(path, "w") as csv_file:
+                csv_file.write("SKU1,10\nSKU2\nSKU3,ten\nSKU4,4\nSKU5\nSKU6\n,6\n")
+
+            # Rows dropped for their column count are counted, also across blocks
+            for block_size in (64, 8):
+                with self.subTest(block_size=block_size):
+                    errors = StockRowErrors()
+                    rows = list(
+                        read_stock_rows_fast(path, errors=errors, block_size=block_size)
+                    )
+                    self.assertEqual(rows, [("SKU1", 10), ("SKU4", 4)])
+                    self.assertIn(
+                        "row 3: invalid stock ['SKU3', 'ten']", errors.report()
+                    )
+                    self.assertIn("row 7: blank sku ['', '6']", errors.report())
+
+    def test_read_stock_rows_with_locations(self):
+        csv_file = io.StringIO("SKU1,10,store\nSKU1,20,warehouse\n")
+        locations = {"store": "location1", "warehouse": "location2"}
+        self.assertEqual(
+            list(read_stock_rows(csv_file, locations)),
+            [(("SKU1", "location1"), 10), (("SKU1", "location2"), 20)],
+        )
+
+    def test_read_stock_rows_unknown_location(self):
+        csv_file = io.StringIO("SKU1,10,outlet\n")
+        with self.assertRaises(ValueError):
+            list(read_stock_rows(csv_file, {"store": "location1"}))
+
+    def test_deduplicate_in_memory_keeps_file_order(self):
+        rows = [("B", 1), ("A", 2), ("B", 3), ("C", 4)]
+        self.assertEqual(
+            list(deduplicate_stock_rows(rows)), [("B", 3), ("A", 2), ("C", 4)]
+        )
+
+    def test_deduplicate_spills_to_disk(self):
+        rows = [("B", 1), ("A", 2), ("C", 3), ("B", 4), ("D", 5), ("A", 6), ("B", 7)]
+        self.assertEqual(
+            list(deduplicate_stock_rows(rows, max_rows_in_memory=2)),
+            [("A", 6), ("B", 7), ("C", 3), ("D", 5)],
+        )
+
+    def test_deduplicate_spills_location_keys(self):
+        rows = [(("B", "l1"), 1), (("A", "l2"), 2), (("B", "l2"), 3), (("B", "l1"), 4)]
+        self.assertEqual(
+            list(deduplicate_stock_rows(rows, max_rows_in_memory=2)),
+            [(("A", "l2"), 2), (("B", "l1"), 4), (("B", "l2"), 3)],
+        )
+
+    def test_batch_stock_rows(self):
+        rows = ((f"SKU{i}", i) for i in range(5))
+        self.assertEqual(
+            list(batch_stock_rows(rows, 2)),
+            [{"SKU0": 0, "SKU1": 1}, {"SKU2": 2, "SKU3": 3}, {"SKU4": 4}],
+        )
@@ -0,0 +1,52 @@
+import io
+import os
+import tempfile
+import unittest
+
+from plugins.utils.sync_checkpoint import SyncCheckpoint, file_fingerprint
+
+
+class TestSyncCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "checkpoint.db")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_load_saved_checkpoint(self):
+        checkpoint = SyncCheckpoint(self.path, "location:stock.csv")
+        self.assertEqual(checkpoint.load("hash1"), 0)
+        checkpoint.save("hash1", 3)
+        checkpoint.close()
+
+        checkpoint = SyncCheckpoint(self.path, "location:stock.csv")
+        self.assertEqual(checkpoint.load("hash1"), 3)
+        # A changed file invalidates the checkpoint
+        self.assertEqual(checkpoint.load("hash2"), 0)
+
+        checkpoint.clear()
+        self.assertEqual(checkpoint.load("hash1"), 0)
+        checkpoint.close()
+
+    def test_file_fingerprint(self):
+        file_location = os.path.join(self.tmp_dir.name, "stock.csv")
+        with open(file_location, "w") as csv_file:
+            csv_file.write("SKU1,10\n")
+        fingerprint = file_fingerprint(file_location, 100, chunk_size=4)
+
+        self.assertEqual(file_fingerprint(file_location, 100), fingerprint)
+        self.assertNotEqual(file_fingerprint(file_location, 50), fingerprint)
+        with open(file_location, "w") as csv_file:
+            csv_file.write("SKU1,11\n")
+        self.assertNotEqual(file_fingerprint(file_location, 100), fingerprint)
+
+    def test_file_fingerprint_file_object(self):
+        file_object = io.BytesIO(b"SKU1,10\n")
+        file_object.seek(2)
+        fingerprint = file_fingerprint(file_object, 100)
+
+        # The file object is rewound to be read afterwards
+        self.assertEqual(file_object.tell(), 2)
+        self.assertEqual(file_fingerprint(io.BytesIO(b"U1,10\n"), 100), fingerprint)
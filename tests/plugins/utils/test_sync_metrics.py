@@ -0,0 +1,83 @@
+import unittest
+from unittest import mock
+
+from plugins.utils.shopify_throttle import ShopifyCostThrottle
+from plugins.utils.sync_metrics import SyncMetrics
+
+
+def batch_result(**kwargs):
+    return {
+        "skus": 3,
+        "changed": 1,
+        "unchanged": 1,
+        "not_found": 1,
+        "unmatched": 0,
+        "conflicts": 0,
+        "responses": [{}],
+        "lookup_seconds": 0.5,
+        "mutation_seconds": 0.25,
+        **kwargs,
+    }
+
+
+class TestSyncMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.stats = mock.Mock()
+        self.throttle = ShopifyCostThrottle()
+        self.throttle.update(
+            {
+                "extensions": {
+                    "cost": {
+                        "actualQueryCost": 12,
+                        "throttleStatus": {
+                            "maximumAvailable": 2000,
+                            "currentlyAvailable": 1988,
+                            "restoreRate": 100,
+                        },
+                    }
+                }
+            }
+        )
+
+    def test_summary(self):
+        metrics = SyncMetrics(stats=self.stats)
+        metrics.add_seconds("parse", 0.1)
+        metrics.increment("skipped", 4)
+        metrics.record_batch(batch_result())
+        metrics.record_batch(batch_result(conflicts=2, changed=2, unchanged=0))
+
+        summary = metrics.summary(self.throttle)
+
+        self.assertEqual(summary["parse_seconds"], 0.1)
+        self.assertEqual(summary["lookup_seconds"], 1.0)
+        self.assertEqual(summary["mutation_seconds"], 0.5)
+        self.assertEqual(summary["batches"], 2)
+        self.assertEqual(summary["skus"], 6)
+        self.assertEqual(summary["skus_changed"], 3)
+        self.assertEqual(summary["skus_unchanged"], 1)
+        self.assertEqual(summary["skus_not_found"], 2)
+        self.assertEqual(summary["skus_skipped"], 4)
+        self.assertEqual(summary["mutations"], 2)
+        self.assertEqual(summary["conflict_retries"], 2)
+        self.assertEqual(summary["cost_consumed"], 12)
+        self.assertEqual(summary["cost_minimum_available"], 1988)
+        self.stats.timing.assert_not_called()
+
+    def test_emit(self):
+        metrics = SyncMetrics(
+            tags={"task_id": "sync"}, batch_metrics=True, stats=self.stats
+        )
+        metrics.record_batch(batch_result())
+        self.stats.timing.assert_any_call(
+            "shopify_stock_sync.batch_seconds", 750.0, tags={"task_id": "sync"}
+        )
+
+        metrics.emit({"lookup_seconds": 0.5, "skus": 3, "cost_restore_rate": None})
+
+        self.stats.timing.assert_called_with(
+            "shopify_stock_sync.lookup_seconds", 500.0, tags={"task_id": "sync"}
+        )
+        self.stats.gauge.assert_called_once_with(
+            "shopify_stock_sync.skus", 3, tags={"task_id": "sync"}
+        )
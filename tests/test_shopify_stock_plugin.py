@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+import unittest
+
+REPO_LOCATION = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Imported by every DAG file using an operator, not counted against the plugin
+AIRFLOW_MODULES = [
+    "airflow.hooks.base",
+    "airflow.models.baseoperator",
+    "airflow.models.pool",
+    "airflow.plugins_manager",
+    "airflow.triggers.base",
+    "requests",
+]
+# Imported on first use by tasks only
+LAZY_MODULES = ["shopify", "pyactiveresource", "numpy", "pyarrow", "aiohttp"]
+IMPORT_TIME_BUDGET_SECONDS = 0.15
+
+
+class TestShopifyStockPlugin(unittest.TestCase):
+
+    def test_import_time(self):
+        """Importing the plugin must stay cheap for the scheduler and DAG file processors"""
+        script = (
+            f"import sys, {', '.join(AIRFLOW_MODULES)}\n"
+            "import shopify_stock_plugin\n"
+            "print(','.join(m for m in sys.modules if m.split('.')[0] in sys.argv[1:]))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", script, *LAZY_MODULES],
+            cwd=REPO_LOCATION,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        self.assertEqual(result.stdout.strip(), "", "Modules imported eagerly")
+        # Lines of -X importtime: "import time: self [us] | cumulative | module"
+        plugin_microseconds = next(
+            int(line.split("|")[1])
+            for line in result.stderr.splitlines()
+            if line.split("|")[-1].strip() == "shopify_stock_plugin"
+        )
+        self.assertLess(plugin_microseconds / 1e6, IMPORT_TIME_BUDGET_SECONDS)
+
+
+if __name__ == "__main__":
+    unittest.main()